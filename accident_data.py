@@ -0,0 +1,877 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import geopandas as gpd
+import joblib
+import numpy as np
+import pandas as pd
+
+from spatial_index import MultiLayerIndex, build_layer_index
+
+
+# Directory holding the persistent per-year cache of processed accident data, overridable through the environment
+CACHE_DIR = os.environ.get("ACCIDENT_CACHE_DIR", "cached_data")
+
+# Directory of the yearly CSV extracts, when unset they are read from the Windows-style paths next to the app
+DATA_DIR = os.environ.get("ACCIDENT_DATA_DIR")
+
+# GeoJSON files with the polygons of the council districts, the towns around San Antonio and the inclusive growth areas
+COUNCIL_DISTRICTS_PATH = "Council_Districts.geojson"
+TOWNS_PATH = "Other_Cities_Towns_.geojson"
+GROWTH_AREAS_PATH = "InclusiveGrowthAreas.geojson"
+
+# Towns enclosed by San Antonio, the ones shown on the maps and joined to the accidents
+ENCLAVE_TOWNS = ['Leon Valley', 'Castle Hills', 'Alamo Heights', 'Olmos Park', 'Shavano Park', 'Hollywood Park',
+                 'Hill Country Village', 'Windcrest', 'Kirby', 'Balcones Heights', 'Terrell Hills']
+
+# Polygon layers every accident is joined against, by the column holding its code in the cached tables:
+# the GeoJSON file, the property the code is read from, the property naming a code and the compact array name
+POLYGON_LAYERS = {
+    'District': (COUNCIL_DISTRICTS_PATH, 'District', 'Name', 'district'),
+    'Town': (TOWNS_PATH, 'OBJECTID', 'Name', 'town'),
+    'GrowthArea': (GROWTH_AREAS_PATH, 'OBJECTID', 'Tier', 'growth_area'),
+}
+
+# Code of accidents outside every polygon of a layer
+MISSING_CODE = -1
+
+# Number of worker processes used to ingest years in parallel, overridable through the environment
+INGEST_WORKERS = int(os.environ.get("ACCIDENT_INGEST_WORKERS", os.cpu_count() or 1))
+
+# Bump whenever the layout of the cached tables changes so stale entries get rebuilt
+CACHE_FORMAT_VERSION = 7
+
+# Rows read at a time from a yearly CSV, so peak memory follows the filtered rows rather than the file
+CSV_CHUNK_ROWS = 100_000
+
+# Seconds between two scans of the data directory for new or changed yearly CSVs, 0 turns the watcher off
+WATCH_INTERVAL_SECONDS = float(os.environ.get("ACCIDENT_WATCH_SECONDS", 30))
+
+# Years the dashboard preloads, later years are picked up as their CSVs appear in the data directory
+MIN_YEAR = 2000
+MAX_YEAR = 2021
+
+# File names of the yearly extracts, the year being the first group
+YEAR_CSV_PATTERN = re.compile(r'(\d{4})_bexar_county\.csv$')
+
+# File names of the per-year cache entries, including the legacy joblib dumps, the year being the first group
+CACHED_YEAR_PATTERN = re.compile(r'^(\d{4})_cached_data\.(parquet|json|joblib)$')
+
+# Defined possible column names for latitude and longitude
+LAT_LON_COLUMNS = ['LATITUDE', 'LATITUD', 'LATITUDENAME', 'Latitude', 'latitude', 'LAT', 'LATNAME',
+                   'LONGITUDE', 'LONGITUD', 'LONGITUDENAME', 'Longitude', 'longitude', 'longitud', 'LON', 'LONNAME']
+
+# Possible columns of the city and state of an accident, as FARS codes or as names depending on the year
+CITY_COLUMNS = ['CITY', 'CITYNAME']
+STATE_COLUMNS = ['STATE', 'STATENAME']
+
+# FARS codes and names of San Antonio and of Texas
+SAN_ANTONIO_CITY_CODE = 6090
+TEXAS_STATE_CODE = 48
+TEXAS_STATE_NAMES = ['texas', 'tx']
+
+# Coordinates FARS uses for unknown or unreported locations, in both the latitude and the longitude form
+SENTINEL_COORDINATES = [77.7777, 88.8888, 99.9999, 777.7777, 888.8888, 999.9999]
+
+# Bounding box of Bexar County as (min lon, min lat, max lon, max lat), accidents outside it are misplaced
+BEXAR_COUNTY_BOUNDS = (-98.82, 29.11, -98.11, 29.77)
+
+# File persisting the detected column layout of every yearly CSV
+SCHEMA_REGISTRY_PATH = os.path.join(CACHE_DIR, "schemas.json")
+
+# Memoized content hashes of the polygon layers, keyed by (path, size, mtime)
+_geojson_versions = {}
+
+# Seconds spent in each stage of the load running on the current thread, None outside a timed load
+_stage_timings = threading.local()
+
+# Polygons of every layer and their shared spatial index, built once per process on first use
+_layer_polygons = {}
+_layer_index = None
+
+
+# Function to add the time spent in a block to a stage of the timed load running on this thread
+@contextmanager
+def timed_stage(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds = getattr(_stage_timings, 'seconds', None)
+        if stage_seconds is not None:
+            stage_seconds[stage] = stage_seconds.get(stage, 0.0) + time.perf_counter() - started
+
+
+# Function to compute the sha1 digest of a file without loading it all into memory
+def file_sha1(path, block_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Function to fingerprint a source file by its size, modification time and content hash
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return {'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': file_sha1(path)}
+
+
+# Function to check a recorded fingerprint against the file currently on disk
+def fingerprint_matches(fingerprint, path):
+    if fingerprint is None or fingerprint.get('path') != path or not os.path.exists(path):
+        return False
+
+    stat = os.stat(path)
+    if fingerprint.get('size') != stat.st_size:
+        return False
+    if fingerprint.get('mtime_ns') == stat.st_mtime_ns:
+        return True
+
+    # The file was touched without changing size, so only the content hash can tell
+    return fingerprint.get('sha1') == file_sha1(path)
+
+
+# Function to get the version of a GeoJSON layer, hashing it once per process
+def geojson_version(path):
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key not in _geojson_versions:
+        _geojson_versions[key] = file_sha1(path)
+    return _geojson_versions[key]
+
+
+# Function to build the file paths of the cache entries for a year
+def cache_paths(year):
+    return (os.path.join(CACHE_DIR, f"{year}_cached_data.parquet"),
+            os.path.join(CACHE_DIR, f"{year}_cached_data.json"),
+            os.path.join(CACHE_DIR, f"{year}_cached_data.joblib"))
+
+
+# Function to pick the file a year's cache entry is built from: the CSV, else the legacy joblib dump
+def cache_source_path(year, csv_path):
+    if os.path.exists(csv_path):
+        return csv_path
+
+    _, _, legacy_path = cache_paths(year)
+    if os.path.exists(legacy_path):
+        return legacy_path
+
+    return None
+
+
+# Function to get the parquet file of a year's cache entry, or None when it is missing or stale
+def fresh_cache_path(year, source_path):
+    parquet_path, metadata_path, _ = cache_paths(year)
+    if source_path is None or not os.path.exists(parquet_path) or not os.path.exists(metadata_path):
+        return None
+
+    try:
+        with open(metadata_path) as handle:
+            metadata = json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+    # Invalidate the entry when the layout, the polygon layers or the source file changed
+    if metadata.get('format_version') != CACHE_FORMAT_VERSION:
+        return None
+    if metadata.get('layers_version') != layers_version():
+        return None
+    if not fingerprint_matches(metadata.get('source'), source_path):
+        return None
+
+    return parquet_path
+
+
+# Function to load a year's accidents from the persistent cache, or None when missing or stale
+def load_cached_year(year, source_path):
+    parquet_path = fresh_cache_path(year, source_path)
+    if parquet_path is None:
+        return None
+
+    try:
+        return gpd.read_parquet(parquet_path)
+    except (ImportError, OSError, ValueError) as error:
+        print(f"Could not read cached data for {year}: {error}")
+        return None
+
+
+# Function to load a year from the persistent cache as compact arrays, reading only the columns in use
+def load_cached_accidents(year, source_path):
+    parquet_path = fresh_cache_path(year, source_path)
+    if parquet_path is None:
+        return None
+
+    try:
+        import pyarrow.parquet as pq
+
+        # The coordinate columns are read as plain numbers, so no point geometry is ever decoded
+        lat_col, lon_col = detect_lat_lon_columns(pq.read_schema(parquet_path).names)
+        if lat_col is None or lon_col is None:
+            return year_accidents_from_gdf(gpd.read_parquet(parquet_path))
+        frame = pd.read_parquet(parquet_path, columns=[lon_col, lat_col, 'FATALS'] + list(POLYGON_LAYERS))
+    except (ImportError, OSError, ValueError, KeyError) as error:
+        print(f"Could not read cached data for {year}: {error}")
+        return None
+
+    return YearAccidents.from_columns(frame[lon_col], frame[lat_col], frame['District'], frame['FATALS'],
+                                      frame['Town'], frame['GrowthArea'])
+
+
+# Function to reserve a temporary file next to a path, unique to this writer so processes and threads writing the
+# same entry never share one, and removed again unless it was moved into place
+@contextmanager
+def unique_temporary_path(path):
+    handle, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                              prefix=os.path.basename(path) + '.', suffix='.tmp')
+    os.close(handle)
+    try:
+        yield temporary_path
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+# Function to write a year's processed accidents to the persistent cache
+def store_cached_year(year, gdf_accidents, source_path):
+    parquet_path, metadata_path, _ = cache_paths(year)
+    metadata = {
+        'format_version': CACHE_FORMAT_VERSION,
+        'year': year,
+        'rows': len(gdf_accidents),
+        'source': file_fingerprint(source_path),
+        'layers_version': layers_version(),
+        'dropped_rows': gdf_accidents.attrs.get('dropped_rows'),
+    }
+
+    # Mixed-type object columns from the raw CSV are stored as strings so Arrow accepts them
+    gdf_to_store = gdf_accidents.copy()
+    for column in gdf_to_store.columns:
+        if column != gdf_to_store.geometry.name and gdf_to_store[column].dtype == object:
+            gdf_to_store[column] = gdf_to_store[column].astype('string')
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+
+        # Write to temporary files first so a crash never leaves a half-written entry behind
+        with unique_temporary_path(parquet_path) as temporary_path:
+            gdf_to_store.to_parquet(temporary_path, index=False)
+            os.replace(temporary_path, parquet_path)
+        with unique_temporary_path(metadata_path) as temporary_path:
+            with open(temporary_path, 'w') as handle:
+                json.dump(metadata, handle, indent=2)
+            os.replace(temporary_path, metadata_path)
+    except (ImportError, OSError, ValueError) as error:
+        print(f"Could not write cached data for {year}: {error}")
+
+
+# Function to import a legacy joblib dump for a year into the columnar cache
+def migrate_legacy_year(year):
+    _, _, legacy_path = cache_paths(year)
+    if not os.path.exists(legacy_path):
+        return None
+
+    # Legacy dumps hold the (gdf_accidents, council_districts, district_counts, output_text) tuple
+    gdf_accidents = joblib.load(legacy_path)[0]
+
+    # They kept every San Antonio row, so invalid coordinates are dropped as a CSV read drops them
+    valid, dropped = validate_coordinates(gdf_accidents.geometry.x.to_numpy(), gdf_accidents.geometry.y.to_numpy())
+    gdf_accidents = gdf_accidents[valid].reset_index(drop=True)
+    report_dropped_rows(legacy_path, len(gdf_accidents), dropped)
+
+    # Every layer is joined again, as the districts may have changed since the dump; its old district codes
+    # are only compared against the new ones
+    layer_codes = join_layers(gdf_accidents.geometry.x.to_numpy(), gdf_accidents.geometry.y.to_numpy())
+    if 'District' in gdf_accidents.columns:
+        legacy_codes = pd.to_numeric(gdf_accidents['District'], errors='coerce').to_numpy(dtype='float64')
+        changed = ~((legacy_codes == layer_codes['District']) |
+                    (np.isnan(legacy_codes) & np.isnan(layer_codes['District'])))
+        if changed.any():
+            print(f"{changed.sum()} of {len(changed)} accidents in {legacy_path} now fall in another district")
+    for column, codes in layer_codes.items():
+        gdf_accidents[column] = codes
+
+    gdf_accidents.attrs['dropped_rows'] = dropped
+    store_cached_year(year, gdf_accidents, legacy_path)
+
+    return gdf_accidents
+
+
+# Function to get the polygons of a layer in lon/lat, reading its GeoJSON once per process
+def get_layer_polygons(column):
+    if column not in _layer_polygons:
+        path = POLYGON_LAYERS[column][0]
+        polygons = gpd.read_file(path)
+
+        # Some layers are published in a state plane projection
+        if polygons.crs is not None and polygons.crs.to_epsg() != 4326:
+            polygons = polygons.to_crs(epsg=4326)
+        if column == 'Town':
+            polygons = polygons[polygons['Name'].isin(ENCLAVE_TOWNS)]
+        _layer_polygons[column] = polygons
+
+    return _layer_polygons[column]
+
+
+# Function to get the council district polygons, reading the GeoJSON once per process
+def get_council_districts():
+    return get_layer_polygons('District')
+
+
+# Function to get the spatial index of every polygon layer, shared by ingestion and callbacks
+def get_layer_index():
+    global _layer_index
+
+    if _layer_index is None:
+        _layer_index = MultiLayerIndex({column: build_layer_index(get_layer_polygons(column), code_property)
+                                        for column, (_, code_property, _, _) in POLYGON_LAYERS.items()})
+
+    return _layer_index
+
+
+# Function to get the spatial index assigning points to council districts
+def get_district_index():
+    return get_layer_index().layers['District']
+
+
+# Function to get the version of the polygon layers and the towns kept, part of every cache entry
+def layers_version():
+    digest = hashlib.sha1(repr(ENCLAVE_TOWNS).encode())
+    for column, (path, code_property, _, _) in POLYGON_LAYERS.items():
+        digest.update(f"{column}:{code_property}:{geojson_version(path)}".encode())
+    return digest.hexdigest()[:16]
+
+
+# Function to get the name of every code of each layer, such as the tier of a growth area
+def layer_code_names():
+    return {column: dict(zip(get_layer_polygons(column)[code_property].astype(int).tolist(),
+                             get_layer_polygons(column)[name_property].astype(str).tolist()))
+            for column, (_, code_property, name_property, _) in POLYGON_LAYERS.items()}
+
+
+# Function to join lon/lat points against every polygon layer in one pass, as one compact code column per layer
+def join_layers(lon, lat):
+    layer_codes = get_layer_index().assign(lon, lat)
+
+    # Accidents outside every district get a missing district, as the left spatial join gave them
+    district_codes = layer_codes['District']
+    layer_codes['District'] = np.where(district_codes >= 0, district_codes, np.nan)
+    return layer_codes
+
+
+# Function to build the path of the yearly NHTSA extract for Bexar County
+def year_csv_path(year):
+    if DATA_DIR:
+        return os.path.join(DATA_DIR, f"{year}_bexar_county.csv")
+    return rf"Bexarcounty_Data_Extraction\{year}_bexar_county.csv"
+
+
+# Function to find the years with a yearly CSV in the data directory
+def available_years():
+    # On Windows the extracts live in a directory, elsewhere the same paths are plain file names in the directory
+    directory = os.path.dirname(year_csv_path(0)) or '.'
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+
+    years = set()
+    for name in names:
+        match = YEAR_CSV_PATTERN.search(name)
+        if match and os.path.exists(year_csv_path(int(match.group(1)))):
+            years.add(int(match.group(1)))
+    return sorted(years)
+
+
+# Function to find the years with an entry in the per-year cache, which can stand in for a missing CSV
+def cached_years():
+    try:
+        names = os.listdir(CACHE_DIR)
+    except OSError:
+        return []
+
+    return sorted({int(match.group(1)) for match in map(CACHED_YEAR_PATTERN.match, names) if match})
+
+
+# Function to list the years the dashboard serves: the preloaded range and any other year with a CSV
+def served_years():
+    return sorted(set(range(MIN_YEAR, MAX_YEAR + 1)) | set(available_years()))
+
+
+# Function to find the latitude and longitude columns among the column names of a CSV header
+def detect_lat_lon_columns(columns):
+    # Found existing latitude and longitude columns
+    lat_col, lon_col = None, None
+    for col in LAT_LON_COLUMNS:
+        if col in columns:
+            if col.lower().startswith('lat'):
+                lat_col = col
+            elif col.lower().startswith('lon'):
+                lon_col = col
+
+    # If 'LATITUDENAME' is not found, use the first latitude column available
+    if lat_col is None and 'LATITUDENAME' in columns:
+        lat_col = 'LATITUDENAME'
+
+    # If 'LONGITUDENAME' is not found, use the first longitude column available
+    if lon_col is None and 'LONGITUDENAME' in columns:
+        lon_col = 'LONGITUDENAME'
+
+    return lat_col, lon_col
+
+
+# Function to find the columns a yearly CSV is read through among the column names of its header
+def detect_schema(columns):
+    lat_col, lon_col = detect_lat_lon_columns(columns)
+    return {'lat': lat_col, 'lon': lon_col,
+            'city': [column for column in CITY_COLUMNS if column in columns],
+            'state': [column for column in STATE_COLUMNS if column in columns]}
+
+
+# Detected column layouts of the yearly CSVs, persisted so each file's header is only read once
+class SchemaRegistry:
+    def __init__(self, path=SCHEMA_REGISTRY_PATH):
+        self.path = path
+        self._schemas = None
+        self._lock = threading.Lock()
+
+    # Function to read the persisted layouts, an unreadable file counting as empty
+    def _read(self):
+        try:
+            with open(self.path) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return {}
+
+    # Function to get the layout of a file, reading its header only when the file is new or changed
+    def get(self, file_path):
+        stat = os.stat(file_path)
+        with self._lock:
+            if self._schemas is None:
+                self._schemas = self._read()
+            entry = self._schemas.get(file_path)
+        if entry is not None and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+            return entry['schema']
+
+        with timed_stage('read'):
+            header = pd.read_csv(file_path, encoding='ISO-8859-1', nrows=0).columns
+        schema = detect_schema(list(header))
+        self.put(file_path, {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'schema': schema})
+        return schema
+
+    # Function to record the layout of a file, merging with what other processes persisted in the meantime
+    def put(self, file_path, entry):
+        with self._lock:
+            self._schemas = dict(self._read(), **{file_path: entry})
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with unique_temporary_path(self.path) as temporary_path:
+                    with open(temporary_path, 'w') as handle:
+                        json.dump(self._schemas, handle, indent=2)
+                    os.replace(temporary_path, self.path)
+            except OSError as error:
+                print(f"Could not write the schema registry: {error}")
+
+
+# Column layouts of the yearly CSVs read by this process
+schema_registry = SchemaRegistry()
+
+
+# Function to flag the accidents whose coordinates are missing, FARS sentinels or outside the county,
+# returning the mask of the valid rows and the number of rows dropped for each reason
+def validate_coordinates(lon, lat, bounds=BEXAR_COUNTY_BOUNDS):
+    lon = np.asarray(lon, dtype='float64')
+    lat = np.asarray(lat, dtype='float64')
+    min_lon, min_lat, max_lon, max_lat = bounds
+
+    # Each row is counted under the first reason it fails
+    missing = np.isnan(lon) | np.isnan(lat)
+    sentinel = ~missing & (np.isin(np.round(np.abs(lon), 4), SENTINEL_COORDINATES) |
+                           np.isin(np.round(np.abs(lat), 4), SENTINEL_COORDINATES))
+    with np.errstate(invalid='ignore'):
+        out_of_county = ~missing & ~sentinel & ((lon < min_lon) | (lon > max_lon) | (lat < min_lat) | (lat > max_lat))
+
+    dropped = {'missing': int(missing.sum()), 'sentinel': int(sentinel.sum()),
+               'out_of_county': int(out_of_county.sum())}
+    return ~(missing | sentinel | out_of_county), dropped
+
+
+# Function to print how many rows of a file were dropped for each reason, when any were
+def report_dropped_rows(file_path, kept_rows, dropped):
+    if any(dropped.values()):
+        reasons = ', '.join(f"{count} {reason.replace('_', ' ')}" for reason, count in dropped.items())
+        print(f"Dropped {sum(dropped.values())} of {kept_rows + sum(dropped.values())} San Antonio rows "
+              f"of {file_path}: {reasons}")
+
+
+# Function to flag the rows of a chunk in San Antonio, Texas, whether the city and state are codes or names
+def san_antonio_mask(chunk, schema):
+    is_san_antonio = np.zeros(len(chunk), dtype=bool)
+    for column in schema['city']:
+        is_san_antonio |= ((pd.to_numeric(chunk[column], errors='coerce') == SAN_ANTONIO_CITY_CODE) |
+                           chunk[column].str.contains('San Antonio', case=False, na=False)).to_numpy()
+
+    is_texas = np.zeros(len(chunk), dtype=bool)
+    for column in schema['state']:
+        is_texas |= ((pd.to_numeric(chunk[column], errors='coerce') == TEXAS_STATE_CODE) |
+                     chunk[column].str.strip().str.lower().isin(TEXAS_STATE_NAMES)).to_numpy()
+
+    return is_san_antonio & is_texas
+
+
+# Function to read the San Antonio rows of a yearly CSV chunk by chunk, keeping only the columns in use
+# and the rows with valid coordinates, returning them with the number of rows dropped for each reason
+def read_san_antonio_rows(file_path, schema):
+    lat_col, lon_col = schema['lat'], schema['lon']
+    filtered_chunks = []
+
+    # Codes are read as text so integer and string variants of CITY and STATE compare alike
+    chunks = pd.read_csv(file_path, encoding='ISO-8859-1',
+                         usecols=schema['city'] + schema['state'] + ['FATALS', lat_col, lon_col],
+                         dtype=str, chunksize=CSV_CHUNK_ROWS)
+    while True:
+        # Parsing and filtering alternate chunk by chunk, so each is timed as its own stage
+        with timed_stage('read'):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+
+        with timed_stage('filter'):
+            filtered_chunks.append(chunk[san_antonio_mask(chunk, schema)])
+
+    with timed_stage('filter'):
+        bexar_texas_data = pd.concat(filtered_chunks, ignore_index=True)
+        lat = pd.to_numeric(bexar_texas_data[lat_col], errors='coerce').to_numpy()
+        lon = pd.to_numeric(bexar_texas_data[lon_col], errors='coerce').to_numpy()
+
+        # Invalid coordinates are dropped before any geometry is built or joined
+        valid, dropped = validate_coordinates(lon, lat)
+
+        # Only the kept rows are converted to compact typed columns
+        columns = {column: bexar_texas_data.loc[valid, column].astype('category').reset_index(drop=True)
+                   for column in schema['city'] + schema['state']}
+        columns['FATALS'] = pd.to_numeric(bexar_texas_data.loc[valid, 'FATALS'],
+                                          errors='coerce').fillna(0).astype('int16').reset_index(drop=True)
+        columns[lat_col] = lat[valid]
+        columns[lon_col] = lon[valid]
+        return pd.DataFrame(columns), dropped
+
+
+# Function to read a yearly CSV, keep the San Antonio accidents and join them to every polygon layer
+def read_year_csv(file_path):
+    # The column layout comes from the schema registry, which reads the header only for new or changed files
+    schema = schema_registry.get(file_path)
+
+    # Checked if latitude and longitude columns exist before creating GeoDataFrame
+    if schema['lat'] is None or schema['lon'] is None:
+        print("Latitude or Longitude column not found. Skipping map plotting.")
+        return None
+    if not schema['city'] or not schema['state']:
+        print(f"City or state column not found in {file_path}. Skipping the file.")
+        return None
+
+    lat_col, lon_col = schema['lat'], schema['lon']
+    bexar_texas_data, dropped = read_san_antonio_rows(file_path, schema)
+    report_dropped_rows(file_path, len(bexar_texas_data), dropped)
+
+    with timed_stage('join'):
+        # Assigned each accident to its district, town and growth area straight from the coordinate arrays
+        layer_codes = join_layers(bexar_texas_data[lon_col].to_numpy(), bexar_texas_data[lat_col].to_numpy())
+        for column, codes in layer_codes.items():
+            bexar_texas_data[column] = codes
+
+        # Created a GeoDataFrame from the accident data
+        gdf_accidents = gpd.GeoDataFrame(bexar_texas_data,
+                                         geometry=gpd.points_from_xy(bexar_texas_data[lon_col],
+                                                                     bexar_texas_data[lat_col]),
+                                         crs="EPSG:4326")
+
+    # The dropped row counts travel with the year into its cache entry
+    gdf_accidents.attrs['dropped_rows'] = dropped
+    return gdf_accidents
+
+
+# Function to load one year, from the persistent cache when it is fresh, otherwise from its source file
+def load_year(year):
+    csv_path = year_csv_path(year)
+    source_path = cache_source_path(year, csv_path)
+    if source_path is None:
+        return None
+
+    with timed_stage('cache_read'):
+        gdf_accidents = load_cached_year(year, source_path)
+    if gdf_accidents is not None:
+        return gdf_accidents
+
+    if source_path != csv_path:
+        return migrate_legacy_year(year)
+
+    gdf_accidents = read_year_csv(csv_path)
+    if gdf_accidents is not None:
+        # Persist the joined data so the next start skips the CSV read and the spatial join
+        with timed_stage('cache_write'):
+            store_cached_year(year, gdf_accidents, csv_path)
+
+    return gdf_accidents
+
+
+# Compact column types of the per-year accident arrays, about 15 bytes an accident
+ACCIDENT_DTYPES = {'lon': 'float32', 'lat': 'float32', 'district': 'int16', 'fatalities': 'int16',
+                   'town': 'int16', 'growth_area': 'int16'}
+
+
+# Accidents of one year as compact arrays, which may be views into a larger store or a memory-mapped snapshot
+class YearAccidents:
+    def __init__(self, lon, lat, district, fatalities, town, growth_area):
+        self.lon = lon
+        self.lat = lat
+        self.district = district
+        self.fatalities = fatalities
+        self.town = town
+        self.growth_area = growth_area
+
+    # Function to build the arrays from columns of any type, missing or absent layer codes becoming MISSING_CODE
+    @classmethod
+    def from_columns(cls, lon, lat, district, fatalities, town=None, growth_area=None):
+        codes = [pd.to_numeric(pd.Series(np.asarray(column if column is not None else np.full(len(lon), np.nan))),
+                               errors='coerce').fillna(MISSING_CODE).to_numpy(dtype='int16')
+                 for column in (district, town, growth_area)]
+        fatalities = pd.to_numeric(pd.Series(np.asarray(fatalities)), errors='coerce').fillna(0)
+        return cls(np.asarray(lon, dtype=ACCIDENT_DTYPES['lon']), np.asarray(lat, dtype=ACCIDENT_DTYPES['lat']),
+                   codes[0], fatalities.to_numpy(dtype=ACCIDENT_DTYPES['fatalities']), codes[1], codes[2])
+
+    def __len__(self):
+        return len(self.lon)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ACCIDENT_DTYPES)
+
+
+# Function to take the arrays the dashboard needs out of a year's GeoDataFrame
+def year_accidents_from_gdf(gdf_accidents):
+    return YearAccidents.from_columns(gdf_accidents.geometry.x, gdf_accidents.geometry.y,
+                                      gdf_accidents['District'], gdf_accidents['FATALS'],
+                                      gdf_accidents.get('Town'), gdf_accidents.get('GrowthArea'))
+
+
+# Function to load one year as compact arrays, from the cache columns when fresh, without building any geometry
+def load_year_accidents(year):
+    source_path = cache_source_path(year, year_csv_path(year))
+    if source_path is None:
+        return None
+
+    with timed_stage('cache_read'):
+        accidents = load_cached_accidents(year, source_path)
+    if accidents is not None:
+        return accidents
+
+    gdf_accidents = load_year(year)
+    return year_accidents_from_gdf(gdf_accidents) if gdf_accidents is not None else None
+
+
+# Function to get a short content hash of a year's accidents, so results derived from them can tell when they are stale
+def accidents_version(accidents):
+    digest = hashlib.sha1()
+    for name in ('lon', 'lat', 'district'):
+        digest.update(np.ascontiguousarray(getattr(accidents, name), dtype=ACCIDENT_DTYPES[name]).tobytes())
+    return digest.hexdigest()[:16]
+
+
+# Function to load one year and measure how long it took, run inside the ingestion workers
+def timed_load_year(year, compact=False):
+    _stage_timings.seconds = {}
+    started = time.perf_counter()
+    try:
+        gdf_accidents = load_year_accidents(year) if compact else load_year(year)
+        return gdf_accidents, time.perf_counter() - started, _stage_timings.seconds
+    finally:
+        _stage_timings.seconds = None
+
+
+# Thread-safe record of how far the ingestion of each year has progressed
+class LoadProgress:
+    def __init__(self, years):
+        self._lock = threading.Lock()
+        self._states = {year: 'pending' for year in years}
+        self._load_seconds = {}
+        self._stage_seconds = {}
+        self.started_at = time.time()
+        self.finished_at = None
+        self.error = None
+
+    # Function to record the state of a year: pending, loading, ready, missing or failed
+    def mark(self, year, state, load_seconds=None, stage_seconds=None):
+        with self._lock:
+            self._states[year] = state
+            if load_seconds is not None:
+                self._load_seconds[year] = round(load_seconds, 3)
+            if stage_seconds:
+                self._stage_seconds[year] = {stage: round(seconds, 3) for stage, seconds in stage_seconds.items()}
+
+    # Function to record the end of the ingestion, with the error that stopped it if any
+    def finish(self, error=None):
+        with self._lock:
+            self.finished_at = time.time()
+            self.error = None if error is None else str(error)
+
+    @property
+    def ready(self):
+        return self.finished_at is not None and self.error is None
+
+    # Function to summarize the progress as a JSON-serializable dictionary
+    def snapshot(self):
+        with self._lock:
+            counts = {}
+            for state in self._states.values():
+                counts[state] = counts.get(state, 0) + 1
+
+            return {
+                'ready': self.finished_at is not None and self.error is None,
+                'error': self.error,
+                'elapsed_seconds': round((self.finished_at or time.time()) - self.started_at, 3),
+                'counts': counts,
+                'years': {str(year): {'state': state, 'load_seconds': self._load_seconds.get(year),
+                                      'stage_seconds': self._stage_seconds.get(year, {})}
+                          for year, state in sorted(self._states.items())},
+            }
+
+
+# Polls the data directory and hands every new or changed yearly CSV to a callback, one year at a time
+class YearFileWatcher:
+    def __init__(self, on_year_changed, interval_seconds=WATCH_INTERVAL_SECONDS):
+        self.on_year_changed = on_year_changed
+        self.interval_seconds = interval_seconds
+        self._stamps = self.scan()
+        self._thread = None
+
+    # Function to stamp each yearly CSV with its size and modification time
+    def scan(self):
+        stamps = {}
+        for year in available_years():
+            try:
+                stat = os.stat(year_csv_path(year))
+            except OSError:
+                continue
+            stamps[year] = (stat.st_size, stat.st_mtime_ns)
+        return stamps
+
+    # Function to scan once and pass each new or changed year to the callback, returning those years
+    def poll(self):
+        stamps = self.scan()
+        changed_years = [year for year, stamp in sorted(stamps.items()) if self._stamps.get(year) != stamp]
+
+        # Removed files are forgotten but their years stay loaded
+        self._stamps = {year: stamp for year, stamp in self._stamps.items() if year in stamps}
+        for year in changed_years:
+            try:
+                self.on_year_changed(year)
+            except Exception as error:
+                print(f"Could not ingest the new data for {year}: {error}")
+            # A failed year is retried only once its file changes again
+            self._stamps[year] = stamps[year]
+
+        return changed_years
+
+    # Function to keep polling in a daemon thread
+    def start(self):
+        def run():
+            while True:
+                time.sleep(self.interval_seconds)
+                self.poll()
+
+        self._thread = threading.Thread(target=run, name='year-file-watcher', daemon=True)
+        self._thread.start()
+
+
+# Function to ingest several years, fanning the uncached ones out across a process pool,
+# as GeoDataFrames or, when compact, as YearAccidents arrays that are much cheaper to send back from the workers
+def ingest_years(years, workers=None, progress=None, on_year_loaded=None, compact=False):
+    if workers is None:
+        workers = INGEST_WORKERS
+
+    loaded_years = {}
+    finished_years = set()
+    pending_years = []
+
+    # Function to record a finished year and hand it to the caller as soon as it is available
+    def record_year(year, gdf_accidents, load_seconds, stage_seconds=None):
+        finished_years.add(year)
+        loaded_years[year] = gdf_accidents
+        if progress is not None:
+            progress.mark(year, 'ready' if gdf_accidents is not None else 'missing', load_seconds, stage_seconds)
+        if gdf_accidents is not None and on_year_loaded is not None:
+            on_year_loaded(year, gdf_accidents)
+
+    # Function to record a year whose loading raised, without stopping the other years
+    def record_failure(year, error):
+        finished_years.add(year)
+        print(f"Could not load data for {year}: {error}")
+        if progress is not None:
+            progress.mark(year, 'failed')
+
+    # Years with a fresh cache entry load faster in this process than through a worker
+    for year in years:
+        source_path = cache_source_path(year, year_csv_path(year))
+        if source_path is None:
+            record_year(year, None, None)
+            continue
+
+        started = time.perf_counter()
+        if compact:
+            gdf_accidents = load_cached_accidents(year, source_path)
+        else:
+            gdf_accidents = load_cached_year(year, source_path)
+        if gdf_accidents is not None:
+            load_seconds = time.perf_counter() - started
+            record_year(year, gdf_accidents, load_seconds, {'cache_read': load_seconds})
+        else:
+            pending_years.append(year)
+
+    workers = min(workers, len(pending_years))
+    if workers > 1:
+        try:
+            # Spawned workers avoid forking a process that may already be running server threads
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+                futures = {}
+                for year in pending_years:
+                    futures[executor.submit(timed_load_year, year, compact)] = year
+                    if progress is not None:
+                        progress.mark(year, 'loading')
+
+                for future in as_completed(futures):
+                    try:
+                        gdf_accidents, load_seconds, stage_seconds = future.result()
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as error:
+                        record_failure(futures[future], error)
+                    else:
+                        record_year(futures[future], gdf_accidents, load_seconds, stage_seconds)
+        except (BrokenProcessPool, OSError) as error:
+            print(f"Parallel ingestion failed, continuing in a single process: {error}")
+
+    # Single-process fallback, also picking up any year a broken pool left behind
+    for year in pending_years:
+        if year in finished_years:
+            continue
+
+        if progress is not None:
+            progress.mark(year, 'loading')
+        try:
+            gdf_accidents, load_seconds, stage_seconds = timed_load_year(year, compact)
+        except Exception as error:
+            record_failure(year, error)
+        else:
+            record_year(year, gdf_accidents, load_seconds, stage_seconds)
+
+    return {year: loaded_years[year] for year in sorted(loaded_years) if loaded_years[year] is not None}
@@ -0,0 +1,118 @@
+import threading
+
+import numpy as np
+
+from accident_data import ACCIDENT_DTYPES, YearAccidents
+
+
+# Accidents of every loaded year in one set of compact arrays, with the row range of each year. Years are appended
+# in the order they arrive into buffers that grow geometrically, and compact() lays them out again in year order,
+# so any run of consecutive loaded years is a single slice of the arrays
+class AccidentStore:
+    def __init__(self, arrays=None, years=(), offsets=None):
+        if arrays is None:
+            arrays = {name: np.empty(0, dtype=dtype) for name, dtype in ACCIDENT_DTYPES.items()}
+        if offsets is None:
+            offsets = np.zeros(len(years) + 1, dtype=np.int64)
+
+        # Buffers may be longer than the rows in use, the rows past the used length are free for new years
+        self._buffers = arrays
+        self._length = int(offsets[-1])
+
+        # Arrays and row ranges are swapped in together so readers never see a half-updated store
+        self._state = (arrays, {year: (int(offsets[position]), int(offsets[position + 1]))
+                                for position, year in enumerate(years)})
+        self._lock = threading.Lock()
+
+    @property
+    def years(self):
+        return sorted(self._state[1])
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for values in self._buffers.values())
+
+    def __contains__(self, year):
+        return year in self._state[1]
+
+    def __len__(self):
+        return sum(stop - start for start, stop in self._state[1].values())
+
+    # Function to store the accidents of a year, replacing any earlier load of the same year. The rows are
+    # appended after every row in use, so views handed out earlier never change, and a replaced year's old rows
+    # stay unused until compact()
+    def set_year(self, year, accidents):
+        with self._lock:
+            start = self._length
+            stop = start + len(accidents)
+
+            # Grow the buffers geometrically, so loading years one by one copies each accident a bounded number of times
+            if stop > len(self._buffers['lon']):
+                capacity = max(stop, 2 * len(self._buffers['lon']))
+                buffers = {}
+                for name, dtype in ACCIDENT_DTYPES.items():
+                    buffers[name] = np.empty(capacity, dtype=dtype)
+                    buffers[name][:start] = self._buffers[name][:start]
+                self._buffers = buffers
+
+            for name, dtype in ACCIDENT_DTYPES.items():
+                self._buffers[name][start:stop] = np.asarray(getattr(accidents, name), dtype=dtype)
+            self._length = stop
+
+            segments = dict(self._state[1])
+            segments[year] = (start, stop)
+            self._state = ({name: values[:stop] for name, values in self._buffers.items()}, segments)
+
+    # Function to lay the years out again in year order without unused rows, copying every accident once,
+    # such as after a batch of years was loaded out of order
+    def compact(self):
+        with self._lock:
+            arrays, segments = self._state
+            years = sorted(segments)
+
+            # Nothing to do when the years are already in order, without unused or spare rows
+            live_rows = sum(stop - start for start, stop in segments.values())
+            if self._in_order(segments, years) and live_rows == self._length == len(self._buffers['lon']):
+                return
+
+            offsets = np.zeros(len(years) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([segments[year][1] - segments[year][0] for year in years])
+            compacted = {name: np.concatenate([np.empty(0, dtype=dtype)] +
+                                              [arrays[name][segments[year][0]:segments[year][1]] for year in years])
+                         for name, dtype in ACCIDENT_DTYPES.items()}
+
+            self._buffers = compacted
+            self._length = int(offsets[-1])
+            self._state = (compacted, {year: (int(offsets[position]), int(offsets[position + 1]))
+                                       for position, year in enumerate(years)})
+
+    # Function to get the accidents of a year as views into the store, or None when it is not loaded
+    def year(self, year):
+        arrays, segments = self._state
+        if year not in segments:
+            return None
+        return self._slice(arrays, *segments[year])
+
+    # Function to get the accidents of several years, a view when their rows follow each other in year order,
+    # else a copy
+    def select(self, selected_years):
+        arrays, segments = self._state
+        years = sorted(year for year in set(selected_years) if year in segments)
+        if not years:
+            return YearAccidents(*(np.empty(0, dtype=dtype) for dtype in ACCIDENT_DTYPES.values()))
+
+        if self._in_order(segments, years):
+            return self._slice(arrays, segments[years[0]][0], segments[years[-1]][1])
+
+        return YearAccidents(*(np.concatenate([arrays[name][segments[year][0]:segments[year][1]] for year in years])
+                               for name in ACCIDENT_DTYPES))
+
+    # Function to check whether the rows of the years follow each other in the given order
+    @staticmethod
+    def _in_order(segments, years):
+        return all(segments[previous][1] == segments[year][0] for previous, year in zip(years, years[1:]))
+
+    # Function to wrap one row range of the arrays as views
+    @staticmethod
+    def _slice(arrays, start, stop):
+        return YearAccidents(*(arrays[name][start:stop] for name in ACCIDENT_DTYPES))
@@ -0,0 +1,85 @@
+// Clientside callbacks of the accident map, run in the browser over data it already holds
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    accidentMap: {
+        // Show or hide the accident and speed hump tile layers, together with their hover markers
+        toggleLayers: function (toggleAccidents, toggleSpeedHumps, figure) {
+            if (!figure || !figure.data || figure.data.length < 4 || !figure.layout || !figure.layout.mapbox ||
+                !figure.layout.mapbox.layers) {
+                return window.dash_clientside.no_update;
+            }
+
+            const showAccidents = toggleAccidents.includes('show_accidents');
+            const showSpeedHumps = toggleSpeedHumps.includes('show_speed_humps');
+
+            const layers = figure.layout.mapbox.layers.slice();
+            layers[0] = Object.assign({}, layers[0], {visible: showAccidents});
+            layers[1] = Object.assign({}, layers[1], {visible: showSpeedHumps});
+
+            const data = figure.data.slice();
+            data[2] = Object.assign({}, data[2], {visible: showAccidents});
+            data[3] = Object.assign({}, data[3], {visible: showSpeedHumps});
+
+            const mapbox = Object.assign({}, figure.layout.mapbox, {layers: layers});
+            return Object.assign({}, figure, {data: data, layout: Object.assign({}, figure.layout, {mapbox: mapbox})});
+        },
+
+        // Recolor the districts and point the accident tiles at the selected years, from the district x year table
+        restyle: function (selectedYears, table, figure) {
+            if (!table || !figure || !figure.data || figure.data.length < 2 || !figure.layout.mapbox ||
+                !figure.layout.mapbox.layers) {
+                return window.dash_clientside.no_update;
+            }
+
+            const startYear = Math.min(...selectedYears);
+            const endYear = Math.max(...selectedYears);
+
+            // Sum the accidents and fatalities of every district over the loaded years of the range
+            const accidents = table.districts.map(() => 0);
+            const fatalities = table.districts.map(() => 0);
+            let loadedYears = 0;
+            let versions = '';
+            table.years.forEach((year, column) => {
+                if (year < startYear || year > endYear) {
+                    return;
+                }
+                loadedYears += 1;
+                versions += table.versions[column];
+                table.districts.forEach((district, row) => {
+                    accidents[row] += table.accidents[row][column];
+                    fatalities[row] += table.fatalities[row][column];
+                });
+            });
+            if (!loadedYears) {
+                return window.dash_clientside.no_update;
+            }
+
+            // Same title as the server builds, flagged while the warmup is still loading years of the range
+            const yearsLabel = startYear === endYear ? String(startYear) : startYear + '-' + endYear;
+            let title = 'Map of Accidents in the Districts of San Antonio - ' + yearsLabel;
+            if (!table.ready && loadedYears < endYear - startYear + 1) {
+                title += ' (still loading)';
+            }
+
+            const districts = Object.assign({}, figure.data[0], {
+                z: accidents,
+                customdata: table.districts.map((district, row) => [district, fatalities[row]]),
+                colorbar: Object.assign({}, figure.data[0].colorbar, {
+                    tickvals: accidents.slice().reverse(),
+                    ticktext: accidents.slice().reverse().map((count) => count.toFixed(1)),
+                }),
+            });
+
+            const layers = figure.layout.mapbox.layers.slice();
+            const source = layers[0].source[0].split('?')[0] +
+                '?start=' + startYear + '&end=' + endYear + '&v=' + versions;
+            layers[0] = Object.assign({}, layers[0], {source: [source]});
+
+            const layout = Object.assign({}, figure.layout, {
+                title: Object.assign({}, figure.layout.title, {text: title}),
+                coloraxis: Object.assign({}, figure.layout.coloraxis, {cmax: Math.max(35, ...accidents)}),
+                mapbox: Object.assign({}, figure.layout.mapbox, {layers: layers}),
+            });
+            return Object.assign({}, figure, {data: [districts].concat(figure.data.slice(1)), layout: layout});
+        },
+    },
+});
@@ -0,0 +1,152 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# The benchmarks run from a checkout, so the dashboard modules are imported from the repository root
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from accident_data import get_district_index  # noqa: E402
+from hotspots import EARTH_RADIUS_METERS  # noqa: E402
+
+
+# Column layouts seen across the yearly FARS extracts: latitude column, longitude column and how CITY is written
+LAYOUTS = {
+    'latitude': ('LATITUDE', 'LONGITUD', 'code'),
+    'latitud': ('LATITUD', 'LONGITUD', 'code'),
+    'lowercase': ('latitude', 'longitud', 'code'),
+    'short': ('LAT', 'LON', 'code'),
+    'named': ('LATITUDENAME', 'LONGITUDENAME', 'name'),
+}
+
+# FARS city and state codes of San Antonio, Texas
+SAN_ANTONIO_CITY = 6090
+TEXAS_STATE = 48
+
+# Coordinates FARS uses for unknown or unreported locations
+SENTINEL_COORDINATES = (77.7777, 88.8888, 99.9999)
+
+# Share of the San Antonio accidents drawn around hotspot centers rather than uniformly over the districts
+HOTSPOT_SHARE = 0.5
+HOTSPOT_CENTERS = 200
+HOTSPOT_SPREAD_METERS = 300
+
+
+# Function to draw points uniformly over a bounding box
+def uniform_points(rng, count, bounds):
+    min_lon, min_lat, max_lon, max_lat = bounds
+    return rng.uniform(min_lon, max_lon, count), rng.uniform(min_lat, max_lat, count)
+
+
+# Function to draw points around random centers, spread by a Gaussian of a given size in meters
+def clustered_points(rng, count, centers_lon, centers_lat, spread_meters):
+    picked = rng.integers(0, len(centers_lon), count)
+    spread_lat = np.degrees(spread_meters / EARTH_RADIUS_METERS)
+    spread_lon = spread_lat / np.cos(np.radians(centers_lat[picked]))
+    return (centers_lon[picked] + rng.normal(0, 1, count) * spread_lon,
+            centers_lat[picked] + rng.normal(0, 1, count) * spread_lat)
+
+
+# Function to draw points inside the council districts, by rejecting the ones the district index leaves out
+def points_in_districts(rng, count, draw):
+    district_index = get_district_index()
+    lon, lat = np.empty(0), np.empty(0)
+    while len(lon) < count:
+        candidate_lon, candidate_lat = draw(max(2 * (count - len(lon)), 1000))
+        inside = district_index.assign(candidate_lon, candidate_lat) >= 0
+        lon = np.concatenate([lon, candidate_lon[inside]])
+        lat = np.concatenate([lat, candidate_lat[inside]])
+    return lon[:count], lat[:count]
+
+
+# Function to build one synthetic year of FARS-style accidents, as a DataFrame in the requested column layout
+def synthetic_year(year, rows, layout='latitude', san_antonio_share=0.8, sentinel_share=0.01, seed=0):
+    rng = np.random.default_rng([seed, year])
+    lat_column, lon_column, city_format = LAYOUTS[layout]
+    bounds = get_district_index().bounds
+    bounds = (bounds[:, 0].min(), bounds[:, 1].min(), bounds[:, 2].max(), bounds[:, 3].max())
+
+    # San Antonio accidents fall inside the districts, half of them around hotspots shared by every year
+    san_antonio_rows = int(rows * san_antonio_share)
+    hotspot_rows = int(san_antonio_rows * HOTSPOT_SHARE)
+    center_rng = np.random.default_rng(seed)
+    centers_lon, centers_lat = points_in_districts(center_rng, HOTSPOT_CENTERS,
+                                                   lambda count: uniform_points(center_rng, count, bounds))
+    clustered_lon, clustered_lat = points_in_districts(
+        rng, hotspot_rows,
+        lambda count: clustered_points(rng, count, centers_lon, centers_lat, HOTSPOT_SPREAD_METERS))
+    uniform_lon, uniform_lat = points_in_districts(rng, san_antonio_rows - hotspot_rows,
+                                                   lambda count: uniform_points(rng, count, bounds))
+
+    # The other rows are accidents of other Texas cities around the county, which the reader filters out
+    other_lon, other_lat = uniform_points(rng, rows - san_antonio_rows, bounds)
+    lon = np.concatenate([clustered_lon, uniform_lon, other_lon])
+    lat = np.concatenate([clustered_lat, uniform_lat, other_lat])
+    city = np.concatenate([np.full(san_antonio_rows, SAN_ANTONIO_CITY),
+                           rng.choice([1830, 3760, 5390, 0, 9999], rows - san_antonio_rows)])
+
+    # A few accidents have unknown coordinates, reported with the FARS sentinel values
+    sentinel = rng.random(rows) < sentinel_share
+    lat[sentinel] = rng.choice(SENTINEL_COORDINATES, sentinel.sum())
+    lon[sentinel] = -rng.choice(SENTINEL_COORDINATES, sentinel.sum())
+
+    # Shuffle so San Antonio rows are spread over the file like in the real extracts
+    order = rng.permutation(rows)
+    months = rng.integers(1, 13, rows)
+    frame = pd.DataFrame({
+        'STATE': TEXAS_STATE,
+        'COUNTY': 29,
+        'MONTH': months,
+        'DAY': rng.integers(1, 29, rows),
+        'HOUR': rng.integers(0, 24, rows),
+        'MINUTE': rng.integers(0, 60, rows),
+        'PERSONS': rng.integers(1, 6, rows),
+        'FATALS': 1 + rng.binomial(2, 0.05, rows),
+        'DAY_WEEK': rng.integers(1, 8, rows),
+        'DRUNK_DR': rng.binomial(1, 0.3, rows),
+        'ST_CASE': TEXAS_STATE * 10000 + np.arange(1, rows + 1),
+        'CITY': city[order],
+        'YEAR': year,
+        lat_column: np.round(lat[order], 8),
+        lon_column: np.round(lon[order], 8),
+    })
+
+    if city_format == 'name':
+        frame['CITY'] = np.where(frame['CITY'] == SAN_ANTONIO_CITY, 'San Antonio', 'Other City')
+
+    return frame
+
+
+# Function to write synthetic yearly CSVs named like the Bexar County extracts, cycling through the layouts
+def generate_years(directory, years, rows, layouts=None, seed=0):
+    layouts = layouts or list(LAYOUTS)
+    os.makedirs(directory, exist_ok=True)
+
+    paths = []
+    for position, year in enumerate(years):
+        path = os.path.join(directory, f"{year}_bexar_county.csv")
+        synthetic_year(year, rows, layout=layouts[position % len(layouts)], seed=seed).to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write synthetic FARS-style yearly accident CSVs")
+    parser.add_argument('directory', help="directory the yearly CSVs are written to")
+    parser.add_argument('--rows', type=int, default=20000, help="rows per year")
+    parser.add_argument('--first-year', type=int, default=2017)
+    parser.add_argument('--last-year', type=int, default=2021)
+    parser.add_argument('--layouts', nargs='+', choices=sorted(LAYOUTS), default=None,
+                        help="column layouts cycled through the years, all of them by default")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # The district polygons are read relative to the repository root
+    directory = os.path.abspath(args.directory)
+    os.chdir(REPO_ROOT)
+    for path in generate_years(directory, range(args.first_year, args.last_year + 1), args.rows, args.layouts,
+                               args.seed):
+        print(f"Wrote {path}")
@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+# The benchmarks run from a checkout, so the dashboard modules are imported from the repository root
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from generate_fars import generate_years  # noqa: E402
+
+# Bump whenever the cases or the fields of the report change, so reports of different layouts are not compared
+REPORT_FORMAT_VERSION = 3
+
+# Default rows per synthetic year of each scale, and the synthetic years, the last ones the dashboard preloads
+DEFAULT_SCALES = (2000, 20000, 100000)
+DEFAULT_YEARS = 5
+LAST_YEAR = 2021
+
+# Process peak memory is only available on Unix
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Function to get the peak resident memory of this process in bytes, or None where it cannot be read
+def peak_rss_bytes():
+    if resource is None:
+        return None
+
+    # Linux reports kilobytes and macOS bytes
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+# Function to time a case several times, then measure its peak Python heap growth in one more traced run
+def time_case(run, repeat, items=1, setup=None, traced_run=True):
+    latencies, payload_bytes = [], None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+
+        started = time.perf_counter()
+        result = run()
+        latencies.append(time.perf_counter() - started)
+
+        if isinstance(result, (bytes, bytearray)):
+            payload_bytes = len(result)
+
+    # Tracing slows allocation-heavy code down, so the traced run is kept out of the latencies
+    peak_bytes = None
+    if traced_run:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        run()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    latencies = np.array(latencies)
+    return {
+        'runs': repeat,
+        'items': items,
+        'mean_seconds': float(latencies.mean()),
+        'min_seconds': float(latencies.min()),
+        'max_seconds': float(latencies.max()),
+        'p50_seconds': float(np.percentile(latencies, 50)),
+        'p90_seconds': float(np.percentile(latencies, 90)),
+        'p99_seconds': float(np.percentile(latencies, 99)),
+        'items_per_second': float(items / np.median(latencies)) if np.median(latencies) > 0 else None,
+        'peak_traced_bytes': peak_bytes,
+        'payload_bytes': payload_bytes,
+    }
+
+
+# Function to call a Dash callback through the Flask test client, returning the response body
+def dash_request(client, outputs, inputs, state=()):
+    output_ids = [{'id': output.rsplit('.', 1)[0], 'property': output.rsplit('.', 1)[1]} for output in outputs]
+    payload = {
+        'output': outputs[0] if len(outputs) == 1 else '..' + '...'.join(outputs) + '..',
+        'outputs': output_ids[0] if len(outputs) == 1 else output_ids,
+        'inputs': [{'id': component, 'property': prop, 'value': value} for component, prop, value in inputs],
+        'changedPropIds': [f"{inputs[0][0]}.{inputs[0][1]}"],
+        'state': [{'id': component, 'property': prop, 'value': value} for component, prop, value in state],
+    }
+    response = client.post('/_dash-update-component', json=payload)
+    if response.status_code != 200:
+        raise RuntimeError(f"Callback for {outputs} answered {response.status_code}")
+    return response.get_data()
+
+
+# Function to run every case against one generated data set, inside a fresh process configured by the environment
+def run_scale(rows, years, repeat):
+    import main
+    import pandas as pd
+    from accident_data import (cache_paths, detect_lat_lon_columns, get_district_index, get_layer_index,
+                               timed_load_year, year_csv_path)
+    from hotspots import perform_dbscan_clustering
+
+    cases = {}
+    total_rows = rows * len(years)
+
+    # Cold start: read, filter and join every CSV, then build the tables, rasters, tile indexes and hotspots
+    cases['warmup'] = time_case(main.warmup, 1, items=total_rows, traced_run=False)
+    if main.warmup_progress.error:
+        raise RuntimeError(f"Warmup failed: {main.warmup_progress.error}")
+
+    # Loading one year as the watcher does, from its CSV and then from the per-year cache
+    year = years[-1]
+
+    # Function to drop the cache entry of the year so loading it reads and joins the CSV again. Only its parquet
+    # and JSON files go, never a legacy joblib dump, which may be the only copy of a year
+    def reset_cache():
+        parquet_path, metadata_path, _ = cache_paths(year)
+        for path in (parquet_path, metadata_path):
+            if os.path.exists(path):
+                os.remove(path)
+    cases['load_year_cold'] = time_case(lambda: timed_load_year(year, compact=True), repeat, items=rows,
+                                        setup=reset_cache)
+    cases['load_year_cached'] = time_case(lambda: timed_load_year(year, compact=True), repeat, items=rows)
+
+    # District assignment of every raw point of the year, inside the districts or not
+    raw_rows = pd.read_csv(year_csv_path(year), encoding='ISO-8859-1')
+    lat_column, lon_column = detect_lat_lon_columns(raw_rows.columns)
+    raw_lon, raw_lat = raw_rows[lon_column].to_numpy(), raw_rows[lat_column].to_numpy()
+    cases['district_assignment'] = time_case(lambda: get_district_index().assign(raw_lon, raw_lat), repeat,
+                                             items=len(raw_lon))
+
+    # Assignment of the same points to every polygon layer in one pass
+    cases['layer_assignment'] = time_case(lambda: get_layer_index().assign(raw_lon, raw_lat), repeat,
+                                          items=len(raw_lon))
+
+    # Clustering of the default hotspot selection
+    longitudes, latitudes = main.hotspot_coordinates(tuple(years), main.HOTSPOT_DISTRICTS)
+    cases['perform_dbscan_clustering'] = time_case(
+        lambda: perform_dbscan_clustering(longitudes, latitudes, eps=main.HOTSPOT_EPS_METERS,
+                                          min_samples=main.HOTSPOT_MIN_SAMPLES),
+        repeat, items=len(longitudes))
+
+    # Callbacks through the Flask test client, the hotspot one with its in-memory cache emptied every run
+    client = main.app.server.test_client()
+    year_range = [years[0], years[-1]]
+    cases['update_hotspot_map'] = time_case(
+        lambda: dash_request(client, ['hotspot-map.figure'],
+                             [('hotspot-map', 'clickData', None), ('warmup-interval', 'n_intervals', 1),
+                              ('hotspot-year-slider', 'value', year_range),
+                              ('hotspot-districts', 'value', list(main.HOTSPOT_DISTRICTS)),
+                              ('hotspot-eps', 'value', main.HOTSPOT_EPS_METERS),
+                              ('hotspot-min-samples', 'value', main.HOTSPOT_MIN_SAMPLES),
+                              ('data-generation', 'data', main.data_generation)]),
+        repeat, setup=main.hotspot_cache.clear)
+    cases['update_map'] = time_case(
+        lambda: dash_request(client, ['accident-map.figure', 'accident-map-base.data'],
+                             [('year-slider', 'value', year_range), ('accident-map', 'clickData', None),
+                              ('accident-map', 'relayoutData', None), ('warmup-interval', 'n_intervals', 1)],
+                             [('toggle-accidents', 'value', ['on']), ('toggle-speed-humps', 'value', ['on']),
+                              ('accident-map-base', 'data', None)]),
+        repeat)
+    cases['update_district_accidents_graph'] = time_case(
+        lambda: dash_request(client, ['district-accidents-chart.figure', 'district-accidents-graph.figure'],
+                             [('year-slider', 'value', year_range), ('warmup-interval', 'n_intervals', 1),
+                              ('data-generation', 'data', main.data_generation)]),
+        repeat)
+
+    return {'rows_per_year': rows, 'years': list(years), 'total_rows': total_rows,
+            'peak_rss_bytes': peak_rss_bytes(), 'cases': cases}
+
+
+# Function to get the commit the benchmarks ran against, so reports can be matched to versions
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Function to generate the data of every scale and run each scale in its own process
+def run_benchmarks(scales, year_count, repeat, work_dir):
+    years = list(range(LAST_YEAR - year_count + 1, LAST_YEAR + 1))
+    report = {'format_version': REPORT_FORMAT_VERSION, 'commit': git_commit(), 'python': platform.python_version(),
+              'platform': platform.platform(), 'cpu_count': os.cpu_count(), 'repeat': repeat, 'scales': []}
+
+    for rows in scales:
+        scale_dir = os.path.join(work_dir, f"rows_{rows}")
+        generate_years(os.path.join(scale_dir, 'data'), years, rows)
+
+        # Every scale gets its own data, caches and a process of its own so memory peaks do not carry over
+        environment = dict(os.environ, ACCIDENT_DATA_DIR=os.path.join(scale_dir, 'data'),
+                           ACCIDENT_CACHE_DIR=os.path.join(scale_dir, 'cache'), ACCIDENT_HOTSPOT_CACHE_DIR='',
+                           ACCIDENT_WARMUP='0')
+        environment.pop('ACCIDENT_SNAPSHOT_DIR', None)
+        result_path = os.path.join(scale_dir, 'result.json')
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--scale-rows', str(rows), '--scale-years',
+                        *map(str, years), '--repeat', str(repeat), '--result-file', result_path],
+                       cwd=REPO_ROOT, env=environment, check=True)
+
+        with open(result_path) as handle:
+            report['scales'].append(json.load(handle))
+        print(f"Finished {rows} rows per year", file=sys.stderr)
+
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard on synthetic FARS-style data")
+    parser.add_argument('--scales', type=int, nargs='+', default=list(DEFAULT_SCALES), help="rows per year of each scale")
+    parser.add_argument('--years', type=int, default=DEFAULT_YEARS, help="number of synthetic years")
+    parser.add_argument('--repeat', type=int, default=5, help="runs of every case")
+    parser.add_argument('--output', help="file the JSON report is written to, stdout when unset")
+    parser.add_argument('--work-dir', help="directory for the generated data, a temporary one when unset")
+    parser.add_argument('--scale-rows', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--scale-years', type=int, nargs='+', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # The GeoJSON layers are read relative to the repository root
+    os.chdir(REPO_ROOT)
+
+    if args.scale_rows is not None:
+        # Worker mode, started by run_benchmarks for one scale, which points it at generated data and a scratch cache
+        if not os.environ.get('ACCIDENT_DATA_DIR') or not os.environ.get('ACCIDENT_CACHE_DIR'):
+            parser.error("--scale-rows only runs inside the benchmark runner, with ACCIDENT_DATA_DIR and "
+                         "ACCIDENT_CACHE_DIR set to its work directory")
+        result = run_scale(args.scale_rows, args.scale_years, args.repeat)
+        with open(args.result_file, 'w') as handle:
+            json.dump(result, handle, indent=2)
+    else:
+        work_dir = args.work_dir or tempfile.mkdtemp(prefix='accident-benchmarks-')
+        try:
+            report = run_benchmarks(args.scales, args.years, args.repeat, work_dir)
+        finally:
+            if args.work_dir is None:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        report_json = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, 'w') as handle:
+                handle.write(report_json)
+        else:
+            print(report_json)
@@ -0,0 +1,114 @@
+import threading
+
+import numpy as np
+from scipy.signal import fftconvolve
+
+from hotspots import EARTH_RADIUS_METERS
+
+
+# Default cell size and kernel bandwidth of the accident density rasters, in meters
+DENSITY_CELL_METERS = 100
+DENSITY_BANDWIDTH_METERS = 500
+
+# Fixed lon/lat grid covering the city, with square cells of a given size in meters
+class DensityGrid:
+    def __init__(self, min_lon, min_lat, max_lon, max_lat, cell_meters=DENSITY_CELL_METERS):
+        self.cell_meters = cell_meters
+        self.min_lon = min_lon
+        self.min_lat = min_lat
+
+        # Cell sizes in degrees, the longitude one shrinks with the cosine of the latitude
+        middle_lat = np.radians((min_lat + max_lat) / 2)
+        self.cell_lat = np.degrees(cell_meters / EARTH_RADIUS_METERS)
+        self.cell_lon = self.cell_lat / np.cos(middle_lat)
+
+        self.width = int(np.ceil((max_lon - min_lon) / self.cell_lon))
+        self.height = int(np.ceil((max_lat - min_lat) / self.cell_lat))
+
+    # Function to build a grid around a polygon layer, padded so kernels near its edge are not cut off
+    @classmethod
+    def around(cls, gdf_polygons, cell_meters=DENSITY_CELL_METERS, margin_meters=2000):
+        min_lon, min_lat, max_lon, max_lat = gdf_polygons.total_bounds
+        margin_lat = np.degrees(margin_meters / EARTH_RADIUS_METERS)
+        margin_lon = margin_lat / np.cos(np.radians((min_lat + max_lat) / 2))
+        return cls(min_lon - margin_lon, min_lat - margin_lat, max_lon + margin_lon, max_lat + margin_lat,
+                   cell_meters=cell_meters)
+
+    @property
+    def shape(self):
+        return self.height, self.width
+
+    # Function to get the row and column of the cell holding each point, -1 for points off the grid
+    def cell_index(self, lon, lat):
+        columns = np.floor((np.asarray(lon, dtype='float64') - self.min_lon) / self.cell_lon).astype(np.intp)
+        rows = np.floor((np.asarray(lat, dtype='float64') - self.min_lat) / self.cell_lat).astype(np.intp)
+        off_grid = (columns < 0) | (columns >= self.width) | (rows < 0) | (rows >= self.height)
+        rows[off_grid] = -1
+        columns[off_grid] = -1
+        return rows, columns
+
+    # Function to get the lon/lat of the center of every cell, as two arrays shaped like the grid
+    def cell_centers(self):
+        lon = self.min_lon + (np.arange(self.width) + 0.5) * self.cell_lon
+        lat = self.min_lat + (np.arange(self.height) + 0.5) * self.cell_lat
+        return np.meshgrid(lon, lat)
+
+
+# Function to build the Gaussian kernel of a bandwidth in meters, sampled on the grid cells and summing to one
+def gaussian_kernel(bandwidth_meters, cell_meters):
+    sigma = bandwidth_meters / cell_meters
+    radius = int(np.ceil(4 * sigma))
+    offsets = np.arange(-radius, radius + 1)
+    profile = np.exp(-0.5 * (offsets / sigma) ** 2)
+    kernel = np.outer(profile, profile)
+    return kernel / kernel.sum()
+
+
+# Function to estimate the density of accidents on the grid, by binning the points and convolving with the kernel
+def kde_raster(lon, lat, grid, kernel):
+    rows, columns = grid.cell_index(lon, lat)
+    on_grid = rows >= 0
+
+    # Histogram of the points over the cells
+    counts = np.bincount(rows[on_grid] * grid.width + columns[on_grid], minlength=grid.width * grid.height)
+    counts = counts.reshape(grid.shape).astype('float64')
+
+    # The FFT convolution costs the same however many points there are, and leaves tiny negative round-off
+    density = fftconvolve(counts, kernel, mode='same')
+    return np.clip(density, 0, None).astype('float32')
+
+
+# Per-year accident density rasters on one grid, so any year range is a sum of stored rasters
+class DensityRasterStore:
+    def __init__(self, grid, bandwidth_meters=DENSITY_BANDWIDTH_METERS):
+        self.grid = grid
+        self.bandwidth_meters = bandwidth_meters
+        self.kernel = gaussian_kernel(bandwidth_meters, grid.cell_meters)
+        self._rasters = {}
+        self._lock = threading.Lock()
+
+    # Function to store the density raster of a year, replacing any earlier one
+    def set_year(self, year, lon, lat):
+        self.set_raster(year, kde_raster(lon, lat, self.grid, self.kernel))
+
+    # Function to store an already computed density raster of a year, such as one read from a snapshot
+    def set_raster(self, year, raster):
+        if raster.shape != self.grid.shape:
+            raise ValueError(f"Density raster of {year} has shape {raster.shape}, expected {self.grid.shape}")
+        with self._lock:
+            self._rasters[year] = raster
+
+    # Function to get the stored density raster of a year, or None when it has not been computed
+    def year_raster(self, year):
+        with self._lock:
+            return self._rasters.get(year)
+
+    # Function to get the summed density of the given years, in expected accidents per cell
+    def range_density(self, years):
+        with self._lock:
+            rasters = [self._rasters[year] for year in years if year in self._rasters]
+
+        density = np.zeros(self.grid.shape, dtype='float32')
+        for raster in rasters:
+            density += raster
+        return density
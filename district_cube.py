@@ -0,0 +1,104 @@
+import threading
+
+import numpy as np
+
+
+# Dense district x year table of accident counts and fatalities, with prefix sums along the years
+class DistrictYearCube:
+    def __init__(self, districts, first_year, last_year):
+        # District codes in the order of the council district layer, which is the order of every result
+        self.districts = np.asarray(districts).astype('int16')
+        self.first_year = first_year
+        self._lock = threading.Lock()
+
+        # Lookup table from a district code to its row in the cube
+        self._rows = np.full(int(self.districts.max()) + 1, -1, dtype=np.intp)
+        self._rows[self.districts] = np.arange(len(self.districts))
+
+        year_count = last_year - first_year + 1
+        self.accidents = np.zeros((len(self.districts), year_count), dtype=np.int32)
+        self.fatalities = np.zeros((len(self.districts), year_count), dtype=np.int32)
+        self.loaded = np.zeros(year_count, dtype=bool)
+        self._rebuild_prefix_sums()
+
+    @property
+    def years(self):
+        return np.arange(self.first_year, self.first_year + self.accidents.shape[1])
+
+    # Function to recompute the prefix sums; column k holds the total of the years before the k-th
+    def _rebuild_prefix_sums(self):
+        padding = np.zeros((len(self.districts), 1), dtype=np.int64)
+
+        # The sums and their first year are swapped in with one assignment so readers never see a mismatch
+        self._prefix_sums = (self.first_year,
+                             np.hstack([padding, np.cumsum(self.accidents, axis=1)]),
+                             np.hstack([padding, np.cumsum(self.fatalities, axis=1)]))
+
+    # Function to widen the table so that it covers a year
+    def _ensure_year(self, year):
+        if year < self.first_year:
+            extra = self.first_year - year
+            self.accidents = np.pad(self.accidents, ((0, 0), (extra, 0)))
+            self.fatalities = np.pad(self.fatalities, ((0, 0), (extra, 0)))
+            self.loaded = np.pad(self.loaded, (extra, 0))
+            self.first_year = year
+        elif year >= self.first_year + self.accidents.shape[1]:
+            extra = year - self.first_year - self.accidents.shape[1] + 1
+            self.accidents = np.pad(self.accidents, ((0, 0), (0, extra)))
+            self.fatalities = np.pad(self.fatalities, ((0, 0), (0, extra)))
+            self.loaded = np.pad(self.loaded, (0, extra))
+
+        return year - self.first_year
+
+    # Function to store the accidents of a year, replacing any earlier values so nothing is double-counted
+    def set_year(self, year, district_codes, fatalities):
+        district_codes = np.nan_to_num(np.asarray(district_codes, dtype='float64'), nan=-1).astype(np.intp)
+        fatalities = np.asarray(fatalities, dtype='float64')
+
+        # Accidents outside every district or in an unknown district are left out of the table
+        known = (district_codes >= 0) & (district_codes < len(self._rows))
+        rows = self._rows[district_codes[known]]
+        in_table = rows >= 0
+
+        year_accidents = np.bincount(rows[in_table], minlength=len(self.districts))
+        year_fatalities = np.bincount(rows[in_table], weights=fatalities[known][in_table],
+                                      minlength=len(self.districts))
+
+        with self._lock:
+            column = self._ensure_year(year)
+            self.accidents[:, column] = year_accidents
+            self.fatalities[:, column] = year_fatalities
+            self.loaded[column] = True
+            self._rebuild_prefix_sums()
+
+    # Function to get the total accidents and fatalities per district over an inclusive year range
+    def range_totals(self, start_year, end_year):
+        first_year, accident_sums, fatality_sums = self._prefix_sums
+        year_count = accident_sums.shape[1] - 1
+
+        # Clip the range to the years in the table, an empty range gives zero totals
+        start = min(max(start_year - first_year, 0), year_count)
+        end = min(max(end_year - first_year + 1, start), year_count)
+
+        return accident_sums[:, end] - accident_sums[:, start], fatality_sums[:, end] - fatality_sums[:, start]
+
+    # Function to list the loaded years within an inclusive year range
+    def loaded_years(self, start_year=None, end_year=None):
+        with self._lock:
+            years = self.years[self.loaded]
+        if start_year is not None:
+            years = years[years >= start_year]
+        if end_year is not None:
+            years = years[years <= end_year]
+        return years.tolist()
+
+    # Function to get the per-year accident counts of every district, for the loaded years only
+    def accidents_by_year(self):
+        with self._lock:
+            return self.years[self.loaded], self.accidents[:, self.loaded].copy()
+
+    # Function to get the per-year accident and fatality counts of every district, for the loaded years only
+    def loaded_table(self):
+        with self._lock:
+            return (self.years[self.loaded], self.accidents[:, self.loaded].copy(),
+                    self.fatalities[:, self.loaded].copy())
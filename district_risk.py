@@ -0,0 +1,91 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+# Deaths per micromort, a one-in-a-million chance of death
+MICROMORT = 1e-6
+
+# CSV of the residents of each district, with District and Population columns, measuring micromorts against
+# the residents instead of the accidents
+POPULATION_PATH = os.environ.get("ACCIDENT_DISTRICT_POPULATION")
+
+
+# Function to read the residents of each district, or None when no population file is configured or readable
+def load_district_population(path=POPULATION_PATH):
+    if not path:
+        return None
+
+    try:
+        population = pd.read_csv(path, usecols=['District', 'Population'])
+    except (OSError, ValueError) as error:
+        print(f"Could not read district population from {path}: {error}")
+        return None
+
+    population = population.dropna()
+    return dict(zip(population['District'].astype(int), population['Population'].astype(float)))
+
+
+# Function to compute the micromorts, accident share and fatality share of every district over a year range.
+# Micromorts follow the analysis' formula y = (k/p) * (1000000/p), k being the fatalities of the district and p
+# its accidents, or its residents when a population is given
+def district_risk(districts, accidents, fatalities, population=None):
+    accidents = np.asarray(accidents, dtype='float64')
+    fatalities = np.asarray(fatalities, dtype='float64')
+    if population is not None:
+        exposure = np.array([population.get(int(district), np.nan) for district in districts], dtype='float64')
+    else:
+        exposure = accidents
+
+    # Zero for districts without accidents or residents, and shares of zero when nothing happened in the range
+    with np.errstate(divide='ignore', invalid='ignore'):
+        micromorts = np.nan_to_num(fatalities / exposure * (1 / MICROMORT) / exposure, nan=0.0, posinf=0.0)
+        accident_share = np.nan_to_num(accidents / accidents.sum() * 100)
+        fatality_share = np.nan_to_num(fatalities / fatalities.sum() * 100)
+
+    return {
+        'districts': np.asarray(districts),
+        'accidents': accidents,
+        'fatalities': fatalities,
+        'accident_share': accident_share,
+        'fatality_share': fatality_share,
+        'micromorts': micromorts,
+        'per_resident': population is not None,
+    }
+
+
+# Bounded LRU cache of results derived from a year range, keyed by the range and the data versions of its years
+class RangeCache:
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Function to get the result for a key, computing and storing it on a miss
+    def get(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        result = compute()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = result
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    # Function to summarize the cache counters
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions}
@@ -0,0 +1,64 @@
+import numpy as np
+import shapely
+
+
+# Map zoom levels a simplified copy of each polygon layer is kept for, past the last one the full geometry is used
+PYRAMID_ZOOMS = (9, 10, 12, 14)
+
+
+# Function to get the simplification tolerance in degrees for a zoom level, half a pixel of a 256 pixel tile
+def zoom_tolerance(zoom):
+    return 360 / (256 * 2 ** zoom) / 2
+
+
+# Function to get the decimals coordinates are rounded to at a zoom level, a quarter of its tolerance
+def zoom_decimals(zoom):
+    return int(np.ceil(-np.log10(zoom_tolerance(zoom) / 4)))
+
+
+# Function to simplify the polygons of a layer together, so borders shared by neighbouring polygons stay shared
+def simplify_coverage(geometries, tolerance):
+    if hasattr(shapely, 'coverage_simplify'):
+        return shapely.coverage_simplify(geometries, tolerance)
+
+    # Older shapely releases can only simplify each polygon on its own
+    return shapely.simplify(geometries, tolerance, preserve_topology=True)
+
+
+# Function to quantize and simplify the polygons of a layer for one zoom level
+def simplify_for_zoom(geometries, zoom):
+    # Rounding first keeps shared vertices identical, and simplification only ever drops vertices
+    quantized = shapely.set_precision(geometries, 10 ** -zoom_decimals(zoom))
+    return simplify_coverage(quantized, zoom_tolerance(zoom))
+
+
+# Simplified copies of a polygon layer for each zoom level of the pyramid
+class GeometryPyramid:
+    def __init__(self, gdf_polygons, zooms=PYRAMID_ZOOMS):
+        self.full = gdf_polygons
+        self.zooms = sorted(zooms)
+        self.levels = {zoom: gdf_polygons.set_geometry(simplify_for_zoom(gdf_polygons.geometry.to_numpy(), zoom),
+                                                       crs=gdf_polygons.crs)
+                       for zoom in self.zooms}
+
+        # GeoJSON of every level, built once for the figures and patches that embed it
+        self._geo_interfaces = {}
+
+    # Function to pick the level for a map zoom, the coarsest one still detailed enough, or None for full detail
+    def level_for_zoom(self, zoom):
+        for level in self.zooms:
+            if zoom <= level:
+                return level
+        return None
+
+    # Function to get the layer simplified for a map zoom
+    def for_zoom(self, zoom):
+        level = self.level_for_zoom(zoom)
+        return self.full if level is None else self.levels[level]
+
+    # Function to get the GeoJSON of the layer simplified for a map zoom
+    def geojson_for_zoom(self, zoom):
+        level = self.level_for_zoom(zoom)
+        if level not in self._geo_interfaces:
+            self._geo_interfaces[level] = self.for_zoom(zoom).geometry.__geo_interface__
+        return self._geo_interfaces[level]
@@ -0,0 +1,254 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+
+# Bump whenever the clustering or the density estimate changes so persisted results get recomputed
+HOTSPOT_CACHE_VERSION = 3
+
+# Mean radius of the earth in meters, used by the local projection
+EARTH_RADIUS_METERS = 6371008.8
+
+# Points per strip of the neighbour search, bounding the memory of the pairs held at once
+CLUSTER_CHUNK_POINTS = 100_000
+
+# Default selection and clustering parameters of the hotspots, shown by the dashboard and precomputed nightly
+DEFAULT_HOTSPOT_DISTRICTS = (1, 2, 3, 5)
+DEFAULT_EPS_METERS = 1000
+DEFAULT_MIN_SAMPLES = 5
+
+# Names of the arrays making up a hotspot result, in the order they are stored on disk
+HOTSPOT_ARRAYS = ['longitudes', 'latitudes', 'cluster_labels', 'dense_longitudes', 'dense_latitudes', 'dense_densities']
+
+
+# Function to project lon/lat degrees onto a local plane in meters, accurate to well under a percent across a county
+def project_to_meters(longitudes, latitudes):
+    longitudes = np.asarray(longitudes, dtype='float64')
+    latitudes = np.asarray(latitudes, dtype='float64')
+    if not len(longitudes):
+        return np.empty((0, 2))
+
+    # Equirectangular projection around the middle of the points
+    origin_lon = (np.min(longitudes) + np.max(longitudes)) / 2
+    origin_lat = (np.min(latitudes) + np.max(latitudes)) / 2
+    x = np.radians(longitudes - origin_lon) * np.cos(np.radians(origin_lat)) * EARTH_RADIUS_METERS
+    y = np.radians(latitudes - origin_lat) * EARTH_RADIUS_METERS
+    return np.column_stack((x, y))
+
+
+# Function to find every pair of points within eps of each other, one strip of points sorted along x at a time
+def neighbour_pairs(coordinates, eps, chunk_points=CLUSTER_CHUNK_POINTS):
+    order = np.argsort(coordinates[:, 0], kind='stable')
+    sorted_x = coordinates[order, 0]
+
+    for start in range(0, len(order), chunk_points):
+        stop = min(start + chunk_points, len(order))
+
+        # Only the points within eps of the strip along x can be neighbours of its points
+        first = np.searchsorted(sorted_x, sorted_x[start] - eps, side='left')
+        last = np.searchsorted(sorted_x, sorted_x[stop - 1] + eps, side='right')
+        strip, window = order[start:stop], order[first:last]
+
+        # Dual-tree query between the strip and its window, every point is its own neighbour
+        pairs = cKDTree(coordinates[strip]).sparse_distance_matrix(cKDTree(coordinates[window]), eps,
+                                                                   output_type='ndarray')
+        yield strip[pairs['i']], window[pairs['j']]
+
+
+# Define function to perform DBSCAN clustering, with eps in meters
+def perform_dbscan_clustering(longitudes, latitudes, eps=1000, min_samples=5):
+    coordinates = project_to_meters(longitudes, latitudes)
+    cluster_labels = np.full(len(coordinates), -1, dtype=np.intp)
+    if not len(coordinates):
+        return cluster_labels
+
+    # Core points have at least min_samples points, themselves included, within eps
+    neighbour_counts = np.zeros(len(coordinates), dtype=np.intp)
+    for sources, _ in neighbour_pairs(coordinates, eps):
+        neighbour_counts += np.bincount(sources, minlength=len(coordinates))
+    core_indices = np.flatnonzero(neighbour_counts >= min_samples)
+    if not len(core_indices):
+        return cluster_labels
+
+    # Clusters are the connected components of core points within eps of each other,
+    # merged one strip of edges at a time so the full neighbour graph is never held in memory
+    core_coordinates = coordinates[core_indices]
+    components = np.arange(len(core_indices))
+    for sources, targets in neighbour_pairs(core_coordinates, eps):
+        graph = coo_matrix((np.ones(len(sources), dtype=np.int8), (components[sources], components[targets])),
+                           shape=(len(core_indices), len(core_indices)))
+        components = connected_components(graph, directed=False)[1][components]
+
+    # Number the clusters from zero
+    cluster_labels[core_indices] = np.unique(components, return_inverse=True)[1]
+
+    # Border points join the cluster of their nearest core point within eps, the rest stay noise (-1)
+    core_tree = cKDTree(core_coordinates)
+    border_indices = np.flatnonzero(neighbour_counts < min_samples)
+    for start in range(0, len(border_indices), CLUSTER_CHUNK_POINTS):
+        chunk = border_indices[start:start + CLUSTER_CHUNK_POINTS]
+        distances, nearest = core_tree.query(coordinates[chunk], k=1, distance_upper_bound=eps)
+        is_border = np.isfinite(distances)
+        cluster_labels[chunk[is_border]] = cluster_labels[core_indices[nearest[is_border]]]
+
+    return cluster_labels
+
+
+# Function to find the grid cells of each cluster where the density of accidents is highest
+def find_dense_cells(longitudes, latitudes, cluster_labels, density, grid, threshold=0.5):
+    # Cells holding the clustered points
+    clustered = cluster_labels != -1
+    rows, columns = grid.cell_index(longitudes[clustered], latitudes[clustered])
+    labels = cluster_labels[clustered]
+    on_grid = rows >= 0
+    rows, columns, labels = rows[on_grid], columns[on_grid], labels[on_grid]
+    if not len(labels):
+        return np.empty(0), np.empty(0), np.empty(0)
+
+    # Bounding box of every cluster in cells
+    cluster_count = labels.max() + 1
+    first_rows = np.full(cluster_count, grid.height)
+    last_rows = np.full(cluster_count, -1)
+    first_columns = np.full(cluster_count, grid.width)
+    last_columns = np.full(cluster_count, -1)
+    np.minimum.at(first_rows, labels, rows)
+    np.maximum.at(last_rows, labels, rows)
+    np.minimum.at(first_columns, labels, columns)
+    np.maximum.at(last_columns, labels, columns)
+
+    dense_longitudes, dense_latitudes, dense_densities = [], [], []
+    for label in np.unique(labels):
+        # Normalize the density over the cluster's box and keep the cells above the threshold
+        window = density[first_rows[label]:last_rows[label] + 1, first_columns[label]:last_columns[label] + 1]
+        peak = window.max()
+        if peak <= 0:
+            continue
+        window = window / peak
+        dense_rows, dense_columns = np.nonzero(window > threshold)
+
+        # Cell centers of the dense cells
+        dense_longitudes.append(grid.min_lon + (first_columns[label] + dense_columns + 0.5) * grid.cell_lon)
+        dense_latitudes.append(grid.min_lat + (first_rows[label] + dense_rows + 0.5) * grid.cell_lat)
+        dense_densities.append(window[dense_rows, dense_columns])
+
+    if not dense_densities:
+        return np.empty(0), np.empty(0), np.empty(0)
+
+    return np.concatenate(dense_longitudes), np.concatenate(dense_latitudes), np.concatenate(dense_densities)
+
+
+# Function to cluster accidents and find the dense areas of every cluster on a precomputed density raster
+def compute_hotspots(longitudes, latitudes, density, grid, eps=1000, min_samples=5):
+    longitudes = np.asarray(longitudes, dtype='float64')
+    latitudes = np.asarray(latitudes, dtype='float64')
+
+    # Cluster the same points the dense cells are looked up for, so the labels line up with the coordinates
+    cluster_labels = perform_dbscan_clustering(longitudes, latitudes, eps=eps, min_samples=min_samples)
+
+    dense_longitudes, dense_latitudes, dense_densities = find_dense_cells(longitudes, latitudes, cluster_labels,
+                                                                          density, grid)
+
+    return {
+        'longitudes': longitudes,
+        'latitudes': latitudes,
+        'cluster_labels': cluster_labels,
+        'dense_longitudes': dense_longitudes,
+        'dense_latitudes': dense_latitudes,
+        'dense_densities': dense_densities,
+    }
+
+
+# Bounded LRU cache of hotspot results, optionally persisted to disk across restarts
+class HotspotCache:
+    def __init__(self, max_entries=32, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Function to build the file name of a key, hashing its repr so any parameters fit in a file name
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(repr((HOTSPOT_CACHE_VERSION, key)).encode()).hexdigest() + '.npz')
+
+    # Function to read a result persisted by an earlier run, or None
+    def _load_from_disk(self, key):
+        if not self.cache_dir or not os.path.exists(self._disk_path(key)):
+            return None
+
+        try:
+            with np.load(self._disk_path(key), allow_pickle=False) as stored:
+                return {name: stored[name] for name in HOTSPOT_ARRAYS}
+        except (OSError, ValueError, KeyError):
+            return None
+
+    # Function to persist a result so the next run can skip the clustering
+    def _save_to_disk(self, key, result):
+        if not self.cache_dir:
+            return
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            # Write to a temporary file of this writer first, so a crash never leaves a half-written entry behind
+            # and workers clustering the same key at once never write into the same file
+            handle, temporary_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(handle, 'wb') as temporary_file:
+                    np.savez(temporary_file, **{name: result[name] for name in HOTSPOT_ARRAYS})
+                os.replace(temporary_path, self._disk_path(key))
+            finally:
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+        except OSError as error:
+            print(f"Could not write hotspot cache entry: {error}")
+
+    # Function to get the result for a key, computing and storing it on a miss
+    def get(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        result = self._load_from_disk(key)
+        if result is None:
+            result = compute()
+            self._save_to_disk(key, result)
+            with self._lock:
+                self.misses += 1
+        else:
+            with self._lock:
+                self.disk_hits += 1
+
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+
+            # Evict the least recently used results beyond the size bound
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return result
+
+    # Function to drop the results held in memory, leaving the ones persisted on disk
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # Function to summarize the cache counters
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'disk_hits': self.disk_hits,
+                    'misses': self.misses, 'evictions': self.evictions}
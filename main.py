@@ -1,174 +1,140 @@
-import pandas as pd
 import os
-import geopandas as gpd
+import multiprocessing
+import threading
+import time
+import plotly
 import plotly.express as px
 import plotly.graph_objects as go
 import dash
-from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash import Patch, ctx, dcc, html
+from dash.dependencies import ClientsideFunction, Input, Output, State
 from dash.exceptions import PreventUpdate
+from flask import Response, jsonify, request
 import json
-from sklearn.cluster import DBSCAN
-from sklearn.neighbors import KernelDensity
 import numpy as np
-from dash import html
-from dash import dash_table
+from accident_data import (CACHE_DIR, MAX_YEAR, MIN_YEAR, WATCH_INTERVAL_SECONDS, LoadProgress, YearFileWatcher,
+                           accidents_version, get_council_districts, get_layer_polygons, ingest_years, served_years,
+                           timed_load_year)
+from accident_store import AccidentStore
+from density_rasters import DENSITY_BANDWIDTH_METERS, DENSITY_CELL_METERS, DensityGrid, DensityRasterStore
+from geometry_pyramid import GeometryPyramid
+from district_cube import DistrictYearCube
+from district_risk import RangeCache, district_risk, load_district_population
+from hotspots import (DEFAULT_EPS_METERS, DEFAULT_HOTSPOT_DISTRICTS, DEFAULT_MIN_SAMPLES, HotspotCache,
+                      compute_hotspots)
+from map_layers import get_point_layer
+from metrics import (MetricsRegistry, RequestProfiler, instrument_server, process_peak_rss_bytes, process_rss_bytes,
+                     profile_filter_from_request)
+from precompute import load_precomputed
+from snapshot import load_snapshot, raster_settings
+from vector_tiles import (PointTileIndex, TileCache, accident_tile_index, encode_indexes_tile,
+                          lon_lat_to_tile_coordinates, tile_coordinates_to_lon_lat)
 
 
-# Define variables globally
-lat_col, lon_col, district_column_name = None, None, None
+# GeoJSON data for council districts, loaded by the background warmup
+council_districts_geojson = None
 
-# Define a dictionary to store extracted fatalities count for each year
-fatalities_by_year = {}
+# District x year table of accident counts and fatalities, created once the districts are loaded
+district_year_cube = None
 
-# Variable to store the latest triggered year
-latest_triggered_year = 2021
+# Report the build time and payload size of the heavier figures when set
+REPORT_FIGURE_COST = os.environ.get("ACCIDENT_REPORT_FIGURE_COST") == "1"
 
-# Define a dictionary to store accumulated district accident counts across 4 years
-accumulated_district_counts = {}
+# Content hash of each loaded year, part of the hotspot cache key so stale clusters are never served
+year_data_versions = {}
 
-# Loaded GeoJSON data for council districts from file
-council_districts_geojson = gpd.read_file("Council_Districts.geojson")
+# Compact arrays of the accidents of every loaded year, the one copy every callback reads from
+accident_store = AccidentStore()
 
-# Define constants
-DATA_DIR = rf"C:\Users\cmora\OneDrive\Bexarcounty_Data_Extraction"
-MIN_YEAR = 2000
-MAX_YEAR = 2021
+# Default hotspot parameters, precomputed by the warmup
+HOTSPOT_YEARS = range(2001, 2022)
+HOTSPOT_DISTRICTS = DEFAULT_HOTSPOT_DISTRICTS
+HOTSPOT_EPS_METERS = DEFAULT_EPS_METERS
+HOTSPOT_MIN_SAMPLES = DEFAULT_MIN_SAMPLES
+HOTSPOT_BANDWIDTH_METERS = DENSITY_BANDWIDTH_METERS
+HOTSPOT_CELL_METERS = DENSITY_CELL_METERS
 
-# Function to update accumulated district counts
-def update_accumulated_district_counts(district_counts):
-    global accumulated_district_counts
+# Per-year accident density rasters on a city-wide grid, created once the districts are loaded
+density_rasters = None
 
-    # Iterate over district counts and update accumulated counts
-    for district, count in district_counts.items():
-        accumulated_district_counts[district] = accumulated_district_counts.get(district, 0) + count
+# Per-year z-order indexes of the accident points and the index of the speed humps, served as vector tiles
+accident_tile_indexes = {}
+speed_hump_tile_index = None
 
+# Encoded vector tiles, bounded so panning around the county does not grow memory without limit
+tile_cache = TileCache(max_tiles=int(os.environ.get("ACCIDENT_TILE_CACHE_SIZE", 2048)))
 
-# Function to calculate total number of accidents for each district for each year
-def calculate_district_accidents_by_year():
-    district_accidents_by_year = {}
+# Bounded cache of clustering results, persisted next to the per-year cache unless the directory is set empty
+hotspot_cache = HotspotCache(max_entries=int(os.environ.get("ACCIDENT_HOTSPOT_CACHE_SIZE", 32)),
+                             cache_dir=os.environ.get("ACCIDENT_HOTSPOT_CACHE_DIR", os.path.join(CACHE_DIR, "hotspots")))
 
-    # Iterate over the years
-    for year in range(2000, 2022):
-        # Process data for the year
-        _, _, district_counts, _ = process_data(year, cached_data)
+# Directory of a memory-mapped data snapshot written by serve.py, shared read-only by every server worker
+SNAPSHOT_DIR = os.environ.get("ACCIDENT_SNAPSHOT_DIR")
 
-        # Update district_accidents_by_year with district_counts
-        if not district_counts.empty:
-            for district, count in district_counts.items():
-                district_accidents_by_year.setdefault(district, {})[year] = count
+# Directory of a run written by precompute.py, served in place of ingesting the yearly CSVs when set
+PRECOMPUTED_DIR = os.environ.get("ACCIDENT_PRECOMPUTED_DIR")
 
-    return district_accidents_by_year
+# First year offered by the year sliders, the last one follows the newest year loaded
+SLIDER_MIN_YEAR = 2001
 
-def process_data(selected_year, cached_data):
-    global lat_col, lon_col, district_column_name  # Add these lines to use the global variables
+# Bumped whenever the warmup finishes or the watcher ingests a year, so the browser knows to refresh
+data_generation = 0
 
-    # Check if data for the selected year is already cached
-    if selected_year in cached_data:
-        return cached_data[selected_year]
 
-    # Constructed the file path with 'BEXAR'
-    filePath = rf"Bexarcounty_Data_Extraction\{selected_year}_bexar_county.csv"
+# Function to get the newest year offered by the sliders, extended by any later year that has been loaded
+def latest_year():
+    return max([MAX_YEAR] + list(year_data_versions))
 
-    # Checked if the file exists before reading it
-    if os.path.exists(filePath):
-        # Read the CSV file for the selected year into a pandas DataFrame
-        bexar_county_year_data = pd.read_csv(filePath, encoding='ISO-8859-1', low_memory=False)
 
-        # Checked if 'STATENAME' column exists and assigned the appropriate column name
-        if 'STATE' in bexar_county_year_data.columns:
-            statename_column = 'STATE'
-        else:
-            statename_column = 'STATE'
+# Function to build the marks of the main year slider, one rotated label per year
+def year_slider_marks(first_year, last_year):
+    return {year: {'label': str(year), 'style': {'transform': 'rotate(-45deg)', 'whiteSpace': 'nowrap'}}
+            for year in range(first_year, last_year + 1)}
 
-        # Checked if 'COUNTYNAME' column exists and assigned the appropriate column name
-        if 'CITY' in bexar_county_year_data.columns:
-            city_column = 'CITY'
-        else:
-            city_column = 'CITY'
-
-        # Defined possible column names for latitude and longitude
-        lat_lon_columns = ['LATITUDE', 'LATITUD', 'LATITUDENAME', 'Latitude', 'latitude', 'LAT', 'LATNAME',
-                           'LONGITUDE', 'LONGITUD', 'LONGITUDENAME', 'Longitude', 'longitude', 'longitud', 'LON', 'LONNAME']
-
-        # Found existing latitude and longitude columns
-        lat_col, lon_col = None, None
-        for col in lat_lon_columns:
-            if col in bexar_county_year_data.columns:
-                if col.lower().startswith('lat'):
-                    lat_col = col
-                elif col.lower().startswith('lon'):
-                    lon_col = col
-
-        # If 'LATITUDENAME' is not found, use the first latitude column available
-        if lat_col is None and 'LATITUDENAME' in bexar_county_year_data.columns:
-            lat_col = 'LATITUDENAME'
-
-        # If 'LONGITUDENAME' is not found, use the first longitude column available
-        if lon_col is None and 'LONGITUDENAME' in bexar_county_year_data.columns:
-            lon_col = 'LONGITUDENAME'
-
-        # Adjusted filtering conditions for the city of San Antonio
-        bexar_texas_data = bexar_county_year_data[
-            ((bexar_county_year_data['CITY'] == 6090) | (
-                bexar_county_year_data[city_column].astype(str).str.contains('San Antonio'))) &
-            ((bexar_county_year_data['STATE'] == 48) | (bexar_county_year_data[statename_column] == '48'))
-        ]
-
-        # Checked if latitude and longitude columns exist before creating GeoDataFrame
-        if lat_col is not None and lon_col is not None:
-            # Created a GeoDataFrame from the accident data
-            gdf_accidents = gpd.GeoDataFrame(bexar_texas_data,
-                                              geometry=gpd.points_from_xy(bexar_texas_data[lon_col],
-                                                                          bexar_texas_data[lat_col]),
-                                              crs="EPSG:4326")
-            # Extracting fatalities for San Antonio, TX
-            san_antonio_fatalities = bexar_texas_data['FATALS'].sum()
-
-            # Spatial join to assign each accident to a district
-            gdf_accidents = gpd.sjoin(gdf_accidents, council_districts_geojson, how="left", op="within")
-
-            # Identified the correct column for districts in the accident dataset
-            district_column_name = 'District'
-
-            # Counted the number of accidents in each district
-            district_counts = gdf_accidents[district_column_name].value_counts().nlargest(10)
-
-            # Reindexed to include districts with count 0
-            district_counts = district_counts.reindex(council_districts_geojson['District'], fill_value=0)
-
-            # Calculated the total number of accidents for the year
-            total_accidents = len(gdf_accidents)
-
-            # Update accumulated district counts
-            update_accumulated_district_counts(district_counts)
-
-            # Printed to console and saved to a text file
-            output_text = "San Antonio's 10 Districts with Accident Counts:\n" + district_counts.reset_index().rename(
-                columns={'index': 'District', 'District': 'Accident Count'}).to_string(index=False)
-            output_text += f"\n\nTotal Accidents for the Year: {total_accidents}"
-
-            # Cache the processed data for the selected year
-            cached_data[selected_year] = (gdf_accidents, council_districts_geojson, district_counts, output_text)
-
-            return gdf_accidents, council_districts_geojson, district_counts, output_text
 
-        else:
-            print("Latitude or Longitude column not found. Skipping map plotting.")
+# Function to build the marks of the hotspot year slider, one label every four years
+def hotspot_slider_marks(first_year, last_year):
+    return {year: str(year) for year in range(first_year, last_year + 1, 4)}
+
+# Function to turn the year-slider value into an inclusive (start, end) year range
+def selected_year_range(selected_years_range):
+    return min(selected_years_range), max(selected_years_range)
+
+
+# Function to describe a year range for chart titles
+def year_range_label(start_year, end_year):
+    return str(start_year) if start_year == end_year else f'{start_year}-{end_year}'
+
+# Function to merge a year into the accident store, the district x year table, the density rasters and the tile indexes
+def summarize_year_data(selected_year, accidents, density_raster=None, in_store=False, tile_index=None):
+    # Keep the compact arrays of the year, unless they are already views into the store
+    if not in_store:
+        accident_store.set_year(selected_year, accidents)
+
+    # Store the year in the district x year table, replacing any earlier load of the same year
+    district_year_cube.set_year(selected_year, accidents.district, accidents.fatalities)
+    year_data_versions[selected_year] = accidents_version(accidents)
 
+    # Store the density raster of the year, so hotspots of any year range only sum rasters
+    if density_raster is not None:
+        density_rasters.set_raster(selected_year, density_raster)
     else:
-        print(f"No data found for the selected year: {selected_year}")
-        return None, None, None, None
+        density_rasters.set_year(selected_year, accidents.lon, accidents.lat)
 
+    # Index the accident points of the year for the vector tile endpoint, unless a snapshot already holds the index
+    accident_tile_indexes[selected_year] = (tile_index if tile_index is not None
+                                            else accident_tile_index(selected_year, accidents))
 
-# Loaded GeoJSON data for other cities and towns from file
-other_cities_towns_geojson = gpd.read_file("Other_Cities_Towns_.geojson")
 
-# List of towns to keep
-towns_to_keep = ['Leon Valley', 'Castle Hills', 'Alamo Heights', 'Olmos Park', 'Shavano Park', 'Hollywood Park', 'Hill Country Village', 'Windcrest', 'Kirby','Balcones Heights', 'Terrell Hills']
+# GeoJSON data for the towns to keep, loaded by the background warmup
+filtered_other_cities_towns_geojson = None
 
-# Filter other_cities_towns_geojson to include only specified towns
-filtered_other_cities_towns_geojson = other_cities_towns_geojson[other_cities_towns_geojson['Name'].isin(towns_to_keep)]
+# Simplified copies of the district and town polygons per zoom level, built by the background warmup
+district_pyramid = None
+town_pyramid = None
+
+# Zoom of the accident map before any click or scroll
+ACCIDENT_MAP_ZOOM = 9
 
 # Initialize Dash app
 app = dash.Dash(__name__)
@@ -244,6 +210,37 @@ accident_hotspots_section_layout = html.Div(style={'padding': '20px', 'display':
     # Left side containing the map
     html.Div(style={'flex': '1', 'margin-right': '20px', 'margin-bottom': '0px'}, children=[
         html.H2("Accident Hotspots Map", style={'textAlign': 'center', 'color': '#FFFFFF', 'margin-bottom': '20px'}),
+        # Controls for the years, districts and clustering parameters of the hotspots
+        html.Div(style={'color': '#FFFFFF', 'margin-bottom': '20px'}, children=[
+            dcc.RangeSlider(
+                id='hotspot-year-slider',
+                min=SLIDER_MIN_YEAR,
+                max=MAX_YEAR,
+                step=1,
+                marks=hotspot_slider_marks(SLIDER_MIN_YEAR, MAX_YEAR),
+                value=[min(HOTSPOT_YEARS), max(HOTSPOT_YEARS)],
+                allowCross=False,
+                tooltip={'placement': 'bottom', 'always_visible': False}
+            ),
+            dcc.Checklist(
+                id='hotspot-districts',
+                options=[{'label': f'District {district}', 'value': district} for district in range(1, 11)],
+                value=list(HOTSPOT_DISTRICTS),
+                inline=True,
+                style={'margin-top': '10px'}
+            ),
+            html.Label("Cluster radius (meters)", style={'margin-top': '10px', 'display': 'block'}),
+            dcc.Slider(
+                id='hotspot-eps',
+                min=100,
+                max=3000,
+                step=100,
+                marks={radius: str(radius) for radius in range(500, 3001, 500)},
+                value=HOTSPOT_EPS_METERS,
+            ),
+            html.Label("Minimum accidents per cluster", style={'margin-right': '10px'}),
+            dcc.Input(id='hotspot-min-samples', type='number', min=2, max=100, step=1, value=HOTSPOT_MIN_SAMPLES),
+        ]),
         dcc.Graph(id='hotspot-map', figure=go.Figure(), style={'height': '100%', 'width': '100%'}),  # Placeholder for accident hotspots map
     ]),
     # Right side containing the paragraph
@@ -305,46 +302,83 @@ citations_section_layout = html.Div(style={'padding': '20px'}, children=[
 ])
 
 
-@app.callback(
-    [Output('micromorts-bar-chart', 'figure')],  # Note the brackets
-    [Input('year-slider', 'value')]
-)
-def update_micromorts_bar_chart(year):
-    data_table = {
-        'District #': ['District 1 (Central & North side)', 'District 2 (Central & East side)',
-                       'District 3 (Central & Southeast side)', 'District 4 (Southwest side)',
-                       'District 5 (Central and West side)', 'District 6 (West side)',
-                       'District 7 (West & Northwest side)', 'District 8 (Northwest side)', 'District 9 (North side)',
-                       'District 10 (Northeast side)'],
-        'Accidents': ['12.31%', '16.00%', '11.33%', '10.32%', '11.83%', '8.20%', '7.33%', '8.08%', '5.80%', '9.00%'],
-        'Fatalities': ['11.65%', '12.57%', '6.25%', '6.74%', '15.36%', '11.00%', '11.39%', '8.27%', '8.63%', '8.14%'],
-        'Micromorts': ['2325', '2475', '1250', '1397',
-                       '3065', '1933', '2194', '1605',
-                       '1682', '1550']
-    }
+# Descriptive labels of the council districts on the micromorts chart
+DISTRICT_LABELS = {1: 'District 1 (Central & North side)', 2: 'District 2 (Central & East side)',
+                   3: 'District 3 (Central & Southeast side)', 4: 'District 4 (Southwest side)',
+                   5: 'District 5 (Central and West side)', 6: 'District 6 (West side)',
+                   7: 'District 7 (West & Northwest side)', 8: 'District 8 (Northwest side)',
+                   9: 'District 9 (North side)', 10: 'District 10 (Northeast side)'}
+
+# Residents of each district from ACCIDENT_DISTRICT_POPULATION, loaded by the background warmup when configured
+district_population = None
+
+# Micromorts figures per year range, so moving the slider back to a range already shown is a dictionary lookup
+micromorts_cache = RangeCache(max_entries=int(os.environ.get("ACCIDENT_MICROMORTS_CACHE_SIZE", 64)))
+
 
-    district_labels = data_table['District #']
+# Function to build the micromorts figure of a year range from the district x year table,
+# measured against the residents of each district when a population is configured, else against its accidents
+def micromorts_figure(start_year, end_year):
+    district_accidents, district_fatalities = district_year_cube.range_totals(start_year, end_year)
+    risk = district_risk(district_year_cube.districts, district_accidents, district_fatalities, district_population)
 
-    # Extract numerical part and convert to float
-    micromorts_values = [float(value.split()[0]) for value in data_table['Micromorts']]
+    # Districts are shown in numeric order, whatever the order of the district layer
+    order = np.argsort(risk['districts'])
+    labels = [DISTRICT_LABELS.get(int(district), f'District {district}') for district in risk['districts'][order]]
+    customdata = np.column_stack((risk['accident_share'][order], risk['fatality_share'][order],
+                                  risk['accidents'][order], risk['fatalities'][order]))
+    shares_hover = ("Accidents: %{customdata[2]:.0f} (%{customdata[0]:.2f}%)"
+                    "<br>Fatalities: %{customdata[3]:.0f} (%{customdata[1]:.2f}%)<extra></extra>")
 
-    # Create a bar chart
+    # Create a bar chart, with the accident and fatality shares of each district on hover
+    micromorts = risk['micromorts'][order]
     bar_chart = go.Figure(data=[go.Bar(
-        x=district_labels,
-        y=micromorts_values,
-        text=data_table['Micromorts'],  # Keep the original text
+        x=labels,
+        y=micromorts,
+        text=[f"{value:.4g}" for value in micromorts],
         textposition='auto',
+        customdata=customdata,
+        hovertemplate="%{x}<br>Micromorts: %{y:.4g}<br>" + shares_hover,
         marker_color='skyblue'
     )])
 
+    # Name what p stands for, as the two kinds of micromorts are far apart
+    if risk['per_resident']:
+        title = f"Micromorts by District, per Resident - {year_range_label(start_year, end_year)}"
+        yaxis_title = "Micromorts y = (k/p) * (1000000/p), p residents"
+    else:
+        title = (f"Micromorts by District, per Accident (no district population set) - "
+                 f"{year_range_label(start_year, end_year)}")
+        yaxis_title = "Micromorts y = (k/p) * (1000000/p), p accidents"
+
     bar_chart.update_layout(
-        title="Micromorts by District",
+        title=title,
         xaxis_title="District",
-        yaxis_title="Micromorts",
+        yaxis_title=yaxis_title,
         template='plotly_white'
     )
 
-    return [bar_chart]  # Return the Figure object inside a list
+    # Cached as the plain dict Dash sends, so a cache hit skips building the figure again
+    return bar_chart.to_dict()
+
+
+@app.callback(
+    [Output('micromorts-bar-chart', 'figure')],  # Note the brackets
+    [Input('year-slider', 'value'),
+     Input('warmup-interval', 'n_intervals'),
+     Input('data-generation', 'data')]
+)
+def update_micromorts_bar_chart(selected_years_range, n_intervals, generation):
+    start_year, end_year = selected_year_range(selected_years_range)
+    if district_year_cube is None or not district_year_cube.loaded_years(start_year, end_year):
+        if not warmup_progress.ready:
+            return [loading_figure(f'Loading accident data for {year_range_label(start_year, end_year)}...')]
+        return [go.Figure()]
+
+    # The data version of every loaded year in the range is part of the key, so reloading a year redraws the chart
+    loaded_years = district_year_cube.loaded_years(start_year, end_year)
+    key = (start_year, end_year, tuple(year_data_versions.get(year) for year in loaded_years))
+    return [micromorts_cache.get(key, lambda: micromorts_figure(start_year, end_year))]
 
 
 # # Update the callback to update the district accidents chart and graph
@@ -405,11 +439,10 @@ app.layout = html.Div(style={'backgroundColor': '#000000', 'color': '#333', 'pad
         # Replace the dcc.Slider with dcc.RangeSlider
         dcc.RangeSlider(
             id='year-slider',
-            min=2001,
-            max=2021,
+            min=SLIDER_MIN_YEAR,
+            max=MAX_YEAR,
             step=1,
-            marks={year: {'label': str(year), 'style': {'transform': 'rotate(-45deg)', 'whiteSpace': 'nowrap'}} for
-                   year in range(2001, 2022)},
+            marks=year_slider_marks(SLIDER_MIN_YEAR, MAX_YEAR),
             value=[2021],
             allowCross=False,  # This prevents the range from having a cross-handle
             className='custom-slider',  # Add a custom CSS class
@@ -446,6 +479,10 @@ app.layout = html.Div(style={'backgroundColor': '#000000', 'color': '#333', 'pad
                    'box-shadow': '0 4px 8px rgba(0,0,0,0.1)'},
             clickData={'points': [{'location': '...', 'text': '...'}]}
         ),
+        # Version of the base accident map the browser holds, so updates can be sent as patches
+        dcc.Store(id='accident-map-base'),
+        # Per-year district counts the browser restyles the accident map from
+        dcc.Store(id='district-year-table'),
         # Graph component
         dcc.Graph(
             id='district-accidents-chart',
@@ -469,89 +506,397 @@ app.layout = html.Div(style={'backgroundColor': '#000000', 'color': '#333', 'pad
 
     conclusion_section_layout,
 
-    citations_section_layout
-])
+    citations_section_layout,
+
+    # Refresh the charts while the background warmup is still loading years
+    dcc.Interval(id='warmup-interval', interval=2000, n_intervals=0),
 
+    # Check for years ingested by the data directory watcher, and the generation of the data last shown
+    dcc.Interval(id='data-watch-interval', interval=max(WATCH_INTERVAL_SECONDS, 1) * 1000, n_intervals=0,
+                 disabled=WATCH_INTERVAL_SECONDS <= 0),
+    dcc.Store(id='data-generation', data=0)
+])
 
-# Define a variable for the last selected year
-last_selected_year = 2011
 
 # Initialize an empty figure
 empty_fig = px.choropleth_mapbox()
 empty_fig.update_layout(mapbox_style="open-street-map", mapbox_zoom=9, mapbox_center={"lat": 29.4201, "lon": -98.5721})
 
-# Define a dictionary to cache processed data
-cached_data = {}
+# Snapshot the warmup merged the years from, whose mapped arrays are the accident store
+year_snapshot = None
+
+# Preload data for every year covered by the dashboard
+preloaded_years = range(MIN_YEAR, MAX_YEAR + 1)
+
+# Per-year load progress of the background warmup, reported by /ready and /status
+warmup_progress = LoadProgress(preloaded_years)
+
+# Function to merge a year loaded by the warmup into the store and the district x year table
+def merge_loaded_year(year, accidents):
+    summarize_year_data(year, accidents)
+
+
+# Function to merge every year of a memory-mapped snapshot, reusing its tile indexes, and its rasters when they were
+# built on the same grid
+def merge_snapshot_years(snapshot):
+    rasters_match = snapshot.raster_settings == raster_settings(density_rasters)
+    if not rasters_match:
+        print(f"Snapshot in {snapshot.directory} has no rasters for this grid, recomputing them")
+
+    for year in preloaded_years:
+        accidents = snapshot.year(year)
+        if accidents is None:
+            warmup_progress.mark(year, 'missing')
+            continue
+
+        warmup_progress.mark(year, 'loading')
+        started = time.perf_counter()
+        summarize_year_data(year, accidents, snapshot.density_raster(year) if rasters_match else None, in_store=True,
+                            tile_index=snapshot.tile_index(year))
+        warmup_progress.mark(year, 'ready', time.perf_counter() - started)
+
+
+# Function to merge every year of a precomputed run, and its clusters when they match the default hotspot settings
+def merge_precomputed_years(precomputed):
+    accidents_by_year = precomputed['accidents']
+    for year in sorted(set(preloaded_years) | set(accidents_by_year)):
+        if year not in accidents_by_year:
+            warmup_progress.mark(year, 'missing')
+            continue
+
+        warmup_progress.mark(year, 'loading')
+        started = time.perf_counter()
+        summarize_year_data(year, accidents_by_year[year])
+        warmup_progress.mark(year, 'ready', time.perf_counter() - started)
+
+    # The run clustered every year it holds, which is the default hotspot range when the years line up
+    parameters = precomputed['manifest']['hotspot_parameters']
+    if ([year for year in HOTSPOT_YEARS if year in year_data_versions] == precomputed['manifest']['years'] and
+            parameters['bandwidth_meters'] == density_rasters.bandwidth_meters and
+            parameters['cell_meters'] == density_rasters.grid.cell_meters):
+        clusters, dense_cells = precomputed['hotspot_clusters'], precomputed['hotspot_dense_cells']
+        hotspot_cache.get(hotspot_key(HOTSPOT_YEARS, parameters['districts'], parameters['eps_meters'],
+                                      parameters['min_samples']),
+                          lambda: {'longitudes': clusters['Longitude'].to_numpy(dtype='float64'),
+                                   'latitudes': clusters['Latitude'].to_numpy(dtype='float64'),
+                                   'cluster_labels': clusters['Cluster'].to_numpy(),
+                                   'dense_longitudes': dense_cells['Longitude'].to_numpy(),
+                                   'dense_latitudes': dense_cells['Latitude'].to_numpy(),
+                                   'dense_densities': dense_cells['Density'].to_numpy()})
+
+
+# Function to ingest a year the watcher found new or changed, replacing only that year's tables, rasters and indexes
+def ingest_changed_year(year):
+    global data_generation
+
+    warmup_progress.mark(year, 'loading')
+    accidents, load_seconds, stage_seconds = timed_load_year(year, compact=True)
+    for stage, seconds in stage_seconds.items():
+        year_load_stage_seconds.observe(seconds, stage)
+    if accidents is None:
+        warmup_progress.mark(year, 'missing', load_seconds, stage_seconds)
+        return
+
+    # The new data version of the year keys the hotspot and tile caches, so stale entries are never served
+    summarize_year_data(year, accidents)
+
+    # The year was appended after the others, so lay the store out in year order again
+    accident_store.compact()
+    warmup_progress.mark(year, 'ready', load_seconds, stage_seconds)
+    data_generation += 1
+    print(f"Ingested {len(accidents)} accidents for {year} in {load_seconds:.1f} s")
+
+
+# Function to read the GeoJSON layers and preload every year without blocking the server
+def warmup():
+    global council_districts_geojson, filtered_other_cities_towns_geojson, district_year_cube, density_rasters
+    global district_pyramid, town_pyramid, speed_hump_tile_index, year_snapshot, data_generation, accident_store
+    global district_population
+
+    try:
+        # Stamp the yearly CSVs before reading them, so files changing during the warmup are ingested again
+        year_file_watcher = YearFileWatcher(ingest_changed_year)
+
+        # Loaded GeoJSON data for council districts from file
+        council_districts_geojson = get_council_districts()
+        district_population = load_district_population()
+        district_year_cube = DistrictYearCube(council_districts_geojson['District'], MIN_YEAR, MAX_YEAR)
+        density_rasters = DensityRasterStore(DensityGrid.around(council_districts_geojson, HOTSPOT_CELL_METERS),
+                                             HOTSPOT_BANDWIDTH_METERS)
+
+        # The enclave towns, the same polygons the accidents are joined against
+        filtered_other_cities_towns_geojson = get_layer_polygons('Town')
+
+        # Simplify the polygons once per zoom level, so zoomed-out maps do not ship sub-pixel vertices
+        district_pyramid = GeometryPyramid(council_districts_geojson)
+        town_pyramid = GeometryPyramid(filtered_other_cities_towns_geojson)
+
+        # Parse the static point overlays once and index them for the vector tile endpoint
+        speed_humps = get_point_layer('speed_humps')
+        speed_hump_tile_index = PointTileIndex(speed_humps.lon, speed_humps.lat, speed_humps.attributes)
+
+        # Server workers map the snapshot the master process wrote, the development server ingests on its own
+        year_snapshot = load_snapshot(SNAPSHOT_DIR) if SNAPSHOT_DIR else None
+        precomputed = load_precomputed(PRECOMPUTED_DIR) if PRECOMPUTED_DIR and year_snapshot is None else None
+        if year_snapshot is not None:
+            # The mapped arrays become the accident store, so the years are never copied into this worker
+            accident_store = year_snapshot.store
+            merge_snapshot_years(year_snapshot)
+        elif precomputed is not None:
+            # A precomputed run stands in for the CSVs and the per-year cache, which need not be deployed
+            merge_precomputed_years(precomputed)
+        else:
+            if SNAPSHOT_DIR:
+                print(f"No usable snapshot in {SNAPSHOT_DIR}, ingesting the years in this process")
+            if PRECOMPUTED_DIR:
+                print(f"No usable precomputed run in {PRECOMPUTED_DIR}, ingesting the years in this process")
+
+            # Fan the years out across the ingestion worker pool, merging each one as soon as it is ready,
+            # including any year past the preloaded range already dropped into the data directory
+            ingest_years(served_years(), progress=warmup_progress,
+                         on_year_loaded=merge_loaded_year, compact=True)
+
+        # Years were appended as they arrived, in any order, so copy them into year order once at the end
+        accident_store.compact()
+
+        # Cluster the default hotspot configuration so the first visit does not pay for it
+        get_hotspots(HOTSPOT_YEARS, HOTSPOT_DISTRICTS, HOTSPOT_EPS_METERS, HOTSPOT_MIN_SAMPLES)
+    except Exception as error:
+        print(f"Warmup failed: {error}")
+        warmup_progress.finish(error)
+    else:
+        warmup_progress.finish()
+        data_generation += 1
+
+        # Pick up yearly CSVs added or replaced from now on, comparing against the files just ingested.
+        # Workers mapping a snapshot leave that to serve.py, which rebuilds the snapshot and reloads them,
+        # so one changed file is neither ingested by every worker nor copies the shared arrays into each of them.
+        # A precomputed run is only replaced by running precompute.py again and restarting
+        if WATCH_INTERVAL_SECONDS > 0 and year_snapshot is None and precomputed is None:
+            year_file_watcher.start()
+
+
+# Route reporting whether the warmup finished, so a load balancer can gate traffic on it
+@app.server.route('/ready')
+def ready():
+    status = warmup_progress.snapshot()
+    return jsonify(ready=status['ready'], counts=status['counts']), 200 if status['ready'] else 503
+
+
+# Function to summarize the years, rows and buffer memory of the accident store
+def accident_store_stats():
+    return {'years': accident_store.years, 'rows': len(accident_store), 'bytes': accident_store.nbytes}
+
+
+# Route reporting the per-year load progress of the warmup
+@app.server.route('/status')
+def status():
+    return jsonify(dict(warmup_progress.snapshot(), accident_store=accident_store_stats()))
+
+
+# Prometheus metrics of the requests, the caches, the year loads and the process, served by /metrics
+metrics_registry = MetricsRegistry()
+
+# Set ACCIDENT_PROFILE_DIR to enable POST /profile, which saves a cProfile of the next matching callback there
+PROFILE_DIR = os.environ.get("ACCIDENT_PROFILE_DIR")
+request_profiler = RequestProfiler(PROFILE_DIR) if PROFILE_DIR else None
+
+instrument_server(app.server, metrics_registry, request_profiler)
+year_load_stage_seconds = metrics_registry.histogram('accident_year_load_stage_seconds',
+                                                     "Time spent in each stage of loading a year the watcher found.",
+                                                     ('stage',))
+
+
+# Function to gather the counters of every cache as (cache name, stats) pairs
+def cache_stats():
+    hotspot_stats = hotspot_cache.stats()
+    yield 'hotspot', hotspot_stats
+    yield 'hotspot_disk', {'hits': hotspot_stats['disk_hits']}
+    yield 'tile', tile_cache.stats()
+    yield 'micromorts', micromorts_cache.stats()
+
+
+# Function to register a metric read from one field of the cache counters
+def register_cache_metric(name, help_text, metric_type, field):
+    metrics_registry.collected(name, help_text, metric_type, ('cache',),
+                               lambda: [((cache,), stats[field]) for cache, stats in cache_stats() if field in stats])
+
+
+register_cache_metric('accident_cache_hits_total', "Lookups answered by a cache.", 'counter', 'hits')
+register_cache_metric('accident_cache_misses_total', "Lookups a cache had to compute or load.", 'counter', 'misses')
+register_cache_metric('accident_cache_evictions_total', "Entries dropped to stay within a cache bound.", 'counter',
+                      'evictions')
+register_cache_metric('accident_cache_entries', "Entries held by a cache.", 'gauge', 'entries')
+metrics_registry.collected('accident_store_bytes', "Memory held by the arrays of the accident store.", 'gauge', (),
+                           lambda: [((), accident_store_stats()['bytes'])])
+metrics_registry.collected('accident_store_rows', "Accidents held by the accident store.", 'gauge', (),
+                           lambda: [((), accident_store_stats()['rows'])])
+
+
+# Function to list the warmup load time of every year, in total and per stage
+def warmup_load_seconds():
+    for year, year_status in warmup_progress.snapshot()['years'].items():
+        yield (year, 'total'), year_status['load_seconds']
+        for stage, seconds in year_status['stage_seconds'].items():
+            yield (year, stage), seconds
+
+
+metrics_registry.collected('accident_warmup_year_load_seconds', "Time the warmup took to load a year, per stage.",
+                           'gauge', ('year', 'stage'), warmup_load_seconds)
+metrics_registry.collected('accident_warmup_years', "Years of the warmup in each load state.", 'gauge', ('state',),
+                           lambda: [((state,), count) for state, count in warmup_progress.snapshot()['counts'].items()])
+metrics_registry.collected('accident_warmup_ready', "Whether the warmup finished without error.", 'gauge', (),
+                           lambda: [((), int(warmup_progress.ready))])
+metrics_registry.collected('process_resident_memory_bytes', "Resident memory size in bytes.", 'gauge', (),
+                           lambda: [((), process_rss_bytes())])
+metrics_registry.collected('accident_process_peak_resident_memory_bytes', "Peak resident memory size in bytes.",
+                           'gauge', (), lambda: [((), process_peak_rss_bytes())])
+
+
+# Route exposing the metrics in the Prometheus text format
+@app.server.route('/metrics')
+def metrics():
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+# Route arming the profiler for the next callback whose outputs contain the given text, when profiling is enabled
+@app.server.route('/profile', methods=['POST'])
+def profile_next_callback():
+    if request_profiler is None:
+        return jsonify(error="Profiling is disabled, set ACCIDENT_PROFILE_DIR to enable it"), 404
+
+    callback_filter = profile_filter_from_request()
+    request_profiler.arm(callback_filter)
+    return jsonify(armed=True, callback=callback_filter, output_dir=PROFILE_DIR)
+
+
+# Function to encode the accident points of some years falling in one tile
+def accident_tile(years, z, x, y):
+    return encode_indexes_tile('accidents', [accident_tile_indexes[year] for year in years], z, x, y)
+
+
+# Route serving Mapbox Vector Tiles of the point layers, with accidents limited to an inclusive year range
+@app.server.route('/tiles/<layer>/<int:z>/<int:x>/<int:y>.pbf')
+def vector_tile(layer, z, x, y):
+    if layer == 'accidents':
+        start_year = request.args.get('start', MIN_YEAR, type=int)
+        end_year = request.args.get('end', latest_year(), type=int)
+        years = [year for year in range(start_year, end_year + 1) if year in accident_tile_indexes]
+
+        # The data version of every year is part of the key, so reloaded years are re-encoded
+        key = (layer, z, x, y, tuple(years), tuple(year_data_versions.get(year) for year in years))
+        tile = tile_cache.get(key, lambda: accident_tile(years, z, x, y))
+    elif layer == 'speed_humps' and speed_hump_tile_index is not None:
+        tile = tile_cache.get((layer, z, x, y),
+                              lambda: encode_indexes_tile('speed_humps', [speed_hump_tile_index], z, x, y))
+    else:
+        return jsonify(error=f"Unknown tile layer: {layer}"), 404
+
+    return Response(tile, mimetype='application/x-protobuf')
+
+
+# Function to report how long a figure or patch took to build and how large its JSON payload is
+def report_figure_cost(name, fig, started):
+    if REPORT_FIGURE_COST:
+        build_ms = (time.perf_counter() - started) * 1000
+        if isinstance(fig, Patch):
+            patch_json = fig.to_plotly_json()
+            payload_kib = len(json.dumps(patch_json, cls=plotly.utils.PlotlyJSONEncoder)) / 1024
+            print(f"{name}: patch of {len(patch_json['operations'])} operations built in {build_ms:.1f} ms, "
+                  f"{payload_kib:.1f} KiB of JSON")
+        else:
+            payload_kib = len(fig.to_json()) / 1024
+            print(f"{name}: {len(fig.data)} traces built in {build_ms:.1f} ms, {payload_kib:.1f} KiB of JSON")
+
+
+# Function to build a placeholder map shown while the data for a year is still loading
+def loading_figure(message):
+    fig = go.Figure(empty_fig)
+    fig.update_layout(title=message)
+    return fig
 
-# Number of years to preload data for (adjust as needed)
-preload_years_before = 10  # Adjust the number of years to preload before the selected year
-preload_years_after = 10   # Adjust the number of years to preload after the selected year
 
-# Preload data for a range of years
-preloaded_years_before = range(last_selected_year - preload_years_before, last_selected_year)
-preloaded_years_after = range(last_selected_year + 1, last_selected_year + preload_years_after + 1)
+# Start the background warmup on import unless disabled, as the benchmarks do to time it on their own
+WARMUP_ON_IMPORT = os.environ.get("ACCIDENT_WARMUP", "1") != "0"
+
+# Ingestion workers re-import this module when they are spawned, so only the parent process warms up
+if WARMUP_ON_IMPORT and multiprocessing.current_process().name == "MainProcess":
+    threading.Thread(target=warmup, name='warmup', daemon=True).start()
+
+
+# Stop polling for warmup progress once every year has been loaded
+@app.callback(
+    Output('warmup-interval', 'disabled'),
+    [Input('warmup-interval', 'n_intervals')]
+)
+def update_warmup_interval(n_intervals):
+    return warmup_progress.finished_at is not None
 
-# Concatenate the two ranges to cover both before and after the selected year
-preloaded_years = list(preloaded_years_before) + [last_selected_year] + list(preloaded_years_after)
 
-for year in preloaded_years:
-    process_data(year, cached_data)
+# Function to gather the coordinates of the accidents in the given years and districts
+def hotspot_coordinates(years, districts):
+    # Consecutive years are one slice of the store, so only the accidents in the districts are copied
+    accidents = accident_store.select(years)
+    in_districts = np.isin(accidents.district, districts)
+    return accidents.lon[in_districts], accidents.lat[in_districts]
 
 
-# Calculate district accidents by year
-district_accidents_by_year = calculate_district_accidents_by_year()
+# Function to build the cache key of a hotspot configuration over the loaded years of a range
+def hotspot_key(years, districts, eps, min_samples):
+    years = tuple(year for year in years if year in year_data_versions)
 
+    # The data version of every included year is part of the key, so reloading a year invalidates its clusters
+    return (years, tuple(sorted(districts)), eps, min_samples, density_rasters.bandwidth_meters,
+            density_rasters.grid.cell_meters, tuple(year_data_versions[year] for year in years))
 
-# Define function to perform DBSCAN clustering
-def perform_dbscan_clustering(gdf_accidents, eps=0.01, min_samples=5):
-    # Extract latitude and longitude coordinates from GeoDataFrame
-    coordinates = np.column_stack((gdf_accidents.geometry.x, gdf_accidents.geometry.y))
 
-    # Perform DBSCAN clustering
-    dbscan = DBSCAN(eps=eps, min_samples=min_samples, metric='euclidean')
-    dbscan.fit(coordinates)
+# Function to get the clusters and dense areas of the accidents in the given years and districts, from the cache when possible
+def get_hotspots(years, districts, eps, min_samples):
+    years = tuple(year for year in years if year in year_data_versions)
+    districts = tuple(sorted(districts))
+    key = hotspot_key(years, districts, eps, min_samples)
 
-    # Get labels assigned to each point (-1 represents outliers)
-    cluster_labels = dbscan.labels_
+    # Cluster the accidents of the districts and look their dense areas up on the summed rasters of the years
+    def compute():
+        longitudes, latitudes = hotspot_coordinates(years, districts)
+        return compute_hotspots(longitudes, latitudes, density_rasters.range_density(years), density_rasters.grid,
+                                eps=eps, min_samples=min_samples)
 
-    return cluster_labels
+    return hotspot_cache.get(key, compute)
 
 
 # Update the callback to update the hotspot map with clustered accidents
 @app.callback(
     Output('hotspot-map', 'figure'),
-    [Input('hotspot-map', 'clickData')]
+    [Input('hotspot-map', 'clickData'),
+     Input('warmup-interval', 'n_intervals'),
+     Input('hotspot-year-slider', 'value'),
+     Input('hotspot-districts', 'value'),
+     Input('hotspot-eps', 'value'),
+     Input('hotspot-min-samples', 'value'),
+     Input('data-generation', 'data')]
 )
-def update_hotspot_map(click_data):
-    # Define the years and districts of interest
-    years_of_interest = range(2001, 2022)  # All years from 2000 to 2021
-    districts_of_interest = [1, 2, 3, 5]  # Districts 1, 2, and 3
-
-    # Create an empty list to store coordinates of accidents in districts of interest
-    hotspot_latitudes = []
-    hotspot_longitudes = []
-
-    # Iterate over the years and districts of interest
-    for year in years_of_interest:
-        # Get the processed data for the selected year
-        gdf_accidents, council_districts_geojson, district_counts, _ = cached_data.get(year, (None, None, None, None))
-
-        # Check if data is available for the selected year
-        if gdf_accidents is not None:
-            # Iterate over the districts
-            for district in districts_of_interest:
-                # Check if the district is in the processed data
-                if district in district_counts.index:
-                    # Get the accidents in the district of interest for the current year
-                    accidents_in_district = gdf_accidents[gdf_accidents[district_column_name] == district]
-
-                    # Extract latitude and longitude of accidents in the district
-                    district_latitudes = accidents_in_district.geometry.y.tolist()
-                    district_longitudes = accidents_in_district.geometry.x.tolist()
-
-                    # Extend the lists of coordinates with the coordinates of accidents in the district
-                    hotspot_latitudes.extend(district_latitudes)
-                    hotspot_longitudes.extend(district_longitudes)
+def update_hotspot_map(click_data, n_intervals, hotspot_years_range, districts_of_interest, eps_meters, min_samples,
+                       generation):
+    started = time.perf_counter()
+
+    # Keep the current map while the minimum cluster size is being typed
+    if not min_samples:
+        raise PreventUpdate
+
+    # Define the years and districts of interest from the controls
+    start_year, end_year = selected_year_range(hotspot_years_range)
+    years_of_interest = range(start_year, end_year + 1)
+
+    # Show a loading state until the warmup has loaded every year, rather than clustering partial data
+    if not warmup_progress.ready:
+        return loading_figure("Loading accident data...")
+
+    # Get the clustered accidents in the districts of interest
+    hotspots = get_hotspots(years_of_interest, districts_of_interest, eps_meters, int(min_samples))
+    hotspot_longitudes, hotspot_latitudes = hotspots['longitudes'], hotspots['latitudes']
+    if not len(hotspot_latitudes):
+        return go.Figure()
 
     # Create map figure
     fig = go.Figure()
@@ -570,64 +915,35 @@ def update_hotspot_map(click_data):
         showlegend=True,
     ))
 
-    # Add GeoJSON trace for districts 1, 6, and 10
-    for district in districts_of_interest:
-        district_geojson = council_districts_geojson[council_districts_geojson['District'] == district].to_json()
-        district_data = json.loads(district_geojson)
-        fig.add_trace(go.Choroplethmapbox(
-            geojson=district_data,
-            locations=[0],  # Dummy locations
-            z=[1],  # Dummy values
-            colorscale=[[0, 'rgba(0,0,0,0)'], [1, 'rgba(0,0,0,0)']],  # Transparent color
-            marker_opacity=0,
+    # Add one GeoJSON trace covering every district of interest
+    districts_geojson = district_pyramid.for_zoom(10)
+    districts_geojson = districts_geojson[districts_geojson['District'].isin(districts_of_interest)]
+    fig.add_trace(go.Choroplethmapbox(
+        geojson=json.loads(districts_geojson.to_json()),
+        locations=districts_geojson.index.astype(str),  # Feature ids written by to_json
+        z=np.ones(len(districts_geojson)),  # Dummy values
+        colorscale=[[0, 'rgba(0,0,0,0)'], [1, 'rgba(0,0,0,0)']],  # Transparent color
+        marker_opacity=0,
+        showlegend=False,
+        hoverinfo='none'  # Remove hover info for this trace
+    ))
+
+    # Plot circles around areas with higher density of accidents as a single trace for all clusters
+    dense_densities = hotspots['dense_densities']
+    if len(dense_densities):
+        fig.add_trace(go.Scattermapbox(
+            mode="markers",
+            lon=hotspots['dense_longitudes'],
+            lat=hotspots['dense_latitudes'],
+            marker=dict(
+                size=dense_densities * 10,  # Adjust size based on density
+                opacity=dense_densities * 0.3,  # Fade the circles towards the edge of the dense area
+                color='blue',
+            ),
+            name='Accident Cluster',
             showlegend=False,
-            hoverinfo='none'  # Remove hover info for this trace
         ))
 
-    # Perform DBSCAN clustering on accidents
-    cluster_labels = perform_dbscan_clustering(gdf_accidents)
-
-    # Get unique cluster labels (excluding outliers)
-    unique_clusters = np.unique(cluster_labels[cluster_labels != -1])
-
-    # Iterate over unique clusters and plot circles around cluster centers
-    for cluster_label in unique_clusters:
-        # Extract coordinates of accidents in the cluster
-        cluster_indices = np.where(cluster_labels == cluster_label)[0]
-        cluster_latitudes = np.array(hotspot_latitudes)[cluster_indices]
-        cluster_longitudes = np.array(hotspot_longitudes)[cluster_indices]
-
-        # Fit kernel density estimation to estimate density of accidents in the cluster with adjusted bandwidth
-        kde = KernelDensity(bandwidth=0.005, kernel='gaussian')  # Adjust bandwidth
-        kde.fit(np.column_stack((cluster_longitudes, cluster_latitudes)))
-
-        # Sample from KDE to get density values at points within cluster
-        lon_min, lon_max = np.min(cluster_longitudes), np.max(cluster_longitudes)
-        lat_min, lat_max = np.min(cluster_latitudes), np.max(cluster_latitudes)
-        lon_range = np.linspace(lon_min, lon_max, 100)
-        lat_range = np.linspace(lat_min, lat_max, 100)
-        lon_mesh, lat_mesh = np.meshgrid(lon_range, lat_range)
-        sample_points = np.column_stack((lon_mesh.ravel(), lat_mesh.ravel()))
-        density_values = np.exp(kde.score_samples(sample_points)).reshape(lon_mesh.shape)
-
-        # Normalize density values
-        density_values /= np.max(density_values)
-
-        # Plot circles around areas with higher density of accidents
-        for lon, lat, density in zip(lon_mesh.ravel(), lat_mesh.ravel(), density_values.ravel()):
-            if density > 0.5:  # Adjust density threshold as needed
-                fig.add_trace(go.Scattermapbox(
-                    mode="markers",
-                    lon=[lon],
-                    lat=[lat],
-                    marker=dict(
-                        size=density * 10,  # Adjust size based on density
-                        opacity=0.3,  # Adjust opacity of circle
-                        color='blue',
-                    ),
-                    name='Accident Cluster',
-                    showlegend=False,
-                ))
     fig.update_layout(
         mapbox=dict(
             center=dict(lat=29.4241, lon=-98.4936),
@@ -639,33 +955,39 @@ def update_hotspot_map(click_data):
         width=700
     )
 
+    report_figure_cost('update_hotspot_map', fig, started)
+
     return fig
 
 # Update the callback to update the district accidents chart and graph
 @app.callback(
     [Output('district-accidents-chart', 'figure'),
      Output('district-accidents-graph', 'figure')],
-    [Input('year-slider', 'value')]
+    [Input('year-slider', 'value'),
+     Input('warmup-interval', 'n_intervals'),
+     Input('data-generation', 'data')]
 )
-def update_district_accidents_graph(selected_years_range):
-    # Calculate the average of the selected range
-    selected_year = int(sum(selected_years_range) / len(selected_years_range))
+def update_district_accidents_graph(selected_years_range, n_intervals, generation):
+    # Read the selected year range from the slider
+    start_year, end_year = selected_year_range(selected_years_range)
+    years_label = year_range_label(start_year, end_year)
 
-    # Get the processed data for the selected year
-    gdf_accidents, council_districts_geojson, district_counts, _ = cached_data.get(selected_year,
-                                                                                   (None, None, None, None))
+    if district_year_cube is not None and district_year_cube.loaded_years(start_year, end_year):
+        # Get the total accidents and fatalities per district over the selected range
+        district_accidents, district_fatalities = district_year_cube.range_totals(start_year, end_year)
 
-    if district_counts is not None:
         # Create the bar plot for district accidents
         bar_fig = go.Figure(data=[go.Bar(
-            x=district_counts.index,  # District indexes
-            y=district_counts.values,  # Number of accidents
+            x=district_year_cube.districts,  # District indexes
+            y=district_accidents,  # Number of accidents
+            customdata=district_fatalities,
+            hovertemplate="District: %{x}<br>Number of Accidents: %{y}<br>Fatalities: %{customdata}<extra></extra>",
             marker_color='indianred'  # Bar color
         )])
 
         # Update layout for the bar chart
         bar_fig.update_layout(
-            title=f'Accidents per District - {selected_year}',
+            title=f'Accidents per District - {years_label}',
             xaxis_title='District Index',
             yaxis_title='Number of Accidents',
             bargap=0.2,  # Gap between bars
@@ -676,13 +998,14 @@ def update_district_accidents_graph(selected_years_range):
 
         # Create traces for the line chart
         traces = []
-        for district, counts in district_accidents_by_year.items():
-            trace = go.Scatter(x=list(counts.keys()), y=list(counts.values()), mode='lines', name=f'District {district}')
+        loaded_years, accidents_by_year = district_year_cube.accidents_by_year()
+        for district, counts in zip(district_year_cube.districts, accidents_by_year):
+            trace = go.Scatter(x=loaded_years, y=counts, mode='lines', name=f'District {district}')
             traces.append(trace)
 
         # Create layout for the line chart
         line_chart_layout = go.Layout(
-            title='Accidents by District (2001-2021)',
+            title=f'Accidents by District ({year_range_label(loaded_years[0], loaded_years[-1])})',
             xaxis=dict(title='Year'),
             yaxis=dict(title='Total Accidents'),
             width=700,
@@ -696,190 +1019,421 @@ def update_district_accidents_graph(selected_years_range):
 
         return bar_fig, line_fig
 
+    # If data is still loading, say so instead of returning blank figures
+    if not warmup_progress.ready:
+        loading_fig = go.Figure(layout=dict(title=f'Loading accident data for {years_label}...'))
+        return loading_fig, loading_fig
+
     # If data is not available, return empty figures
     return go.Figure(), go.Figure()
 
+# Indexes of the traces and vector tile layers of the accident map, fixed by build_accident_map so updates can patch
+# them, and relied on by the clientside callbacks in assets/accident_map.js
+DISTRICTS_TRACE, TOWNS_TRACE, ACCIDENTS_HOVER_TRACE, SPEED_HUMPS_HOVER_TRACE = 0, 1, 2, 3
+ACCIDENTS_LAYER, SPEED_HUMPS_LAYER = 0, 1
+
+# Version of the accident map's base figure held by the browser, bump whenever its static layers or traces change
+ACCIDENT_MAP_BASE_VERSION = 5
+
+# Zoom from which the accidents and speed humps in view get hover text, as the vector tile layers have none
+POINT_HOVER_MIN_ZOOM = 12
+
+# Size in pixels of the accident map, used to work out the area in view after a click moved it
+ACCIDENT_MAP_WIDTH, ACCIDENT_MAP_HEIGHT = 800, 600
+
+
+# Function to compute the parts of the accident map that follow the selected year range
+def accident_map_counts(start_year, end_year, loaded_years):
+    # Get the total accidents and fatalities per district over the selected range
+    district_accidents, district_fatalities = district_year_cube.range_totals(start_year, end_year)
+    district_accidents = district_accidents.astype(float)
+
+    # Flag maps that only cover part of the range because the warmup is still running
+    map_title = f'Map of Accidents in the Districts of San Antonio - {year_range_label(start_year, end_year)}'
+    if not warmup_progress.ready and len(loaded_years) < end_year - start_year + 1:
+        map_title += ' (still loading)'
+
+    return {
+        'z': district_accidents,
+        'customdata': np.column_stack((district_year_cube.districts, district_fatalities)),
+        'cmax': max(35, int(district_accidents.max())),  # Grow the color range with the selected years
+        'tickvals': list(reversed(district_accidents)),
+        'ticktext': list(reversed(district_accidents.astype(str))),
+        'title': map_title,
+    }
+
+
+# Function to get the (west, south, east, north) bounds of the view the browser reported after a pan or zoom, or None
+def relayout_bounds(relayout_data):
+    corners = ((relayout_data or {}).get('mapbox._derived') or {}).get('coordinates')
+    if not corners:
+        return None
+
+    longitudes, latitudes = zip(*corners)
+    return [min(longitudes), min(latitudes), max(longitudes), max(latitudes)]
+
+
+# Function to work out the (west, south, east, north) bounds of a view of the accident map from its center and zoom
+def view_bounds(center, zoom):
+    # Mapbox tiles are 512 pixels wide, so half the map spans this many tiles of the zoom either way
+    x, y = lon_lat_to_tile_coordinates(center['lon'], center['lat'], zoom)
+    half_width, half_height = ACCIDENT_MAP_WIDTH / 1024, ACCIDENT_MAP_HEIGHT / 1024
+    west, north = tile_coordinates_to_lon_lat(x - half_width, y - half_height, zoom)
+    east, south = tile_coordinates_to_lon_lat(x + half_width, y + half_height, zoom)
+    return [float(west), float(south), float(east), float(north)]
+
+
+# Function to get the positions, longitudes and latitudes of the points within view bounds
+def points_in_bounds(lon, lat, bounds):
+    west, south, east, north = bounds
+    positions = np.flatnonzero((lon >= west) & (lon <= east) & (lat >= south) & (lat <= north))
+    return positions, lon[positions].tolist(), lat[positions].tolist()
+
+
+# Function to build the hover markers of the accidents of the loaded years and the speed humps within view bounds,
+# as (longitudes, latitudes, hover text) per trace, empty when no bounds are given
+def point_hover_markers(loaded_years, bounds):
+    markers = {ACCIDENTS_HOVER_TRACE: ([], [], []), SPEED_HUMPS_HOVER_TRACE: ([], [], [])}
+    if bounds is None:
+        return markers
+
+    for year in loaded_years:
+        accidents = accident_store.year(year)
+        if accidents is None:
+            continue
+        positions, longitudes, latitudes = points_in_bounds(accidents.lon, accidents.lat, bounds)
+        markers[ACCIDENTS_HOVER_TRACE][0].extend(longitudes)
+        markers[ACCIDENTS_HOVER_TRACE][1].extend(latitudes)
+        markers[ACCIDENTS_HOVER_TRACE][2].extend(
+            f"District: {district if district >= 0 else 'outside the districts'}<br>"
+            f"Fatalities: {fatalities}<br>Year: {year}"
+            for district, fatalities in zip(accidents.district[positions].tolist(),
+                                            accidents.fatalities[positions].tolist()))
+
+    speed_humps = get_point_layer('speed_humps')
+    positions, longitudes, latitudes = points_in_bounds(speed_humps.lon, speed_humps.lat, bounds)
+    markers[SPEED_HUMPS_HOVER_TRACE] = (longitudes, latitudes, speed_humps.hover_text(positions))
+    return markers
+
+
+# Function to get the tile URL template of a point layer on this server, as the map reads tiles by absolute URL
+def tile_url(layer, **query):
+    url = f"{request.host_url}tiles/{layer}/{{z}}/{{x}}/{{y}}.pbf"
+    if query:
+        url += '?' + '&'.join(f"{name}={value}" for name, value in query.items())
+    return url
+
+
+# Function to get the accident tile URL of the loaded years in the selected range
+def accident_tile_url(start_year, end_year, loaded_years):
+    # The versions of the loaded years change the URL, so the browser refetches tiles when years finish loading,
+    # built the same way as the clientside restyle in assets/accident_map.js builds it
+    versions = ''.join(year_data_versions[year][:4] for year in loaded_years)
+    return tile_url('accidents', start=start_year, end=end_year, v=versions)
+
+
+# Function to get the map center and zoom level for a clicked district or town, or None
+def clicked_map_view(click_data):
+    # Check if a point on the map was clicked
+    if not click_data or 'points' not in click_data:
+        return None
+    clicked_point = click_data['points'][0]
+
+    # Ensure that 'location' is present in the clicked_point dictionary
+    if 'location' not in clicked_point or clicked_point['location'] == '...':
+        return None
+
+    # Extract the index of the clicked point
+    clicked_location_index = clicked_point['location']
+
+    # Check if the clicked location is a district or another city
+    if clicked_location_index in council_districts_geojson.index:
+        clicked_location = council_districts_geojson.loc[clicked_location_index, 'Name']
+    elif clicked_location_index in filtered_other_cities_towns_geojson.index:
+        clicked_location = filtered_other_cities_towns_geojson.loc[clicked_location_index, 'Name']
+    else:
+        clicked_location = None
+
+    if not clicked_location:
+        return None
+
+    # Check if the clicked location is a district or another city
+    if clicked_location in council_districts_geojson['Name'].tolist():
+        # If the clicked location is a district, center the map on the district with a closer zoom
+        clicked_area = council_districts_geojson[council_districts_geojson['Name'] == clicked_location]
+        zoom_level = 12
+    elif clicked_location in filtered_other_cities_towns_geojson['Name'].tolist():
+        # If the clicked location is another city, center the map on the city with an even closer zoom
+        clicked_area = filtered_other_cities_towns_geojson[
+            filtered_other_cities_towns_geojson['Name'] == clicked_location]
+        zoom_level = 14
+    else:
+        return None
+
+    mapbox_center = {"lat": clicked_area.geometry.centroid.y.values[0],
+                     "lon": clicked_area.geometry.centroid.x.values[0]}
+
+    return mapbox_center, zoom_level
+
+
+# Function to build the full accident map, sent once to each browser and patched afterwards
+def build_accident_map(counts, show_accidents, show_speed_humps, accidents_url, view, zoom, hover_markers):
+    # Plotted the map for the selected years with accidents and other cities/towns, simplified for the zoom
+    fig = px.choropleth_mapbox(council_districts_geojson,
+                               geojson=district_pyramid.geojson_for_zoom(zoom),
+                               locations=council_districts_geojson.index,
+                               color=counts['z'],
+                               hover_name="Name",
+                               mapbox_style="open-street-map",
+                               zoom=9,
+                               center={"lat": 29.4201, "lon": -98.5721},
+                               opacity=0.5,
+                               color_continuous_scale="Jet",  # Set your desired color scale
+                               range_color=(0, counts['cmax']),
+                               width=ACCIDENT_MAP_WIDTH,
+                               height=ACCIDENT_MAP_HEIGHT,
+                               title=counts['title'],
+                               labels={'color': 'Number of Accidents'},
+                               )
+
+    # Customizing hover text
+    fig.update_traces(hovertemplate="District: %{customdata[0]}<br>" +
+                                    "Council Representative: %{hovertext}<br>" +
+                                    "Number of Accidents: %{z}<br>" +
+                                    "Fatalities: %{customdata[1]}<extra></extra>",
+                      customdata=counts['customdata'])
+
+    # Reversed the color scale for the choropleth layer
+    fig.update_traces(colorbar=dict(tickmode='array', tickvals=counts['tickvals'], ticktext=counts['ticktext']))
+
+    # Added Bexar County outline using GeoJSON file
+    fig.update_geos(fitbounds="locations", visible=False)
+
+    # Add a new choropleth_mapbox trace for other cities and towns
+    fig.add_trace(px.choropleth_mapbox(filtered_other_cities_towns_geojson,
+                                       geojson=town_pyramid.geojson_for_zoom(zoom),
+                                       locations=filtered_other_cities_towns_geojson.index,
+                                       color_discrete_sequence=["#8B4513"],  # Set color to dark brown
+                                       hover_name="Name",
+                                       opacity=0.5,
+                                       ).data[0])
+
+    # Apply the modification to remove the legend entry for other cities and towns
+    fig.update_traces(showlegend=False, selector=dict(type='choroplethmapbox'))
+
+    # Invisible markers over the tiles of the points in view, so close zooms show hover text for them
+    for trace, size, visible in ((ACCIDENTS_HOVER_TRACE, 7, show_accidents),
+                                 (SPEED_HUMPS_HOVER_TRACE, 4, show_speed_humps)):
+        longitudes, latitudes, hover_text = hover_markers[trace]
+        fig.add_trace(go.Scattermapbox(lon=longitudes, lat=latitudes, mode='markers', hovertext=hover_text,
+                                       hoverinfo='text', marker=dict(size=size, opacity=0), showlegend=False,
+                                       visible=visible))
+
+    # Accidents and speed humps are streamed as vector tiles of the visible area, and toggled through their visibility
+    mapbox_layers = [None, None]
+    mapbox_layers[ACCIDENTS_LAYER] = dict(
+        sourcetype='vector',
+        source=[accidents_url],
+        sourcelayer='accidents',
+        type='circle',
+        circle=dict(radius=3.5),
+        color='red',
+        opacity=0.8,
+        visible=show_accidents,
+    )
+    mapbox_layers[SPEED_HUMPS_LAYER] = dict(
+        sourcetype='vector',
+        source=[tile_url('speed_humps')],
+        sourcelayer='speed_humps',
+        type='circle',
+        circle=dict(radius=2),
+        color='blue',
+        opacity=0.6,
+        visible=show_speed_humps,
+    )
+    fig.update_layout(mapbox_layers=mapbox_layers)
+
+    # Update the map layout with the center and zoom level of the clicked location
+    if view:
+        fig.update_layout(mapbox_center=view[0], mapbox_zoom=view[1])
+
+    return fig
+
+
+# Function to patch the outlines, view and hover markers of the accident map the browser already holds,
+# or None if nothing changed
+def patch_accident_map(view, triggered, geojson_zoom, hover_markers):
+    if geojson_zoom is None and not (view and 'accident-map.clickData' in triggered) and hover_markers is None:
+        return None
+
+    patched_fig = Patch()
+
+    # Replace the hover markers with those of the points now in view
+    if hover_markers is not None:
+        for trace, (longitudes, latitudes, hover_text) in hover_markers.items():
+            patched_fig['data'][trace]['lon'] = longitudes
+            patched_fig['data'][trace]['lat'] = latitudes
+            patched_fig['data'][trace]['hovertext'] = hover_text
+
+    # Swap in the district and town outlines simplified for a new zoom level
+    if geojson_zoom is not None:
+        patched_fig['data'][DISTRICTS_TRACE]['geojson'] = district_pyramid.geojson_for_zoom(geojson_zoom)
+        patched_fig['data'][TOWNS_TRACE]['geojson'] = town_pyramid.geojson_for_zoom(geojson_zoom)
+
+    # Move the map only when a district or town was just clicked
+    if view and 'accident-map.clickData' in triggered:
+        patched_fig['layout']['mapbox']['center'] = view[0]
+        patched_fig['layout']['mapbox']['zoom'] = view[1]
+
+    return patched_fig
+
+
+@app.callback(
+    [Output('accident-map', 'figure'),
+     Output('accident-map-base', 'data')],
+    [Input('year-slider', 'value'),
+     Input('accident-map', 'clickData'),  # Add this input for clickData
+     Input('accident-map', 'relayoutData'),
+     Input('warmup-interval', 'n_intervals')],
+    [State('toggle-accidents', 'value'),
+     State('toggle-speed-humps', 'value'),
+     State('accident-map-base', 'data')]
+)
+def update_map(selected_years_range, click_data, relayout_data, n_intervals, toggle_accidents, toggle_speed_humps,
+               base):
+    started = time.perf_counter()
+    triggered = set(ctx.triggered_prop_ids)
+
+    # Once the browser holds the base figure, years, warmup progress and toggles are restyled clientside,
+    # apart from the hover markers of a close view, which follow the selected years
+    has_base = bool(base) and base.get('version') == ACCIDENT_MAP_BASE_VERSION
+    hovering = has_base and base.get('hover_bounds') is not None
+    view_changed = triggered & {'accident-map.clickData', 'accident-map.relayoutData'}
+    if has_base and not view_changed and not (hovering and 'year-slider.value' in triggered):
+        raise PreventUpdate
+
+    # Read the selected year range from the slider
+    start_year, end_year = selected_year_range(selected_years_range)
+    years_label = year_range_label(start_year, end_year)
+
+    # Check which years of the selected range are already cached
+    loaded_years = [] if district_year_cube is None else district_year_cube.loaded_years(start_year, end_year)
+    if not loaded_years:
+        # Show loading indicator while the warmup is still loading the years
+        if not warmup_progress.ready:
+            return loading_figure(f'Loading accident data for {years_label}...'), None
+        return empty_fig, None
+
+    view = clicked_map_view(click_data)
+
+    # Follow the zoom of the map, set by a click on a district or town or by scrolling
+    zoom = base['zoom'] if has_base else ACCIDENT_MAP_ZOOM
+    if view and ('accident-map.clickData' in triggered or not has_base):
+        zoom = view[1]
+    elif 'accident-map.relayoutData' in triggered and relayout_data and 'mapbox.zoom' in relayout_data:
+        zoom = relayout_data['mapbox.zoom']
+
+    # Follow the area in view, reported by the browser after a pan or zoom and worked out after a click
+    bounds = base.get('hover_bounds') if has_base else None
+    if 'accident-map.relayoutData' in triggered and relayout_bounds(relayout_data):
+        bounds = relayout_bounds(relayout_data)
+    elif view and ('accident-map.clickData' in triggered or not has_base):
+        bounds = view_bounds(view[0], view[1])
+    hover_bounds = bounds if zoom >= POINT_HOVER_MIN_ZOOM else None
+
+    # Send the full figure when the browser does not hold the current base figure yet, otherwise only a patch
+    if not has_base:
+        fig = build_accident_map(accident_map_counts(start_year, end_year, loaded_years),
+                                 'show_accidents' in toggle_accidents, 'show_speed_humps' in toggle_speed_humps,
+                                 accident_tile_url(start_year, end_year, loaded_years), view, zoom,
+                                 point_hover_markers(loaded_years, hover_bounds))
+    else:
+        # Only resend the outlines when the zoom crossed into another simplification level
+        level_changed = district_pyramid.level_for_zoom(zoom) != district_pyramid.level_for_zoom(base['zoom'])
+
+        # Only resend the hover markers when the view or, in a close view, the years changed
+        hover_changed = hover_bounds != base.get('hover_bounds') or (hovering and 'year-slider.value' in triggered)
+        fig = patch_accident_map(view, triggered, zoom if level_changed else None,
+                                 point_hover_markers(loaded_years, hover_bounds) if hover_changed else None)
+        if fig is None:
+            raise PreventUpdate
+
+    report_figure_cost('update_map', fig, started)
+
+    return fig, {'version': ACCIDENT_MAP_BASE_VERSION, 'zoom': zoom, 'hover_bounds': hover_bounds}
+
+
+# Send the per-year district counts to the browser, which restyles the accident map for any year range from them
 @app.callback(
-    Output('accident-map', 'figure'),
+    Output('district-year-table', 'data'),
+    [Input('warmup-interval', 'n_intervals'),
+     Input('data-generation', 'data')]
+)
+def update_district_year_table(n_intervals, generation):
+    if district_year_cube is None:
+        raise PreventUpdate
+
+    years, accidents, fatalities = district_year_cube.loaded_table()
+    return {
+        'districts': district_year_cube.districts.tolist(),
+        'years': years.tolist(),
+        'accidents': accidents.tolist(),
+        'fatalities': fatalities.tolist(),
+        'versions': [year_data_versions[year][:4] for year in years.tolist()],
+        'ready': warmup_progress.ready,
+    }
+
+
+# Show or hide the accident and speed hump layers in the browser, without a round trip to the server
+app.clientside_callback(
+    ClientsideFunction(namespace='accidentMap', function_name='toggleLayers'),
+    Output('accident-map', 'figure', allow_duplicate=True),
     [Input('toggle-accidents', 'value'),
-     Input('toggle-speed-humps', 'value'),
-     Input('year-slider', 'value'),
-     Input('accident-map', 'clickData')]  # Add this input for clickData
+     Input('toggle-speed-humps', 'value')],
+    [State('accident-map', 'figure')],
+    prevent_initial_call=True
+)
+
+# Tell the browser about data the watcher ingested, only when the generation moved on since it last looked
+@app.callback(
+    Output('data-generation', 'data'),
+    [Input('data-watch-interval', 'n_intervals'),
+     Input('warmup-interval', 'n_intervals')],
+    [State('data-generation', 'data')]
+)
+def update_data_generation(watch_intervals, warmup_intervals, shown_generation):
+    if data_generation == shown_generation:
+        raise PreventUpdate
+    return data_generation
+
+
+# Extend the year sliders to the newest year loaded
+@app.callback(
+    [Output('year-slider', 'max'),
+     Output('year-slider', 'marks'),
+     Output('hotspot-year-slider', 'max'),
+     Output('hotspot-year-slider', 'marks')],
+    [Input('data-generation', 'data')],
+    [State('year-slider', 'max')]
+)
+def update_year_sliders(generation, slider_max):
+    last_year = latest_year()
+    if last_year == slider_max:
+        raise PreventUpdate
+    return (last_year, year_slider_marks(SLIDER_MIN_YEAR, last_year),
+            last_year, hotspot_slider_marks(SLIDER_MIN_YEAR, last_year))
+
+
+# Restyle the accident map for the selected years in the browser, from the district x year table
+app.clientside_callback(
+    ClientsideFunction(namespace='accidentMap', function_name='restyle'),
+    Output('accident-map', 'figure', allow_duplicate=True),
+    [Input('year-slider', 'value'),
+     Input('district-year-table', 'data')],
+    [State('accident-map', 'figure')],
+    prevent_initial_call=True
 )
-def update_map(toggle_accidents, toggle_speed_humps, selected_years_range, click_data):
-    global latest_triggered_year
-
-    # Calculate the average of the selected range
-    selected_year = int(sum(selected_years_range) / len(selected_years_range))
-
-    # Get the triggered component ID
-    ctx = dash.callback_context
-    triggered_id = ctx.triggered_id
-
-    # Check if the callback was triggered by the slider
-    if triggered_id and 'year-slider' in triggered_id:
-        # Update the latest triggered year
-        latest_triggered_year = selected_year
-
-    # Check if data for the selected year is already cached
-    if latest_triggered_year not in cached_data or latest_triggered_year != selected_year:
-        # Show loading indicator or update layout to indicate data processing
-        return empty_fig
-
-    # Call the process_data function to get the combined data for the selected year
-    gdf_accidents, council_districts_geojson, district_counts, output_text = cached_data[latest_triggered_year]
-
-    if gdf_accidents is not None:
-        # Plotted the map for the selected year with accidents and other cities/towns
-        fig = px.choropleth_mapbox(council_districts_geojson,
-                                   geojson=council_districts_geojson.geometry,
-                                   locations=council_districts_geojson.index,
-                                   color=district_counts.values.astype(float),
-                                   hover_name="Name",
-                                   mapbox_style="open-street-map",
-                                   zoom=9,
-                                   center={"lat": 29.4201, "lon": -98.5721},
-                                   opacity=0.5,
-                                   color_continuous_scale="Jet",  # Set your desired color scale
-                                   range_color=(0, 35),  # Set your desired range
-                                   width=800,
-                                   height=600,
-                                   title=f'Map of Accidents in the Districts of San Antonio - {latest_triggered_year}',
-                                   labels={'color': 'Number of Accidents'},
-                                   )
-
-        # Customizing hover text
-        fig.update_traces(hovertemplate="District: %{customdata}<br>" +
-                                        "Council Representative: %{hovertext}<br>" +
-                                        "Number of Accidents: %{z}<extra></extra>",
-                          customdata=council_districts_geojson['District'])
-
-        # Reversed the color scale for the choropleth layer
-        fig.update_traces(
-            colorbar=dict(tickmode='array', tickvals=list(reversed(district_counts.values.astype(float))),
-                          ticktext=list(reversed(district_counts.values.astype(float).astype(str))))
-        )
 
-        # Added Bexar County outline using GeoJSON file
-        fig.update_geos(fitbounds="locations", visible=False)
-
-        # Add a new choropleth_mapbox trace for other cities and towns
-        fig.add_trace(px.choropleth_mapbox(filtered_other_cities_towns_geojson,
-                                           geojson=filtered_other_cities_towns_geojson.geometry,
-                                           locations=filtered_other_cities_towns_geojson.index,
-                                           color_discrete_sequence=["#8B4513"],  # Set color to dark brown
-                                           hover_name="Name",
-                                           opacity=0.5,
-                                           ).data[0])
-
-        # Apply the modification to remove the legend entry for other cities and towns
-        fig.update_traces(showlegend=False, selector=dict(type='choroplethmapbox'))
-
-        if 'show_accidents' in toggle_accidents:
-            # Adjusted marker size, opacity, and hover text in the Scattermapbox trace for accidents
-            fig.add_trace(go.Scattermapbox(
-                mode="markers",
-                lon=gdf_accidents.geometry.x,
-                lat=gdf_accidents.geometry.y,
-                hoverinfo='text',
-                hovertext=gdf_accidents[district_column_name].astype(str),  # Use district_column_name for hovertext
-                marker=dict(
-                    size=7,
-                    opacity=0.8,
-                    color='red',
-                ),
-                name='Accidents',
-                showlegend=False  # Set showlegend to False for this trace
-            ))
-
-        # Load GeoJSON data for speed humps from file
-        speed_humps_geojson = gpd.read_file("Traffic_Speed_Humps.geojson")
-
-        # Check if 'geometry' column exists before creating GeoDataFrame for speed humps
-        if 'geometry' in speed_humps_geojson.columns:
-            # Create a GeoDataFrame from the speed humps data using the 'geometry' column
-            gdf_speed_humps = gpd.GeoDataFrame(speed_humps_geojson, geometry='geometry', crs="EPSG:4326")
-
-            # Check if 'show_speed_humps' is True
-            if 'show_speed_humps' in toggle_speed_humps:
-                # Adjusted marker size, opacity, and hover text in the Scattermapbox trace for speed humps
-                fig.add_trace(go.Scattermapbox(
-                    mode="markers",
-                    lon=gdf_speed_humps.geometry.x,
-                    lat=gdf_speed_humps.geometry.y,
-                    hoverinfo='text',
-                    hovertext=gdf_speed_humps['geometry'].apply(lambda geom: geom.coords[:]).astype(str),
-                    marker=dict(
-                        size=4,
-                        opacity=0.6,
-                        color='blue',
-                    ),
-                    name='Speed Humps',
-                    showlegend=False  # showlegend to False for trace
-                ))
-
-            # Check if a point on the map was clicked
-            if click_data and 'points' in click_data:
-                clicked_point = click_data['points'][0]
-
-                # Ensure that 'location' is present in the clicked_point dictionary
-                if 'location' in clicked_point and clicked_point['location'] != '...':
-                    # Extract the index of the clicked point
-                    clicked_location_index = clicked_point['location']
-
-                    # Check if the clicked location is a district or another city
-                    if clicked_location_index in council_districts_geojson.index:
-                        clicked_location = council_districts_geojson.loc[clicked_location_index, 'Name']
-                    elif clicked_location_index in filtered_other_cities_towns_geojson.index:
-                        clicked_location = filtered_other_cities_towns_geojson.loc[clicked_location_index, 'Name']
-                    else:
-                        clicked_location = None
-
-                    # Print information for debugging
-                    print(f"Clicked point: {clicked_point}")
-                    print(f"Clicked location index: {clicked_location_index}")
-                    print(f"Clicked location: {clicked_location}")
-
-                    # Update the map center based on the clicked location
-                    if clicked_location:
-                        # Check if the clicked location is a district or another city
-                        if clicked_location in council_districts_geojson['Name'].tolist():
-                            # If the clicked location is a district, update map center to the district's coordinates
-                            clicked_district = council_districts_geojson[
-                                council_districts_geojson['Name'] == clicked_location]
-                            mapbox_center = {"lat": clicked_district.geometry.centroid.y.values[0],
-                                             "lon": clicked_district.geometry.centroid.x.values[0]}
-                            # Set zoom level for the clicked district
-                            zoom_level = 12
-
-                            # Print additional information for debugging
-                            print(f"Mapbox center: {mapbox_center}")
-                            print(f"Zoom level: {zoom_level}")
-
-                            # Update the map layout with the new center and zoom level
-                            fig.update_layout(mapbox_center=mapbox_center, mapbox_zoom=zoom_level)
-
-                        elif clicked_location in filtered_other_cities_towns_geojson['Name'].tolist():
-                            # If the clicked location is another city, update map center to the city's coordinates
-                            clicked_city = filtered_other_cities_towns_geojson[
-                                filtered_other_cities_towns_geojson['Name'] == clicked_location]
-                            mapbox_center = {"lat": clicked_city.geometry.centroid.y.values[0],
-                                             "lon": clicked_city.geometry.centroid.x.values[0]}
-                            # Set zoom level for the clicked city
-                            zoom_level = 14
-
-                            # Additional information for debugging
-                            print(f"Mapbox center: {mapbox_center}")
-                            print(f"Zoom level: {zoom_level}")
-
-                            # Update the map layout with the new center and zoom level
-                            fig.update_layout(mapbox_center=mapbox_center, mapbox_zoom=zoom_level)
-
-            return fig
-
-    # If selected year hasn't changed, return PreventUpdate to avoid unnecessary updates
-    return dash.no_update
-
-# Run the Dash app
+# Run the Dash app on the single-process development server, serve.py runs it under gunicorn for production
 if __name__ == '__main__':
-    app.run_server(debug=True)
\ No newline at end of file
+    app.run(debug=False)
\ No newline at end of file
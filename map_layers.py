@@ -0,0 +1,68 @@
+import json
+import threading
+
+import numpy as np
+
+
+# Point overlays shown on the accident map: GeoJSON file, attribute columns kept, and (label, column) pairs shown on hover
+POINT_LAYERS = {
+    'speed_humps': ("Traffic_Speed_Humps.geojson", ['MaterialType', 'Condition', 'District'],
+                    [('Street', 'MSAG_Name'), ('District', 'District'), ('Material', 'MaterialType'),
+                     ('Condition', 'Condition')]),
+}
+
+# Point layers parsed so far, each built once per process on first use
+_point_layers = {}
+_point_layers_lock = threading.Lock()
+
+
+# Point overlay held as compact arrays, so callbacks only slice them
+class PointLayer:
+    def __init__(self, lon, lat, attributes, hover_values):
+        self.lon = lon
+        self.lat = lat
+        self.attributes = attributes
+        self.hover_values = hover_values
+
+    def __len__(self):
+        return len(self.lon)
+
+    # Function to build the hover text of the points at the given positions, only ever the few points in view
+    def hover_text(self, positions):
+        return ['<br>'.join(f"{label}: {values[position]}" for label, values in self.hover_values)
+                for position in positions]
+
+
+# Function to parse a GeoJSON file of points into a PointLayer, skipping features without a point geometry
+def read_point_layer(path, attribute_columns, hover_columns):
+    with open(path) as handle:
+        features = json.load(handle)['features']
+    features = [feature for feature in features
+                if feature.get('geometry') and feature['geometry'].get('type') == 'Point']
+
+    coordinates = np.array([feature['geometry']['coordinates'][:2] for feature in features],
+                           dtype='float32').reshape(-1, 2)
+    properties = [feature.get('properties') or {} for feature in features]
+
+    # Hover values are kept per column and only joined into text for the points a map view shows
+    hover_values = [(label, np.array([row.get(column) for row in properties], dtype=object))
+                    for label, column in hover_columns]
+
+    attributes = {}
+    for column in attribute_columns:
+        values = [row.get(column) for row in properties]
+        if all(isinstance(value, int) for value in values):
+            attributes[column] = np.array(values, dtype='int16')
+        else:
+            attributes[column] = np.array(values, dtype=object)
+
+    return PointLayer(coordinates[:, 0], coordinates[:, 1], attributes, hover_values)
+
+
+# Function to get a registered point layer, parsing its GeoJSON the first time it is asked for
+def get_point_layer(name):
+    with _point_layers_lock:
+        if name not in _point_layers:
+            path, attribute_columns, hover_columns = POINT_LAYERS[name]
+            _point_layers[name] = read_point_layer(path, attribute_columns, hover_columns)
+        return _point_layers[name]
@@ -0,0 +1,236 @@
+import cProfile
+import os
+import re
+import threading
+import time
+
+from flask import g, request
+
+# Process peak memory is only available on Unix
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Upper bounds of the latency buckets in seconds, from a cached tile to a cold clustering
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Upper bounds of the payload size buckets in bytes, from an empty patch to a full map figure
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Route Dash posts every callback to
+DASH_CALLBACK_PATH = '/_dash-update-component'
+
+
+# Function to escape a label value for the Prometheus text format
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+# Function to format a label set, with extra labels such as the bucket bound appended
+def format_labels(names, values, extra=()):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+# Function to format a sample value, Prometheus spells infinity +Inf
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Thread-safe histogram with one series per label set, rendered in the Prometheus text format
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    # Function to record one observation for a label set
+    def observe(self, value, *label_values):
+        with self._lock:
+            counts, total = self._series.get(label_values, ([0] * len(self.buckets), 0.0))
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[position] += 1
+            self._series[label_values] = (counts, total + value)
+
+    # Function to render the cumulative buckets, sum and count of every series
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+
+        for label_values, counts, total in series:
+            for bound, count in zip(self.buckets, counts):
+                labels = format_labels(self.label_names, label_values, [('le', format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+# Metric whose samples are read from the application when the metrics are scraped
+class CollectedMetric:
+    def __init__(self, name, help_text, metric_type, label_names, collect):
+        self.name = name
+        self.help_text = help_text
+        self.metric_type = metric_type
+        self.label_names = tuple(label_names)
+        self.collect = collect
+
+    # Function to render the samples, the collect function yields (label values, value) pairs
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        try:
+            samples = list(self.collect())
+        except Exception as error:
+            print(f"Could not collect {self.name}: {error}")
+            samples = []
+
+        for label_values, value in samples:
+            if value is not None:
+                lines.append(f"{self.name}{format_labels(self.label_names, label_values)} {format_value(value)}")
+        return lines
+
+
+# Set of metrics rendered together by the /metrics route
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    # Function to register a histogram the application observes into
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help_text, label_names, buckets)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    # Function to register a gauge or counter whose samples are read when scraped
+    def collected(self, name, help_text, metric_type, label_names, collect):
+        metric = CollectedMetric(name, help_text, metric_type, label_names, collect)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    # Function to render every metric in the Prometheus text exposition format
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+# Function to get the resident memory of this process in bytes, or None where it cannot be read
+def process_rss_bytes():
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+# Function to get the peak resident memory of this process in bytes, or None where it cannot be read
+def process_peak_rss_bytes():
+    if resource is None:
+        return None
+
+    # Linux reports kilobytes and macOS bytes
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+# Function to name the callback a Dash request is for, from the output ids it posts
+def callback_name(payload):
+    output = payload.get('output', '') if isinstance(payload, dict) else ''
+    return '+'.join(part for part in output.strip('.').split('...') if part) or 'unknown'
+
+
+# Profiles requests on demand: arming it captures the next request whose callback matches into a file
+class RequestProfiler:
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self._armed = None
+        self._lock = threading.Lock()
+
+    # Function to profile the next request for a callback containing the given text, any callback when empty
+    def arm(self, callback_filter=''):
+        with self._lock:
+            self._armed = callback_filter
+
+    # Function to claim the armed profile for a request, so only one request is ever profiled per arming
+    def claim(self, name):
+        with self._lock:
+            if self._armed is None or self._armed not in name:
+                return False
+            self._armed = None
+            return True
+
+    # Function to write a finished profile as a pstats file named after the callback
+    def save(self, profile, name):
+        os.makedirs(self.output_dir, exist_ok=True)
+        file_name = re.sub(r'[^\w.-]+', '_', name)
+        path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{file_name}.prof")
+        profile.dump_stats(path)
+        print(f"Saved profile of {name} to {path}")
+        return path
+
+
+# Function to time every request to a Flask server, with callback latencies and payload sizes per Dash callback
+def instrument_server(server, registry, profiler=None):
+    request_seconds = registry.histogram('accident_http_request_duration_seconds',
+                                         "Time to answer an HTTP request, per route and status.",
+                                         ('route', 'status'))
+    callback_seconds = registry.histogram('accident_callback_duration_seconds',
+                                          "Time to run a Dash callback, per callback and status.",
+                                          ('callback', 'status'))
+    callback_bytes = registry.histogram('accident_callback_response_bytes',
+                                        "Size of the JSON a Dash callback sends back, per callback.",
+                                        ('callback',), SIZE_BUCKETS)
+
+    @server.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        g.metrics_callback = None
+        g.metrics_profile = None
+
+        if request.path == DASH_CALLBACK_PATH:
+            g.metrics_callback = callback_name(request.get_json(silent=True))
+            if profiler is not None and profiler.claim(g.metrics_callback):
+                g.metrics_profile = cProfile.Profile()
+                g.metrics_profile.enable()
+
+    @server.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        seconds = time.perf_counter() - started
+
+        profile = g.pop('metrics_profile', None)
+        if profile is not None:
+            profile.disable()
+            profiler.save(profile, g.metrics_callback)
+
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        request_seconds.observe(seconds, route, str(response.status_code))
+        if g.metrics_callback is not None:
+            callback_seconds.observe(seconds, g.metrics_callback, str(response.status_code))
+            if not response.direct_passthrough:
+                callback_bytes.observe(response.calculate_content_length() or 0, g.metrics_callback)
+        return response
+
+    return request_seconds, callback_seconds, callback_bytes
+
+
+# Function to parse the JSON body of an arming request, accepting an empty body
+def profile_filter_from_request():
+    payload = request.get_json(silent=True) or {}
+    return request.args.get('callback', payload.get('callback', '')) if isinstance(payload, dict) else ''
+
@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from accident_data import (INGEST_WORKERS, YearAccidents, accidents_version, available_years, cached_years,
+                           get_council_districts, ingest_years, layer_code_names)
+from density_rasters import DENSITY_BANDWIDTH_METERS, DENSITY_CELL_METERS, DensityGrid, DensityRasterStore
+from district_cube import DistrictYearCube
+from hotspots import DEFAULT_EPS_METERS, DEFAULT_HOTSPOT_DISTRICTS, DEFAULT_MIN_SAMPLES, compute_hotspots
+
+
+# Bump whenever the files or their columns change, so consumers can tell which layout they read
+PRECOMPUTE_FORMAT_VERSION = 2
+
+# File describing the years, parameters and files of a precomputed run
+MANIFEST_NAME = "manifest.json"
+
+# Table formats the aggregates can be written in
+TABLE_FORMATS = ('parquet', 'csv')
+
+
+# Function to write a DataFrame in the chosen table format, returning the name of the file
+def write_table(frame, directory, name, table_format):
+    file_name = f"{name}.{table_format}"
+    if table_format == 'parquet':
+        frame.to_parquet(os.path.join(directory, file_name), index=False)
+    else:
+        frame.to_csv(os.path.join(directory, file_name), index=False)
+    return file_name
+
+
+# Function to read a table written by write_table, in the format given by its file name
+def read_table(directory, file_name):
+    if file_name.endswith('.parquet'):
+        return pd.read_parquet(os.path.join(directory, file_name))
+    return pd.read_csv(os.path.join(directory, file_name))
+
+
+# Function to write the accident count summary of one year, in the layout the dashboard used to print
+def year_summary_text(districts, district_counts, total_accidents):
+    table = pd.DataFrame({'District': districts, 'Accident Count': district_counts})
+    output_text = "San Antonio's 10 Districts with Accident Counts:\n" + table.to_string(index=False)
+    output_text += f"\n\nTotal Accidents for the Year: {total_accidents}"
+    return output_text
+
+
+# Function to build the long district x year table of accident counts and fatalities
+def district_year_table(cube):
+    years, accidents, fatalities = cube.loaded_table()
+    return pd.DataFrame({
+        'District': np.repeat(cube.districts, len(years)),
+        'Year': np.tile(years, len(cube.districts)),
+        'Accidents': accidents.ravel(),
+        'Fatalities': fatalities.ravel(),
+    })
+
+
+# Function to build the table of every accident with its district, town and growth area codes, -1 outside a layer
+def accident_assignment_table(accidents_by_year):
+    years = sorted(accidents_by_year)
+    return pd.DataFrame({
+        'Year': np.concatenate([np.full(len(accidents_by_year[year]), year, dtype='int16') for year in years]),
+        'Longitude': np.concatenate([accidents_by_year[year].lon for year in years]),
+        'Latitude': np.concatenate([accidents_by_year[year].lat for year in years]),
+        'District': np.concatenate([accidents_by_year[year].district for year in years]),
+        'Fatalities': np.concatenate([accidents_by_year[year].fatalities for year in years]),
+        'Town': np.concatenate([accidents_by_year[year].town for year in years]),
+        'GrowthArea': np.concatenate([accidents_by_year[year].growth_area for year in years]),
+    })
+
+
+# Function to cluster the accidents of the given districts over every ingested year
+def hotspot_tables(accidents_by_year, raster_store, districts, eps, min_samples):
+    years = sorted(accidents_by_year)
+    longitudes, latitudes = [np.empty(0, dtype='float32')], [np.empty(0, dtype='float32')]
+    for year in years:
+        in_districts = np.isin(accidents_by_year[year].district, districts)
+        longitudes.append(accidents_by_year[year].lon[in_districts])
+        latitudes.append(accidents_by_year[year].lat[in_districts])
+
+    hotspots = compute_hotspots(np.concatenate(longitudes), np.concatenate(latitudes),
+                                raster_store.range_density(years), raster_store.grid, eps=eps,
+                                min_samples=min_samples)
+
+    clusters = pd.DataFrame({'Longitude': hotspots['longitudes'], 'Latitude': hotspots['latitudes'],
+                             'Cluster': hotspots['cluster_labels']})
+    dense_cells = pd.DataFrame({'Longitude': hotspots['dense_longitudes'], 'Latitude': hotspots['dense_latitudes'],
+                                'Density': hotspots['dense_densities']})
+    return clusters, dense_cells
+
+
+# Function to ingest a year range and write its aggregates, assignments, hotspots and summaries into a directory
+def precompute(output_dir, years, workers=INGEST_WORKERS, table_format='parquet',
+               districts=DEFAULT_HOTSPOT_DISTRICTS, eps=DEFAULT_EPS_METERS, min_samples=DEFAULT_MIN_SAMPLES):
+    started = time.perf_counter()
+
+    # Parsing and the spatial join of the years fan out across the ingestion worker pool
+    accidents_by_year = ingest_years(years, workers=workers, compact=True)
+    accidents_by_year = {year: accidents for year, accidents in accidents_by_year.items() if accidents is not None}
+    if not accidents_by_year:
+        raise SystemExit(f"No accident data found for {years[0]}-{years[-1]}")
+
+    council_districts = get_council_districts()
+    cube = DistrictYearCube(council_districts['District'], min(accidents_by_year), max(accidents_by_year))
+    raster_store = DensityRasterStore(DensityGrid.around(council_districts, DENSITY_CELL_METERS),
+                                      DENSITY_BANDWIDTH_METERS)
+    for year, accidents in accidents_by_year.items():
+        cube.set_year(year, accidents.district, accidents.fatalities)
+        raster_store.set_year(year, accidents.lon, accidents.lat)
+
+    # Write into a sibling directory first so readers never see a half-written run
+    temporary_directory = output_dir.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(temporary_directory, ignore_errors=True)
+    os.makedirs(temporary_directory)
+
+    files = {
+        'district_year': write_table(district_year_table(cube), temporary_directory, 'district_year', table_format),
+        'accidents': write_table(accident_assignment_table(accidents_by_year), temporary_directory, 'accidents',
+                                 table_format),
+    }
+    clusters, dense_cells = hotspot_tables(accidents_by_year, raster_store, list(districts), eps, min_samples)
+    files['hotspot_clusters'] = write_table(clusters, temporary_directory, 'hotspot_clusters', table_format)
+    files['hotspot_dense_cells'] = write_table(dense_cells, temporary_directory, 'hotspot_dense_cells', table_format)
+
+    # Per-year totals and text summaries, with the district counts in the order of the council district layer
+    table_years, accidents, fatalities = cube.loaded_table()
+    summaries = {}
+    for column, year in enumerate(table_years.tolist()):
+        summaries[str(year)] = {
+            'total_accidents': len(accidents_by_year[year]),
+            'total_fatalities': int(accidents_by_year[year].fatalities.sum()),
+            'district_accidents': dict(zip(map(str, cube.districts.tolist()), accidents[:, column].tolist())),
+            'district_fatalities': dict(zip(map(str, cube.districts.tolist()), fatalities[:, column].tolist())),
+            'output_text': year_summary_text(cube.districts, accidents[:, column], len(accidents_by_year[year])),
+            'data_version': accidents_version(accidents_by_year[year]),
+        }
+    files['summaries'] = 'summaries.json'
+    with open(os.path.join(temporary_directory, files['summaries']), 'w') as handle:
+        json.dump(summaries, handle, indent=2)
+
+    manifest = {'format_version': PRECOMPUTE_FORMAT_VERSION, 'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'years': sorted(accidents_by_year), 'missing_years': sorted(set(years) - set(accidents_by_year)),
+                'hotspot_parameters': {'districts': list(districts), 'eps_meters': eps, 'min_samples': min_samples,
+                                       'bandwidth_meters': raster_store.bandwidth_meters,
+                                       'cell_meters': raster_store.grid.cell_meters},
+                'layer_codes': layer_code_names(), 'files': files}
+    with open(os.path.join(temporary_directory, MANIFEST_NAME), 'w') as handle:
+        json.dump(manifest, handle, indent=2)
+
+    # Swap the new run in place of the previous one
+    previous_directory = output_dir.rstrip(os.sep) + '.old'
+    shutil.rmtree(previous_directory, ignore_errors=True)
+    if os.path.exists(output_dir):
+        os.replace(output_dir, previous_directory)
+    os.replace(temporary_directory, output_dir)
+    shutil.rmtree(previous_directory, ignore_errors=True)
+
+    print(f"Precomputed {len(accidents_by_year)} years into {output_dir} in {time.perf_counter() - started:.1f} s")
+    return manifest
+
+
+# Function to read a precomputed run back as its manifest, the compact accidents of every year and the hotspot
+# tables, or None when the directory holds no usable run of this layout and these polygon layers
+def load_precomputed(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as handle:
+            manifest = json.load(handle)
+        with open(os.path.join(directory, manifest['files']['summaries'])) as handle:
+            summaries = json.load(handle)
+    except (OSError, ValueError, KeyError) as error:
+        print(f"Could not read the precomputed run in {directory}: {error}")
+        return None
+
+    if manifest.get('format_version') != PRECOMPUTE_FORMAT_VERSION:
+        print(f"Precomputed run in {directory} has format {manifest.get('format_version')}, "
+              f"expected {PRECOMPUTE_FORMAT_VERSION}")
+        return None
+
+    # The codes of the assignment table only mean the same polygons when the layers have not changed since
+    if manifest.get('layer_codes') != json.loads(json.dumps(layer_code_names())):
+        print(f"Precomputed run in {directory} was assigned against other polygon layers")
+        return None
+
+    table = read_table(directory, manifest['files']['accidents'])
+    accidents_by_year = {}
+    for year, rows in table.groupby('Year', sort=True):
+        accidents = YearAccidents.from_columns(rows['Longitude'], rows['Latitude'], rows['District'],
+                                               rows['Fatalities'], rows['Town'], rows['GrowthArea'])
+
+        # The summaries carry the data version of every year, so a damaged or edited table is not served
+        if accidents_version(accidents) != summaries.get(str(year), {}).get('data_version'):
+            print(f"Precomputed accidents of {year} in {directory} do not match their summary")
+            return None
+        accidents_by_year[int(year)] = accidents
+
+    return {
+        'manifest': manifest,
+        'accidents': accidents_by_year,
+        'summaries': summaries,
+        'hotspot_clusters': read_table(directory, manifest['files']['hotspot_clusters']),
+        'hotspot_dense_cells': read_table(directory, manifest['files']['hotspot_dense_cells']),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Precompute the accident aggregates, hotspots and summaries "
+                                                 "without starting the dashboard")
+    parser.add_argument('--output-dir', default='precomputed', help="directory the results are written to")
+    parser.add_argument('--first-year', type=int,
+                        help="first year to process, the first available CSV or cached year when unset")
+    parser.add_argument('--last-year', type=int,
+                        help="last year to process, the last available CSV or cached year when unset")
+    parser.add_argument('--workers', type=int, default=INGEST_WORKERS, help="ingestion worker processes")
+    parser.add_argument('--format', choices=TABLE_FORMATS, default='parquet', help="format of the tables")
+    parser.add_argument('--districts', type=int, nargs='+', default=list(DEFAULT_HOTSPOT_DISTRICTS),
+                        help="districts the hotspots are clustered over")
+    parser.add_argument('--eps', type=float, default=DEFAULT_EPS_METERS, help="hotspot neighbour distance in meters")
+    parser.add_argument('--min-samples', type=int, default=DEFAULT_MIN_SAMPLES,
+                        help="accidents within the distance that make a hotspot core")
+    args = parser.parse_args()
+
+    # Without CSVs, such as on the bundled legacy cache alone, the cached years are ingested from the cache
+    years_on_disk = available_years() or cached_years()
+    first_year = args.first_year if args.first_year is not None else min(years_on_disk, default=None)
+    last_year = args.last_year if args.last_year is not None else max(years_on_disk, default=None)
+    if first_year is None or last_year is None or first_year > last_year:
+        raise SystemExit("No years to process, pass --first-year and --last-year")
+
+    precompute(args.output_dir, list(range(first_year, last_year + 1)), args.workers, args.format, args.districts,
+               args.eps, args.min_samples)
@@ -0,0 +1,105 @@
+import argparse
+import os
+import signal
+import threading
+import time
+
+from accident_data import (CACHE_DIR, WATCH_INTERVAL_SECONDS, YearFileWatcher, get_council_districts, ingest_years,
+                           served_years)
+from density_rasters import DensityGrid, DensityRasterStore
+from snapshot import write_snapshot
+
+
+# Default location of the snapshot shared by the server workers
+DEFAULT_SNAPSHOT_DIR = os.path.join(CACHE_DIR, "snapshot")
+
+
+# Function to ingest every year once in this process and write the snapshot the workers memory-map
+def build_snapshot(snapshot_dir):
+    started = time.perf_counter()
+
+    # Parsing and the spatial join run once here instead of once per worker
+    accidents_by_year = ingest_years(served_years(), compact=True)
+
+    # The density rasters are the other per-year result every worker would otherwise recompute
+    raster_store = DensityRasterStore(DensityGrid.around(get_council_districts()))
+    for year, accidents in accidents_by_year.items():
+        raster_store.set_year(year, accidents.lon, accidents.lat)
+
+    write_snapshot(snapshot_dir, accidents_by_year, raster_store)
+    print(f"Wrote snapshot of {len(accidents_by_year)} years to {snapshot_dir} "
+          f"in {time.perf_counter() - started:.1f} s")
+
+
+# Function to rebuild the snapshot in this master process whenever yearly CSVs are added or changed,
+# then reload the workers gracefully so they map the new snapshot instead of each ingesting the files
+def watch_and_rebuild_snapshot(snapshot_dir, year_file_watcher, interval_seconds):
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+
+            # Years changed in the same scan share one rebuild
+            changed_years = year_file_watcher.poll()
+            if not changed_years:
+                continue
+
+            print(f"Yearly CSVs changed for {changed_years}, rebuilding the snapshot")
+            try:
+                build_snapshot(snapshot_dir)
+            except Exception as error:
+                print(f"Could not rebuild the snapshot: {error}")
+                continue
+
+            # SIGHUP makes gunicorn start fresh workers and retire the old ones once their requests finish
+            os.kill(os.getpid(), signal.SIGHUP)
+
+    threading.Thread(target=run, name='snapshot-watcher', daemon=True).start()
+
+
+# Function to run the dashboard under gunicorn, with each worker importing the app after the fork
+def run_gunicorn(bind, workers, threads, timeout):
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit("The multi-worker server needs gunicorn, install it with: pip install gunicorn")
+
+    # Minimal gunicorn application serving the Flask server behind the Dash app
+    class DashboardApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', bind)
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('timeout', timeout)
+
+            # Without preloading each worker starts its own warmup thread, which a fork would not carry over
+            self.cfg.set('preload_app', False)
+
+        def load(self):
+            from main import app
+            return app.server
+
+    DashboardApplication().run()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the accident dashboard with several worker processes")
+    parser.add_argument('--bind', default='0.0.0.0:8050', help="address and port to listen on")
+    parser.add_argument('--workers', type=int, default=max(2, (os.cpu_count() or 1) // 2),
+                        help="number of worker processes")
+    parser.add_argument('--threads', type=int, default=4, help="request threads per worker")
+    parser.add_argument('--timeout', type=int, default=120, help="seconds before a silent worker is restarted")
+    parser.add_argument('--snapshot-dir', default=DEFAULT_SNAPSHOT_DIR, help="directory of the shared data snapshot")
+    parser.add_argument('--skip-snapshot', action='store_true',
+                        help="serve the snapshot already on disk instead of rebuilding it")
+    args = parser.parse_args()
+
+    # Stamp the yearly CSVs before the build, so files changing during it trigger another one
+    year_file_watcher = YearFileWatcher(lambda year: None)
+    if not args.skip_snapshot:
+        build_snapshot(args.snapshot_dir)
+    if WATCH_INTERVAL_SECONDS > 0:
+        watch_and_rebuild_snapshot(args.snapshot_dir, year_file_watcher, WATCH_INTERVAL_SECONDS)
+
+    # Workers inherit the environment and map the snapshot instead of ingesting the CSVs themselves
+    os.environ['ACCIDENT_SNAPSHOT_DIR'] = os.path.abspath(args.snapshot_dir)
+    run_gunicorn(args.bind, args.workers, args.threads, args.timeout)
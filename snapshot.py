@@ -0,0 +1,139 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from accident_data import ACCIDENT_DTYPES
+from accident_store import AccidentStore
+from vector_tiles import ACCIDENT_TILE_PROPERTIES, PointTileIndex, accident_tile_index
+
+
+# Bump whenever the layout of the snapshot files changes so stale snapshots are rebuilt
+SNAPSHOT_FORMAT_VERSION = 4
+
+# Per-accident arrays of a snapshot with their stored dtypes, each concatenated over the years
+SNAPSHOT_ARRAYS = ACCIDENT_DTYPES
+
+# Key and position arrays of the per-year vector tile indexes, each sorted by tile key within the rows of its year,
+# stored next to the point properties of ACCIDENT_TILE_PROPERTIES
+TILE_INDEX_ARRAYS = {'keys': 'uint32', 'x': 'uint32', 'y': 'uint32'}
+
+# File describing the years, row offsets and raster settings of a snapshot
+MANIFEST_NAME = "manifest.json"
+
+
+# Function to describe the grid and kernel of a raster store, so a reader can tell whether stored rasters still fit
+def raster_settings(raster_store):
+    grid = raster_store.grid
+    return {'min_lon': float(grid.min_lon), 'min_lat': float(grid.min_lat), 'cell_lon': float(grid.cell_lon),
+            'cell_lat': float(grid.cell_lat), 'width': grid.width, 'height': grid.height,
+            'cell_meters': grid.cell_meters, 'bandwidth_meters': raster_store.bandwidth_meters}
+
+
+# Function to write the accidents, tile indexes and density rasters of every year as flat arrays that server workers
+# memory-map
+def write_snapshot(directory, accidents_by_year, raster_store=None):
+    years = sorted(accidents_by_year)
+    offsets = np.zeros(len(years) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(accidents_by_year[year]) for year in years])
+
+    # Write into a sibling directory first so workers never map a half-written snapshot
+    temporary_directory = directory.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(temporary_directory, ignore_errors=True)
+    os.makedirs(temporary_directory)
+
+    for name, dtype in SNAPSHOT_ARRAYS.items():
+        values = [np.asarray(getattr(accidents_by_year[year], name), dtype=dtype) for year in years]
+        np.save(os.path.join(temporary_directory, f"{name}.npy"),
+                np.concatenate(values) if values else np.empty(0, dtype=dtype))
+    np.save(os.path.join(temporary_directory, "offsets.npy"), offsets)
+
+    # The tile index of a year has one row per accident, so it shares the offsets of the accident arrays
+    tile_indexes = [accident_tile_index(year, accidents_by_year[year]) for year in years]
+    tile_arrays = {name: [getattr(tile_index, name) for tile_index in tile_indexes] for name in TILE_INDEX_ARRAYS}
+    tile_arrays.update({name: [tile_index.properties[name] for tile_index in tile_indexes]
+                        for name in ACCIDENT_TILE_PROPERTIES})
+    for name, dtype in dict(TILE_INDEX_ARRAYS, **ACCIDENT_TILE_PROPERTIES).items():
+        np.save(os.path.join(temporary_directory, f"tile_{name}.npy"),
+                np.concatenate(tile_arrays[name]).astype(dtype) if years else np.empty(0, dtype=dtype))
+
+    # Rasters are stacked in the order of the years, only when every year has one
+    settings = None
+    if raster_store is not None and years:
+        rasters = [raster_store.year_raster(year) for year in years]
+        if all(raster is not None for raster in rasters):
+            np.save(os.path.join(temporary_directory, "rasters.npy"), np.stack(rasters).astype('float32'))
+            settings = raster_settings(raster_store)
+
+    manifest = {'format_version': SNAPSHOT_FORMAT_VERSION, 'years': years, 'rows': int(offsets[-1]),
+                'raster_settings': settings}
+    with open(os.path.join(temporary_directory, MANIFEST_NAME), 'w') as handle:
+        json.dump(manifest, handle, indent=2)
+
+    # Swap the new snapshot in, workers already mapping the old files keep them until they exit
+    previous_directory = directory.rstrip(os.sep) + '.old'
+    shutil.rmtree(previous_directory, ignore_errors=True)
+    if os.path.exists(directory):
+        os.replace(directory, previous_directory)
+    os.replace(temporary_directory, directory)
+    shutil.rmtree(previous_directory, ignore_errors=True)
+
+
+# Read-only view of a snapshot, the arrays are memory-mapped so every worker shares the same pages
+class AccidentSnapshot:
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.years = manifest['years']
+        self.raster_settings = manifest.get('raster_settings')
+        self._positions = {year: position for position, year in enumerate(self.years)}
+
+        # The mapped arrays have the layout of an accident store, so it serves the per-year and range views
+        self._offsets = np.load(os.path.join(directory, "offsets.npy"))
+        self.store = AccidentStore({name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+                                    for name in SNAPSHOT_ARRAYS},
+                                   self.years, self._offsets)
+
+        self._tile_arrays = {name: np.load(os.path.join(directory, f"tile_{name}.npy"), mmap_mode='r')
+                             for name in dict(TILE_INDEX_ARRAYS, **ACCIDENT_TILE_PROPERTIES)}
+
+        rasters_path = os.path.join(directory, "rasters.npy")
+        self._rasters = np.load(rasters_path, mmap_mode='r') if self.raster_settings is not None else None
+
+    # Function to get the accidents of a year as views into the mapped arrays, or None when it is not stored
+    def year(self, year):
+        return self.store.year(year)
+
+    # Function to get the vector tile index of a year over views into the mapped arrays, or None when it is not stored
+    def tile_index(self, year):
+        if year not in self._positions:
+            return None
+        start, stop = self._offsets[self._positions[year]], self._offsets[self._positions[year] + 1]
+        arrays = {name: values[start:stop] for name, values in self._tile_arrays.items()}
+        return PointTileIndex.from_sorted(arrays['keys'], arrays['x'], arrays['y'],
+                                          {name: arrays[name] for name in ACCIDENT_TILE_PROPERTIES})
+
+    # Function to get the stored density raster of a year, or None when the snapshot has no rasters
+    def density_raster(self, year):
+        if self._rasters is None or year not in self._positions:
+            return None
+        return self._rasters[self._positions[year]]
+
+
+# Function to open the snapshot in a directory, or None when it is missing, unreadable or of an older layout
+def load_snapshot(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as handle:
+            manifest = json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        print(f"Ignoring snapshot in {directory}: format {manifest.get('format_version')} is not supported")
+        return None
+
+    try:
+        return AccidentSnapshot(directory, manifest)
+    except (OSError, ValueError) as error:
+        print(f"Could not read snapshot in {directory}: {error}")
+        return None
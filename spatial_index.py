@@ -0,0 +1,82 @@
+import numpy as np
+import shapely
+
+
+# Points assigned at a time, bounding the memory of the intermediate arrays on very large calls
+ASSIGN_CHUNK_POINTS = 1_000_000
+
+
+# Spatial index over the polygons of one layer, built once and reused for every point assignment
+class PolygonIndex:
+    def __init__(self, geometries, codes, missing_code=-1):
+        self.geometries = np.asarray(geometries, dtype=object)
+        self.codes = np.asarray(codes)
+        self.missing_code = missing_code
+        self.bounds = shapely.bounds(self.geometries)
+
+        # Prepared polygons make the repeated point-in-polygon tests much cheaper
+        shapely.prepare(self.geometries)
+
+    # Function to assign each lon/lat point the code of the polygon containing it, or the missing code
+    def assign(self, lon, lat):
+        lon = np.asarray(lon, dtype='float64')
+        lat = np.asarray(lat, dtype='float64')
+
+        codes = np.full(lon.shape, self.missing_code, dtype=self.codes.dtype)
+        for start in range(0, len(lon), ASSIGN_CHUNK_POINTS):
+            stop = start + ASSIGN_CHUNK_POINTS
+            codes[start:stop] = self._assign_chunk(lon[start:stop], lat[start:stop])
+
+        return codes
+
+    # Function to assign one chunk of points, testing each polygon only against points in its bounding box
+    def _assign_chunk(self, lon, lat):
+        codes = np.full(lon.shape, self.missing_code, dtype=self.codes.dtype)
+
+        # Sorting by longitude turns each bounding box into a contiguous range of candidate points
+        order = np.argsort(lon, kind='stable')
+        self.assign_sorted(lon, lat, order, lon[order], codes)
+        return codes
+
+    # Function to write the code of each polygon into the points it contains, the points given in longitude order
+    def assign_sorted(self, lon, lat, order, sorted_lon, codes):
+        for geometry, code, (min_x, min_y, max_x, max_y) in zip(self.geometries, self.codes, self.bounds):
+            first = np.searchsorted(sorted_lon, min_x, side='left')
+            last = np.searchsorted(sorted_lon, max_x, side='right')
+            candidates = order[first:last]
+
+            # Points already inside an earlier polygon keep it, as the left spatial join did
+            candidates = candidates[(lat[candidates] >= min_y) & (lat[candidates] <= max_y) &
+                                    (codes[candidates] == self.missing_code)]
+            inside = shapely.contains_xy(geometry, lon[candidates], lat[candidates])
+            codes[candidates[inside]] = code
+
+
+# Indexes of several polygon layers, assigning points to every layer in one pass that sorts each chunk of points once
+class MultiLayerIndex:
+    def __init__(self, layers):
+        self.layers = dict(layers)
+
+    # Function to assign each lon/lat point the code of its polygon in every layer, as a dict of code arrays
+    def assign(self, lon, lat):
+        lon = np.asarray(lon, dtype='float64')
+        lat = np.asarray(lat, dtype='float64')
+
+        codes = {name: np.full(lon.shape, index.missing_code, dtype=index.codes.dtype)
+                 for name, index in self.layers.items()}
+        for start in range(0, len(lon), ASSIGN_CHUNK_POINTS):
+            stop = start + ASSIGN_CHUNK_POINTS
+            chunk_lon, chunk_lat = lon[start:stop], lat[start:stop]
+
+            # The longitude order of the chunk is shared by every layer, so a layer only adds its polygon tests
+            order = np.argsort(chunk_lon, kind='stable')
+            sorted_lon = chunk_lon[order]
+            for name, index in self.layers.items():
+                index.assign_sorted(chunk_lon, chunk_lat, order, sorted_lon, codes[name][start:stop])
+
+        return codes
+
+
+# Function to build the index of a polygon layer from its GeoDataFrame and the column holding its codes
+def build_layer_index(gdf_polygons, code_column, dtype='int16'):
+    return PolygonIndex(gdf_polygons.geometry.to_numpy(), gdf_polygons[code_column].to_numpy().astype(dtype))
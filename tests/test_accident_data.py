@@ -0,0 +1,92 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import accident_data
+from accident_data import BEXAR_COUNTY_BOUNDS, SchemaRegistry, detect_schema, validate_coordinates
+
+
+def test_validate_coordinates_counts_each_drop_reason():
+    min_lon, min_lat, max_lon, max_lat = BEXAR_COUNTY_BOUNDS
+    rows = [
+        (-98.49, 29.42, 'valid'),
+        (min_lon, max_lat, 'valid'),
+        (np.nan, 29.42, 'missing'),
+        (-98.49, np.nan, 'missing'),
+        (np.nan, 88.8888, 'missing'),
+        (-999.9999, 29.42, 'sentinel'),
+        (-98.49, 88.8888, 'sentinel'),
+        (777.7777, 77.7777, 'sentinel'),
+        (-97.74, 30.27, 'out_of_county'),
+        (-98.49, max_lat + 0.01, 'out_of_county'),
+    ]
+    lon, lat, reasons = zip(*rows)
+
+    valid, dropped = validate_coordinates(lon, lat)
+
+    # Every row is counted once, under the first reason it fails
+    np.testing.assert_array_equal(valid, [reason == 'valid' for reason in reasons])
+    assert dropped == {'missing': 3, 'sentinel': 3, 'out_of_county': 2}
+
+
+def test_validate_coordinates_of_clean_rows():
+    valid, dropped = validate_coordinates([-98.49, -98.6], [29.42, 29.5])
+    assert valid.all()
+    assert dropped == {'missing': 0, 'sentinel': 0, 'out_of_county': 0}
+
+
+# Headers of the FARS layouts of the yearly extracts, trimmed to the columns the schema is read from
+@pytest.mark.parametrize('header, expected', [
+    # 2004-2009: lower-case coordinates and FARS codes for the city and state
+    (['STATE', 'COUNTY', 'CITY', 'latitude', 'longitud', 'FATALS'],
+     {'lat': 'latitude', 'lon': 'longitud', 'city': ['CITY'], 'state': ['STATE']}),
+    # 2010-2015: upper-case coordinates
+    (['STATE', 'ST_CASE', 'COUNTY', 'CITY', 'LATITUDE', 'LONGITUD', 'FATALS'],
+     {'lat': 'LATITUDE', 'lon': 'LONGITUD', 'city': ['CITY'], 'state': ['STATE']}),
+    # 2016 on: codes and names side by side
+    (['STATE', 'STATENAME', 'CITY', 'CITYNAME', 'LATITUDE', 'LATITUDENAME', 'LONGITUD', 'LONGITUDNAME', 'FATALS'],
+     {'lat': 'LATITUDENAME', 'lon': 'LONGITUD', 'city': ['CITY', 'CITYNAME'], 'state': ['STATE', 'STATENAME']}),
+    # Not a FARS extract at all
+    (['id', 'x', 'y', 'when'], {'lat': None, 'lon': None, 'city': [], 'state': []}),
+])
+def test_detect_schema(header, expected):
+    assert detect_schema(header) == expected
+
+
+# Function to write a CSV of a few rows with the given header
+def write_csv(path, header):
+    pd.DataFrame([range(len(header))] * 3, columns=header).to_csv(path, index=False)
+    return str(path)
+
+
+def test_schema_registry_reads_each_header_once(tmp_path, monkeypatch):
+    csv_path = write_csv(tmp_path / '2012_bexar_county.csv', ['STATE', 'CITY', 'LATITUDE', 'LONGITUD'])
+    registry_path = str(tmp_path / 'cache' / 'schemas.json')
+
+    schema = SchemaRegistry(registry_path).get(csv_path)
+    assert schema == {'lat': 'LATITUDE', 'lon': 'LONGITUD', 'city': ['CITY'], 'state': ['STATE']}
+    with open(registry_path) as handle:
+        assert json.load(handle)[csv_path]['schema'] == schema
+
+    # Another process finds the layout persisted and leaves the header unread
+    def read_csv(*args, **kwargs):
+        raise AssertionError("the header was read again")
+    with monkeypatch.context() as patch:
+        patch.setattr(accident_data.pd, 'read_csv', read_csv)
+        assert SchemaRegistry(registry_path).get(csv_path) == schema
+
+    # A rewritten file of another layout is detected again
+    write_csv(csv_path, ['STATE', 'STATENAME', 'CITY', 'CITYNAME', 'LATITUDENAME', 'LONGITUD', 'EXTRA_COLUMN'])
+    os.utime(csv_path, ns=(0, os.stat(csv_path).st_mtime_ns + 1))
+    assert SchemaRegistry(registry_path).get(csv_path)['state'] == ['STATE', 'STATENAME']
+
+
+def test_file_of_unknown_header_is_skipped(tmp_path, monkeypatch):
+    csv_path = write_csv(tmp_path / '2030_bexar_county.csv', ['id', 'x', 'y', 'when'])
+    monkeypatch.setattr(accident_data, 'schema_registry', SchemaRegistry(str(tmp_path / 'schemas.json')))
+
+    assert accident_data.read_year_csv(csv_path) is None
+    assert accident_data.schema_registry.get(csv_path)['lat'] is None
@@ -0,0 +1,76 @@
+import numpy as np
+
+from accident_data import ACCIDENT_DTYPES, YearAccidents
+from accident_store import AccidentStore
+
+
+# Function to make the accidents of a year, the coordinates encoding the year and row so misplaced rows show up
+def synthetic_year(year, rows):
+    values = (year % 100) * 10000 + np.arange(rows)
+    return YearAccidents(*((values if dtype == 'float32' else values % 1000).astype(dtype)
+                           for dtype in ACCIDENT_DTYPES.values()))
+
+
+# Function to check the accidents equal the given years' rows, in year order
+def assert_holds(accidents, years_and_rows):
+    expected = [synthetic_year(year, rows) for year, rows in years_and_rows]
+    for name in ACCIDENT_DTYPES:
+        np.testing.assert_array_equal(getattr(accidents, name),
+                                      np.concatenate([getattr(year, name) for year in expected]))
+
+
+def test_views_after_compact_hold_the_right_years():
+    # Years arrive out of order and of different sizes, so the buffers grow several times
+    rows_by_year = {2015: 7, 2012: 300, 2019: 1, 2013: 45, 2018: 1200, 2014: 0, 2016: 90}
+    store = AccidentStore()
+    for year, rows in rows_by_year.items():
+        store.set_year(year, synthetic_year(year, rows))
+
+    # A year loaded again leaves its old rows unused until the store is compacted
+    rows_by_year[2013] = 60
+    store.set_year(2013, synthetic_year(2013, 60))
+    earlier_view = store.year(2018)
+    earlier_range = store.select(range(2012, 2020))
+
+    store.compact()
+
+    assert store.years == sorted(rows_by_year)
+    assert len(store) == sum(rows_by_year.values())
+    for year, rows in rows_by_year.items():
+        assert_holds(store.year(year), [(year, rows)])
+
+    # After compact() any run of consecutive loaded years is one view into the store
+    every_year = store.select(rows_by_year).lon
+    for first, last in [(2012, 2019), (2013, 2016), (2015, 2018), (2016, 2018)]:
+        years = [year for year in range(first, last + 1) if year in rows_by_year]
+        accidents = store.select(years)
+        assert_holds(accidents, [(year, rows_by_year[year]) for year in years])
+        assert np.shares_memory(accidents.lon, every_year)
+
+    # Views taken before compact() still hold what they held
+    assert_holds(earlier_view, [(2018, 1200)])
+    assert_holds(earlier_range, [(year, rows_by_year[year]) for year in sorted(rows_by_year)])
+
+    # The unused and spare rows are gone, and compacting again changes nothing
+    assert store.nbytes == sum(rows_by_year.values()) * sum(np.dtype(dtype).itemsize
+                                                             for dtype in ACCIDENT_DTYPES.values())
+    arrays = store.year(2012).lon
+    store.compact()
+    assert np.shares_memory(store.year(2012).lon, arrays)
+
+
+def test_years_set_after_compact():
+    store = AccidentStore()
+    for year in (2011, 2010):
+        store.set_year(year, synthetic_year(year, 20))
+    store.compact()
+
+    # A new year goes after the compacted ones, and replaces nothing already handed out
+    compacted_view = store.select([2010, 2011])
+    store.set_year(2009, synthetic_year(2009, 5))
+    assert_holds(store.select([2009, 2010, 2011]), [(2009, 5), (2010, 20), (2011, 20)])
+    assert_holds(compacted_view, [(2010, 20), (2011, 20)])
+
+    store.compact()
+    assert_holds(store.select([2009, 2010, 2011]), [(2009, 5), (2010, 20), (2011, 20)])
+    assert np.shares_memory(store.select([2009, 2010]).lon, store.year(2010).lon)
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from district_cube import DistrictYearCube
+
+
+DISTRICTS = np.arange(1, 11)
+
+
+# Function to draw the accidents of a year: mostly district codes, some outside every district or unknown
+def synthetic_year(year, rows=400):
+    rng = np.random.default_rng(year)
+    district_codes = rng.choice(np.concatenate([DISTRICTS, [-1, 42]]), size=rows).astype('float64')
+    district_codes[rng.random(rows) < 0.05] = np.nan
+    return pd.DataFrame({'Year': year, 'District': district_codes, 'Fatalities': rng.integers(1, 4, size=rows)})
+
+
+# Function to total the accidents and fatalities of every district over a year range with a plain groupby
+def expected_totals(accidents, start_year, end_year):
+    in_range = accidents[accidents['Year'].between(start_year, end_year)]
+    totals = in_range.groupby('District')['Fatalities'].agg(['size', 'sum']).reindex(DISTRICTS, fill_value=0)
+    return totals['size'].to_numpy(), totals['sum'].to_numpy()
+
+
+@pytest.fixture
+def loaded_cube():
+    # 2012 is past the initial range and 2008 before it, so the table grows on both sides
+    years = [2010, 2011, 2012, 2008]
+    cube = DistrictYearCube(DISTRICTS, 2009, 2011)
+    for year in years:
+        accidents = synthetic_year(year)
+        cube.set_year(year, accidents['District'], accidents['Fatalities'])
+    return cube, pd.concat([synthetic_year(year) for year in years])
+
+
+@pytest.mark.parametrize('start_year, end_year', [(2010, 2010), (2010, 2011), (2011, 2012), (2008, 2012),
+                                                  (2005, 2030), (2009, 2009), (2013, 2015)])
+def test_range_totals_match_groupby(loaded_cube, start_year, end_year):
+    cube, accidents = loaded_cube
+    expected_accidents, expected_fatalities = expected_totals(accidents, start_year, end_year)
+
+    year_accidents, year_fatalities = cube.range_totals(start_year, end_year)
+    np.testing.assert_array_equal(year_accidents, expected_accidents)
+    np.testing.assert_array_equal(year_fatalities, expected_fatalities)
+
+
+def test_grown_years_are_loaded(loaded_cube):
+    cube, _ = loaded_cube
+    assert cube.first_year == 2008
+    assert cube.years.tolist() == [2008, 2009, 2010, 2011, 2012]
+    assert cube.loaded_years() == [2008, 2010, 2011, 2012]
+    assert cube.loaded_years(2009, 2011) == [2010, 2011]
+
+
+def test_set_year_replaces_earlier_load(loaded_cube):
+    cube, accidents = loaded_cube
+    reloaded = synthetic_year(2010).iloc[:100]
+    cube.set_year(2010, reloaded['District'], reloaded['Fatalities'])
+
+    accidents = pd.concat([accidents[accidents['Year'] != 2010], reloaded])
+    for start_year, end_year in [(2010, 2010), (2008, 2012)]:
+        expected_accidents, expected_fatalities = expected_totals(accidents, start_year, end_year)
+        year_accidents, year_fatalities = cube.range_totals(start_year, end_year)
+        np.testing.assert_array_equal(year_accidents, expected_accidents)
+        np.testing.assert_array_equal(year_fatalities, expected_fatalities)
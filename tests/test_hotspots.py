@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from hotspots import neighbour_pairs, perform_dbscan_clustering, project_to_meters
+
+
+# Function to scatter accidents around San Antonio: dense blobs of crashes over a sparse background
+def synthetic_accidents(seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform((-98.7, 29.25), (-98.3, 29.6), size=(12, 2))
+    blobs = [center + rng.normal(scale=0.004, size=(150, 2)) for center in centers]
+    background = rng.uniform((-98.82, 29.11), (-98.11, 29.77), size=(1500, 2))
+    points = np.concatenate(blobs + [background])
+    return points[:, 0], points[:, 1]
+
+
+# Function to check two labelings split the points into the same groups, whatever numbers they give them
+def assert_same_partition(labels, expected_labels):
+    pairs = set(zip(labels.tolist(), expected_labels.tolist()))
+    assert len(pairs) == len(set(labels.tolist())) == len(set(expected_labels.tolist()))
+
+
+def test_neighbour_pairs_match_brute_force():
+    longitudes, latitudes = synthetic_accidents()
+    coordinates = project_to_meters(longitudes[:800], latitudes[:800])
+
+    # Small strips make most pairs cross a strip boundary
+    found = set()
+    for sources, targets in neighbour_pairs(coordinates, 600, chunk_points=37):
+        found.update(zip(sources.tolist(), targets.tolist()))
+
+    distances = np.linalg.norm(coordinates[:, None, :] - coordinates[None, :, :], axis=-1)
+    assert found == set(zip(*(positions.tolist() for positions in np.nonzero(distances <= 600))))
+
+
+@pytest.mark.parametrize('eps, min_samples', [(300, 5), (1000, 5), (600, 12)])
+def test_dbscan_matches_sklearn(eps, min_samples):
+    DBSCAN = pytest.importorskip('sklearn.cluster').DBSCAN
+    longitudes, latitudes = synthetic_accidents()
+    coordinates = project_to_meters(longitudes, latitudes)
+
+    labels = perform_dbscan_clustering(longitudes, latitudes, eps=eps, min_samples=min_samples)
+    expected = DBSCAN(eps=eps, min_samples=min_samples).fit(coordinates)
+    core = np.zeros(len(coordinates), dtype=bool)
+    core[expected.core_sample_indices_] = True
+
+    # Core points form the same clusters and the same points are noise
+    assert_same_partition(labels[core], expected.labels_[core])
+    np.testing.assert_array_equal(labels == -1, expected.labels_ == -1)
+
+    # A border point within eps of cores of two clusters may join either, as long as one of its cores is in it
+    for border in np.flatnonzero(~core & (labels != -1)):
+        near_core = core & (np.linalg.norm(coordinates - coordinates[border], axis=1) <= eps)
+        assert labels[border] in set(labels[near_core].tolist())
+
+
+def test_dbscan_of_no_points():
+    assert len(perform_dbscan_clustering(np.empty(0), np.empty(0))) == 0
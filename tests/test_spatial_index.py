@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+import pytest
+import shapely
+
+import spatial_index
+from spatial_index import MultiLayerIndex, build_layer_index
+
+gpd = pytest.importorskip('geopandas')
+
+# Council district polygons shipped with the dashboard, whose neighbouring districts share their borders
+COUNCIL_DISTRICTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                      'Council_Districts.geojson')
+
+
+# Function to lay out a grid of unit squares sharing their edges, with a square hole in one of them
+def grid_polygons():
+    squares = [shapely.box(column, row, column + 1, row + 1) for row in range(3) for column in range(4)]
+    squares[5] = squares[5].difference(shapely.box(1.25, 1.25, 1.75, 1.75))
+    return gpd.GeoDataFrame({'Code': np.arange(10, 10 + len(squares))}, geometry=squares, crs='EPSG:4326')
+
+
+# Function to scatter points over the polygons and past their edges, adding points exactly on every polygon border
+def points_around(gdf_polygons, count=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    min_x, min_y, max_x, max_y = gdf_polygons.total_bounds
+    margin_x, margin_y = (max_x - min_x) * 0.1, (max_y - min_y) * 0.1
+    lon = rng.uniform(min_x - margin_x, max_x + margin_x, count)
+    lat = rng.uniform(min_y - margin_y, max_y + margin_y, count)
+
+    # Vertices and edge midpoints lie on the borders, shared ones included
+    boundaries = shapely.boundary(gdf_polygons.geometry.to_numpy())
+    vertices = shapely.get_coordinates(boundaries)
+    midpoints = (vertices[:-1] + vertices[1:]) / 2
+    border = np.concatenate([vertices, midpoints])
+    return np.concatenate([lon, border[:, 0]]), np.concatenate([lat, border[:, 1]])
+
+
+# Function to assign the points with the spatial join the index replaced, points outside every polygon getting -1
+def sjoin_codes(gdf_polygons, code_column, lon, lat):
+    points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(lon, lat), crs=gdf_polygons.crs)
+    joined = gpd.sjoin(points, gdf_polygons[[code_column, 'geometry']], how='left', predicate='within')
+
+    # The layers do not overlap, so every point joins at most one polygon
+    assert not joined.index.duplicated().any()
+    return joined[code_column].fillna(-1).to_numpy().astype('int16')
+
+
+@pytest.fixture(params=['grid', 'districts'])
+def layer(request):
+    if request.param == 'grid':
+        return grid_polygons(), 'Code'
+    return gpd.read_file(COUNCIL_DISTRICTS_PATH), 'District'
+
+
+def test_polygon_index_matches_sjoin(layer, monkeypatch):
+    gdf_polygons, code_column = layer
+    lon, lat = points_around(gdf_polygons)
+
+    # Small chunks make the points span several of them
+    monkeypatch.setattr(spatial_index, 'ASSIGN_CHUNK_POINTS', 701)
+    codes = build_layer_index(gdf_polygons, code_column).assign(lon, lat)
+
+    expected = sjoin_codes(gdf_polygons, code_column, lon, lat)
+    np.testing.assert_array_equal(codes, expected)
+    assert (expected == -1).any() and (expected != -1).any()
+
+
+def test_multi_layer_index_matches_sjoin_per_layer():
+    grid = grid_polygons()
+    districts = gpd.read_file(COUNCIL_DISTRICTS_PATH)
+
+    # Move the grid onto the districts, so points fall in both layers, either one or neither
+    min_x, min_y, max_x, max_y = districts.total_bounds
+    grid = grid.set_geometry(grid.geometry.scale(0.05, 0.05, origin=(0, 0)).translate(min_x, min_y))
+
+    lon_grid, lat_grid = points_around(grid, seed=1)
+    lon_districts, lat_districts = points_around(districts, seed=2)
+    lon, lat = np.concatenate([lon_grid, lon_districts]), np.concatenate([lat_grid, lat_districts])
+
+    codes = MultiLayerIndex({'Code': build_layer_index(grid, 'Code'),
+                             'District': build_layer_index(districts, 'District')}).assign(lon, lat)
+
+    assert set(codes) == {'Code', 'District'}
+    np.testing.assert_array_equal(codes['Code'], sjoin_codes(grid, 'Code', lon, lat))
+    np.testing.assert_array_equal(codes['District'], sjoin_codes(districts, 'District', lon, lat))
+
+
+def test_points_outside_every_polygon_get_missing_code():
+    codes = build_layer_index(grid_polygons(), 'Code').assign([-5.0, 1.5, 4.0, 2.0], [-5.0, 1.5, 0.5, 3.0])
+    assert codes.tolist() == [-1, -1, -1, -1]
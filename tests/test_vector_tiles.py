@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from vector_tiles import (TILE_EXTENT, PointTileIndex, encode_indexes_tile, encode_point_tile,
+                          lon_lat_to_tile_coordinates)
+
+mapbox_vector_tile = pytest.importorskip('mapbox_vector_tile')
+
+
+# Function to decode a tile with the y axis pointing down, as the encoder writes it
+def decode(tile):
+    return mapbox_vector_tile.decode(tile, default_options={'y_coord_down': True})
+
+
+def test_point_tile_round_trip():
+    tile_x = np.array([0.0, 0.25, 0.5, 0.999, -0.01])
+    tile_y = np.array([0.0, 0.75, 0.5, 0.001, 1.01])
+    properties = {
+        'District': np.array([1, 2, 2, -1, 10], dtype='int16'),
+        'Fatalities': np.array([1, 3, 1, 2, 1], dtype='int16'),
+        'Speed': np.array([35.5, 40.0, 35.5, 55.25, 0.0]),
+        'Street': np.array(['MAIN', 'BROADWAY', 'MAIN', 'LOOP 410', 'I-35'], dtype=object),
+    }
+
+    layer = decode(encode_point_tile('accidents', tile_x, tile_y, properties))['accidents']
+    assert layer['extent'] == TILE_EXTENT
+    assert len(layer['features']) == len(tile_x)
+
+    for position, feature in enumerate(layer['features']):
+        assert feature['geometry']['type'] == 'Point'
+        assert feature['geometry']['coordinates'] == [int(np.floor(tile_x[position] * TILE_EXTENT)),
+                                                      int(np.floor(tile_y[position] * TILE_EXTENT))]
+        assert feature['properties'] == {name: values.tolist()[position] for name, values in properties.items()}
+
+
+def test_empty_tile_round_trip():
+    assert decode(encode_point_tile('accidents', np.empty(0), np.empty(0), {}))['accidents']['features'] == []
+
+
+def test_index_tile_round_trip():
+    rng = np.random.default_rng(0)
+    lon = rng.uniform(-98.6, -98.4, 2000).astype('float32')
+    lat = rng.uniform(29.35, 29.5, 2000).astype('float32')
+    years = [PointTileIndex(lon[:1200], lat[:1200], {'Year': np.full(1200, 2019, dtype='int16')}),
+             PointTileIndex(lon[1200:], lat[1200:], {'Year': np.full(800, 2020, dtype='int16')})]
+
+    # A zoom-14 tile in the middle of the points, its features are the points inside it or its buffer
+    z = 14
+    x, y = (int(value) for value in lon_lat_to_tile_coordinates(-98.5, 29.42, z))
+    features = decode(encode_indexes_tile('accidents', years, z, x, y))['accidents']['features']
+
+    point_x, point_y = lon_lat_to_tile_coordinates(lon, lat, z)
+    margin = 64 / TILE_EXTENT
+    inside = ((point_x - x >= -margin) & (point_x - x < 1 + margin) &
+              (point_y - y >= -margin) & (point_y - y < 1 + margin))
+    assert inside.sum() > 0
+    assert len(features) == inside.sum()
+
+    expected = sorted(zip(np.floor((point_x[inside] - x) * TILE_EXTENT).astype(int).tolist(),
+                          np.floor((point_y[inside] - y) * TILE_EXTENT).astype(int).tolist(),
+                          np.where(np.arange(2000) < 1200, 2019, 2020)[inside].tolist()))
+    decoded = sorted((*feature['geometry']['coordinates'], feature['properties']['Year']) for feature in features)
+    assert decoded == expected
@@ -0,0 +1,248 @@
+import struct
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+# Coordinate resolution of a tile, the Mapbox Vector Tile default
+TILE_EXTENT = 4096
+
+# Extra margin in tile units around each tile, so circles on a tile edge are not cut off
+TILE_BUFFER = 64
+
+# Zoom the points are indexed at, tiles at deeper zooms filter the points of their zoom-16 parent
+INDEX_ZOOM = 16
+
+# Zoom the point positions are kept at as 32 bit integers, a few millimeters on the ground
+POSITION_ZOOM = 32
+
+
+# Function to project lon/lat onto the Web Mercator plane, in tiles of the given zoom
+def lon_lat_to_tile_coordinates(lon, lat, zoom):
+    lon = np.asarray(lon, dtype='float64')
+    lat = np.clip(np.asarray(lat, dtype='float64'), -85.0511, 85.0511)
+    scale = 2 ** zoom
+    x = (lon + 180) / 360 * scale
+    y = (1 - np.log(np.tan(np.radians(lat)) + 1 / np.cos(np.radians(lat))) / np.pi) / 2 * scale
+    return x, y
+
+
+# Function to unproject Web Mercator tile coordinates of the given zoom back onto lon/lat
+def tile_coordinates_to_lon_lat(x, y, zoom):
+    scale = 2 ** zoom
+    lon = np.asarray(x, dtype='float64') / scale * 360 - 180
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.asarray(y, dtype='float64') / scale))))
+    return lon, lat
+
+
+# Function to interleave the bits of two 16 bit integers into z-order keys
+def morton_keys(x, y):
+    x = np.asarray(x, dtype=np.uint64)
+    y = np.asarray(y, dtype=np.uint64)
+    keys = np.zeros(x.shape, dtype=np.uint64)
+    for bit in range(INDEX_ZOOM):
+        keys |= ((x >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit + 1)
+        keys |= ((y >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit)
+    return keys
+
+
+# Points of one layer sorted by their z-order key, so the points of any tile are a few contiguous ranges.
+# Keys and positions are 32 bit integers, so the index takes less memory per point than the accidents themselves
+class PointTileIndex:
+    def __init__(self, lon, lat, properties=None):
+        x, y = lon_lat_to_tile_coordinates(lon, lat, POSITION_ZOOM)
+        x = np.clip(x, 0, 2 ** POSITION_ZOOM - 1).astype(np.uint32)
+        y = np.clip(y, 0, 2 ** POSITION_ZOOM - 1).astype(np.uint32)
+
+        # Both 16 bit cell coordinates of the index zoom interleave into a 32 bit key
+        shift = POSITION_ZOOM - INDEX_ZOOM
+        keys = morton_keys(x >> shift, y >> shift).astype(np.uint32)
+
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.x = x[order]
+        self.y = y[order]
+        self.properties = {name: np.asarray(values)[order] for name, values in (properties or {}).items()}
+
+    # Function to wrap arrays already sorted by key, such as the memory-mapped ones of a snapshot, without copying them
+    @classmethod
+    def from_sorted(cls, keys, x, y, properties=None):
+        index = cls.__new__(cls)
+        index.keys = keys
+        index.x = x
+        index.y = y
+        index.properties = dict(properties or {})
+        return index
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Function to get the positions of the points within one tile, widened by a buffer in tile units
+    def tile_points(self, z, x, y, buffer=TILE_BUFFER):
+        margin = buffer / TILE_EXTENT
+        candidates = []
+
+        # The tile and its neighbours cover the buffer, each is one key range at zooms up to the index zoom
+        for neighbour_x in (x - 1, x, x + 1):
+            for neighbour_y in (y - 1, y, y + 1):
+                if not (0 <= neighbour_x < 2 ** z and 0 <= neighbour_y < 2 ** z):
+                    continue
+                if z <= INDEX_ZOOM:
+                    shift = np.uint64(2 * (INDEX_ZOOM - z))
+                    first_key = morton_keys(neighbour_x, neighbour_y) << shift
+                    last_key = (morton_keys(neighbour_x, neighbour_y) + np.uint64(1)) << shift
+                else:
+                    shift = z - INDEX_ZOOM
+                    first_key = morton_keys(neighbour_x >> shift, neighbour_y >> shift)
+                    last_key = first_key + np.uint64(1)
+                start = np.searchsorted(self.keys, first_key, side='left')
+                stop = np.searchsorted(self.keys, last_key, side='left')
+                candidates.append(np.arange(start, stop))
+
+        # Past the index zoom neighbouring tiles can share a parent, so drop the repeated ranges
+        positions = np.unique(np.concatenate(candidates)) if candidates else np.empty(0, dtype=np.intp)
+
+        # Keep the candidates inside the buffered tile
+        scale = 2.0 ** (z - POSITION_ZOOM)
+        tile_x = self.x[positions] * scale - x
+        tile_y = self.y[positions] * scale - y
+        inside = (tile_x >= -margin) & (tile_x < 1 + margin) & (tile_y >= -margin) & (tile_y < 1 + margin)
+        return positions[inside], tile_x[inside], tile_y[inside]
+
+
+# Properties of the accident points in the vector tiles, with the dtypes they are indexed with
+ACCIDENT_TILE_PROPERTIES = {'District': 'int16', 'Fatalities': 'int16', 'Year': 'int16'}
+
+
+# Function to index the accident points of a year for the vector tile endpoint
+def accident_tile_index(year, accidents):
+    return PointTileIndex(
+        accidents.lon, accidents.lat,
+        {'District': np.asarray(accidents.district, dtype=ACCIDENT_TILE_PROPERTIES['District']),
+         'Fatalities': np.asarray(accidents.fatalities, dtype=ACCIDENT_TILE_PROPERTIES['Fatalities']),
+         'Year': np.full(len(accidents), year, dtype=ACCIDENT_TILE_PROPERTIES['Year'])})
+
+
+# Function to encode an unsigned integer as a protobuf varint
+def encode_varint(value):
+    encoded = bytearray()
+    while value > 0x7F:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+# Function to encode a signed integer with protobuf zigzag encoding
+def zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+# Function to encode a length-delimited protobuf field
+def encode_bytes_field(field, payload):
+    return encode_varint((field << 3) | 2) + encode_varint(len(payload)) + payload
+
+
+# Function to encode a varint protobuf field
+def encode_varint_field(field, value):
+    return encode_varint(field << 3) + encode_varint(value)
+
+
+# Function to encode a packed repeated varint protobuf field
+def encode_packed_field(field, values):
+    return encode_bytes_field(field, b''.join(encode_varint(value) for value in values))
+
+
+# Function to encode a property value of a vector tile layer
+def encode_value(value):
+    if isinstance(value, (bool, np.bool_)):
+        return encode_varint_field(7, int(value))
+    if isinstance(value, (int, np.integer)):
+        return encode_varint_field(6, zigzag(int(value)))
+    if isinstance(value, (float, np.floating)):
+        return encode_varint(3 << 3 | 1) + struct.pack('<d', float(value))
+    return encode_bytes_field(1, str(value).encode('utf-8'))
+
+
+# Function to encode one layer of points as a Mapbox Vector Tile
+def encode_point_tile(layer_name, tile_x, tile_y, properties):
+    keys = list(properties)
+    values, value_ids = [], {}
+    features = []
+
+    pixel_x = np.floor(tile_x * TILE_EXTENT).astype(np.int64)
+    pixel_y = np.floor(tile_y * TILE_EXTENT).astype(np.int64)
+    for position in range(len(pixel_x)):
+        # Feature properties point into the shared key and value tables
+        tags = []
+        for key_id, key in enumerate(keys):
+            value = properties[key][position]
+
+            # Typed keys keep equal values of different types, like 1 and 1.0, apart
+            value_key = (type(value), value)
+            if value_key not in value_ids:
+                value_ids[value_key] = len(values)
+                values.append(value)
+            tags.extend((key_id, value_ids[value_key]))
+
+        # A single MoveTo command with the point's zigzag-encoded position
+        geometry = (9, zigzag(int(pixel_x[position])), zigzag(int(pixel_y[position])))
+        features.append(encode_bytes_field(2, encode_packed_field(2, tags) + encode_varint_field(3, 1) +
+                                           encode_packed_field(4, geometry)))
+
+    layer = (encode_varint_field(15, 2) + encode_bytes_field(1, layer_name.encode('utf-8')) + b''.join(features) +
+             b''.join(encode_bytes_field(3, key.encode('utf-8')) for key in keys) +
+             b''.join(encode_bytes_field(4, encode_value(value)) for value in values) +
+             encode_varint_field(5, TILE_EXTENT))
+    return encode_bytes_field(3, layer)
+
+
+# Bounded LRU cache of encoded tiles
+class TileCache:
+    def __init__(self, max_tiles=2048):
+        self.max_tiles = max_tiles
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Function to get the tile for a key, encoding and storing it on a miss
+    def get(self, key, encode):
+        with self._lock:
+            if key in self._tiles:
+                self.hits += 1
+                self._tiles.move_to_end(key)
+                return self._tiles[key]
+
+        tile = encode()
+        with self._lock:
+            self.misses += 1
+            self._tiles[key] = tile
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+                self.evictions += 1
+        return tile
+
+    # Function to summarize the cache counters
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._tiles), 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+# Function to encode the points of several indexes falling in one tile, as one vector tile layer
+def encode_indexes_tile(layer_name, indexes, z, x, y):
+    tile_x, tile_y, properties = [], [], {}
+    for index in indexes:
+        positions, index_x, index_y = index.tile_points(z, x, y)
+        tile_x.append(index_x)
+        tile_y.append(index_y)
+        for name, values in index.properties.items():
+            properties.setdefault(name, []).append(values[positions])
+
+    if not tile_x:
+        return encode_point_tile(layer_name, np.empty(0), np.empty(0), {})
+
+    return encode_point_tile(layer_name, np.concatenate(tile_x), np.concatenate(tile_y),
+                             {name: np.concatenate(values) for name, values in properties.items()})